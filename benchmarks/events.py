@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Fabula Event Benchmarks
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 20 Oct 2012
+
+
+import fabula
+import fabula.interfaces.json_rpc
+import json
+import time
+
+def _sample_events():
+    """Auxiliary function. Return a list of typical Events, including Tiles and Entities.
+    """
+
+    tile = fabula.Tile(fabula.FLOOR, {"image/png": fabula.Asset("floor.png")})
+
+    entity = fabula.Entity("player", fabula.PLAYER, True, True, {"image/png": fabula.Asset("player.png")})
+
+    return [fabula.TriesToMoveEvent("player", (1, 2)),
+            fabula.MovesToEvent("player", (1, 2)),
+            fabula.SaysEvent("player", "Hello"),
+            fabula.ChangeMapElementEvent(tile, (1, 2, "room")),
+            fabula.SpawnEvent(entity, (1, 2, "room"))]
+
+def construction():
+    """Create 10000 Messages of typical Events.
+    """
+
+    count = 10000
+
+    start = time.perf_counter()
+
+    for i in range(count):
+
+        tile = fabula.Tile(fabula.FLOOR, {"image/png": fabula.Asset("floor.png")})
+
+        entity = fabula.Entity("player", fabula.PLAYER, True, True, {"image/png": fabula.Asset("player.png")})
+
+        fabula.Message([fabula.TriesToMoveEvent("player", (i, i)),
+                        fabula.MovesToEvent("player", (i, i)),
+                        fabula.SaysEvent("player", "Hello"),
+                        fabula.ChangeMapElementEvent(tile, (i, i, "room")),
+                        fabula.SpawnEvent(entity, (i, i, "room"))])
+
+    return time.perf_counter() - start, count
+
+def repr_eval():
+    """Serialise and recreate a Message 1000 times, as the TCP Interfaces do.
+    """
+
+    count = 1000
+
+    message = fabula.Message(_sample_events())
+
+    start = time.perf_counter()
+
+    for i in range(count):
+
+        eval(repr(message))
+
+    return time.perf_counter() - start, count
+
+def json_round_trip():
+    """Serialise and recreate 1000 client Messages using JSON, as the JSON-RPC Interface does.
+    """
+
+    count = 1000
+
+    interface = fabula.interfaces.json_rpc.JSONRPCServerInterface()
+
+    # The JSON-RPC Interface only recreates Events with plain arguments
+    #
+    events = [fabula.TriesToMoveEvent("player", (1, 2)),
+              fabula.SaysEvent("player", "Hello"),
+              fabula.TriesToLookAtEvent("player", (3, 4))]
+
+    start = time.perf_counter()
+
+    for i in range(count):
+
+        json_string = "[{}]".format(", ".join(event.json() for event in events))
+
+        interface.json_to_message(json.loads(json_string))
+
+    return time.perf_counter() - start, count
+
+BENCHMARKS = [("construction", construction),
+              ("repr_eval", repr_eval),
+              ("json_round_trip", json_round_trip)]
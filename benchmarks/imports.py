@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""Fabula Import Time Benchmarks
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 22 Oct 2012
+
+
+import os
+import statistics
+import subprocess
+import sys
+
+# Target for the import of a headless server, in seconds
+#
+SERVER_TARGET = 0.030
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Number of fresh interpreters per measurement. Single imports vary by a few
+# milliseconds with disk caches and scheduling, so the median is taken.
+#
+RUNS = 5
+
+def _import_time(modules):
+    """Auxiliary function. Import the modules given in RUNS fresh interpreters and return the median time taken in seconds.
+       A first run writes the byte code caches and is not measured.
+    """
+
+    code = """
+import time
+start = time.perf_counter()
+import {}
+print(time.perf_counter() - start)
+""".format(", ".join(modules))
+
+    environment = dict(os.environ)
+
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    timings = []
+
+    for i in range(RUNS + 1):
+
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd = DIRECTORY,
+                                         env = environment)
+
+        timings.append(float(output))
+
+    return statistics.median(timings[1:])
+
+def fabula_package():
+    """Import the fabula package only.
+    """
+
+    return _import_time(["fabula"]), 1
+
+def headless_server():
+    """Import everything a TCP server running DefaultGame needs. The target is SERVER_TARGET.
+    """
+
+    return _import_time(["fabula.run",
+                         "fabula.core.server",
+                         "fabula.plugins.serverside",
+                         "fabula.interfaces.python_tcp"]), 1
+
+BENCHMARKS = [("fabula_package", fabula_package),
+              ("headless_server", headless_server)]
+
+TARGETS = {"headless_server" : SERVER_TARGET}
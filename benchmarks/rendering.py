@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""Fabula Rendering Benchmarks
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 20 Oct 2012
+
+
+import os
+import random
+import time
+import unittest
+
+def render_room():
+    """Render 300 frames of a 50x50 tile room with 200 moving Entities on a headless display, using the Planes of fabula.plugins.pygameui.
+    """
+
+    # Render without a window
+    #
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    try:
+        import pygame
+        import planes
+        import fabula.plugins.pygameui
+
+    except ImportError as error:
+
+        raise unittest.SkipTest("{}".format(error))
+
+    size = 50
+
+    spacing = 100
+
+    entity_count = 200
+
+    frame_count = 300
+
+    generator = random.Random(0)
+
+    pygame.init()
+
+    display = planes.Display((800, 600))
+
+    animator = fabula.plugins.pygameui.MovementAnimator()
+
+    room = fabula.plugins.pygameui.RoomPlane("room",
+                                             pygame.Rect((0, 0), (size * spacing, size * spacing)),
+                                             cell_size = 4 * spacing,
+                                             animator = animator)
+
+    room.sub(fabula.plugins.pygameui.TileLayer("tiles",
+                                               pygame.Rect((0, 0), room.rect.size),
+                                               spacing))
+
+    display.sub(room)
+
+    tile_surfaces = []
+
+    for i in range(10):
+
+        surface = pygame.Surface((spacing, spacing))
+
+        surface.fill((i * 20, 100, 100))
+
+        tile_surfaces.append(surface)
+
+    for x in range(size):
+
+        for y in range(size):
+
+            name = str((x, y))
+
+            room.tiles.sub(planes.Plane(name, pygame.Rect((x * spacing, y * spacing), (spacing, spacing))))
+
+            room.tiles.set_image(name, tile_surfaces[generator.randrange(10)])
+
+    entity_planes = []
+
+    for i in range(entity_count):
+
+        plane = fabula.plugins.pygameui.EntityPlane("entity-{}".format(i),
+                                                    pygame.Rect((generator.randrange(size) * spacing,
+                                                                 generator.randrange(size) * spacing),
+                                                                (spacing, spacing)),
+                                                    animator = animator)
+
+        plane.image.fill((200, 0, 0))
+
+        room.sub(plane)
+
+        entity_planes.append(plane)
+
+    start = time.perf_counter()
+
+    for frame in range(frame_count):
+
+        # Every Entity starts a one-tile move every 10 frames
+        #
+        if not frame % 10:
+
+            for plane in entity_planes:
+
+                x, y = plane.target()
+
+                plane.move_to((x + generator.choice((-spacing, 0, spacing)), y), 10)
+
+        display.update()
+
+        display.render()
+
+        pygame.display.flip()
+
+    seconds = time.perf_counter() - start
+
+    pygame.quit()
+
+    return seconds, frame_count
+
+def animate_crowd():
+    """Update a RoomPlane with 500 EntityPlanes, each with three queued moves, for 300 frames, without a display.
+    """
+
+    try:
+        import pygame
+        import fabula.plugins.pygameui
+
+    except ImportError as error:
+
+        raise unittest.SkipTest("{}".format(error))
+
+    size = 50
+
+    spacing = 100
+
+    entity_count = 500
+
+    frame_count = 300
+
+    generator = random.Random(0)
+
+    animator = fabula.plugins.pygameui.MovementAnimator()
+
+    room = fabula.plugins.pygameui.RoomPlane("room",
+                                             pygame.Rect((0, 0), (size * spacing, size * spacing)),
+                                             cell_size = 4 * spacing,
+                                             animator = animator)
+
+    entity_planes = []
+
+    for i in range(entity_count):
+
+        plane = fabula.plugins.pygameui.EntityPlane("entity-{}".format(i),
+                                                    pygame.Rect((generator.randrange(size) * spacing,
+                                                                 generator.randrange(size) * spacing),
+                                                                (spacing, spacing)),
+                                                    animator = animator)
+
+        room.sub(plane)
+
+        entity_planes.append(plane)
+
+    start = time.perf_counter()
+
+    for frame in range(frame_count):
+
+        # Every Entity queues three one-tile moves every 30 frames
+        #
+        if not frame % 30:
+
+            for plane in entity_planes:
+
+                for i in range(3):
+
+                    x, y = plane.target()
+
+                    plane.move_to((x + generator.choice((-spacing, 0, spacing)), y), 10)
+
+        room.update()
+
+    seconds = time.perf_counter() - start
+
+    return seconds, frame_count
+
+BENCHMARKS = [("render_room", render_room),
+              ("animate_crowd", animate_crowd)]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""Fabula Room Tile Benchmark
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 19 Oct 2012
+
+import fabula
+import sys
+import time
+
+def build_room(size, distinct_tiles):
+    """Build a size x size Room from freshly created Tiles, as the Client does for incoming ChangeMapElementEvents.
+       Return the time taken in seconds.
+    """
+
+    events = []
+
+    for x in range(size):
+
+        for y in range(size):
+
+            tile = fabula.Tile(fabula.FLOOR,
+                               {"image/png": fabula.Asset("tile-{}.png".format((x * size + y) % distinct_tiles))})
+
+            events.append(fabula.ChangeMapElementEvent(tile, (x, y, "benchmark")))
+
+    room = fabula.Room("benchmark")
+
+    start = time.perf_counter()
+
+    for event in events:
+
+        room.process_ChangeMapElementEvent(event)
+
+        # This is what PygameUserInterface.process_ChangeMapElementEvent()
+        # does to share asset data.
+        #
+        room.tile_registry[event.tile]
+
+    return time.perf_counter() - start
+
+def tile_registry():
+    """Build a 100x100 room from 100 distinct Tiles for benchmarks/run.py.
+    """
+
+    return build_room(100, 100), 100 * 100
+
+BENCHMARKS = [("tile_registry", tile_registry)]
+
+def main():
+    """Build 100x100 rooms with different numbers of distinct Tiles and print the timings.
+    """
+
+    size = 100
+
+    if len(sys.argv) > 1:
+
+        size = int(sys.argv[1])
+
+    for distinct_tiles in (1, 10, 100, 1000):
+
+        seconds = min(build_room(size, distinct_tiles) for i in range(3))
+
+        print("{0}x{0} room, {1} distinct tiles: {2:.4f} s".format(size, distinct_tiles, seconds))
+
+    return
+
+if __name__ == "__main__":
+
+    main()
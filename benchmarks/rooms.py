@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""Fabula Room Benchmarks
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 20 Oct 2012
+
+
+import fabula
+import fabula.assets
+import fabula.core.client
+import fabula.interfaces
+import fabula.plugins.serverside
+import fabula.plugins.ui
+import os
+import random
+import tempfile
+import time
+
+def _floor_room(size):
+    """Auxiliary function. Return a size x size Room with FLOOR Tiles.
+    """
+
+    room = fabula.Room("benchmark")
+
+    tile = fabula.Tile(fabula.FLOOR, {"image/png": fabula.Asset("floor.png")})
+
+    for x in range(size):
+
+        for y in range(size):
+
+            room.process_ChangeMapElementEvent(fabula.ChangeMapElementEvent(tile, (x, y, "benchmark")))
+
+    return room
+
+def spawn_move_delete():
+    """Spawn 1000 Entities in a 100x100 Room, move each of them 10 times, then delete them.
+    """
+
+    size = 100
+
+    count = 1000
+
+    room = _floor_room(size)
+
+    generator = random.Random(0)
+
+    identifiers = ["entity-{}".format(i) for i in range(count)]
+
+    spawn_events = [fabula.SpawnEvent(fabula.Entity(identifier, fabula.NPC, False, True, {}),
+                                      (generator.randrange(size), generator.randrange(size), "benchmark"))
+                    for identifier in identifiers]
+
+    moves_to_events = [fabula.MovesToEvent(identifier, (generator.randrange(size), generator.randrange(size)))
+                       for i in range(10) for identifier in identifiers]
+
+    delete_events = [fabula.DeleteEvent(identifier) for identifier in identifiers]
+
+    start = time.perf_counter()
+
+    for event in spawn_events:
+
+        room.process_SpawnEvent(event)
+
+    for event in moves_to_events:
+
+        room.process_MovesToEvent(event)
+
+    for event in delete_events:
+
+        room.process_DeleteEvent(event)
+
+    return time.perf_counter() - start, len(spawn_events) + len(moves_to_events) + len(delete_events)
+
+def load_room_from_file():
+    """Parse a generated 200x200 floorplan with 1000 Entities.
+    """
+
+    size = 200
+
+    generator = random.Random(0)
+
+    directory = tempfile.mkdtemp()
+
+    filename = os.path.join(directory, "benchmark.floorplan")
+
+    with open(filename, "wt") as floorplan:
+
+        for x in range(size):
+
+            for y in range(size):
+
+                line = '"({}, {})"\t"FLOOR, floor-{}.png"'.format(x, y, generator.randrange(10))
+
+                if generator.randrange(size * size) < 1000:
+
+                    line += '\t"npc-{}-{},NPC,False,True,npc.png"'.format(x, y)
+
+                floorplan.write(line + "\n")
+
+    start = time.perf_counter()
+
+    event_list = fabula.plugins.serverside.load_room_from_file(filename)
+
+    seconds = time.perf_counter() - start
+
+    os.remove(filename)
+
+    os.rmdir(directory)
+
+    return seconds, len(event_list)
+
+def client_enter_room():
+    """Let a Client enter a 200x200 Room with 1000 Entities, sent in a single Message.
+    """
+
+    size = 200
+
+    generator = random.Random(0)
+
+    client = fabula.core.client.Client(fabula.interfaces.Interface())
+
+    client.client_id = "player"
+
+    client.plugin = fabula.plugins.ui.UserInterface(fabula.assets.Assets(), 60, client)
+
+    tiles = [fabula.Tile(fabula.FLOOR, {"image/png": fabula.Asset("floor-{}.png".format(i))})
+             for i in range(10)]
+
+    event_list = [fabula.EnterRoomEvent("player", "benchmark")]
+
+    event_list.extend(fabula.ChangeMapElementEvent(generator.choice(tiles), (x, y, "benchmark"))
+                      for x in range(size) for y in range(size))
+
+    event_list.extend(fabula.SpawnEvent(fabula.Entity("npc-{}".format(i), fabula.NPC, False, True, {}),
+                                        (generator.randrange(size), generator.randrange(size), "benchmark"))
+                      for i in range(1000))
+
+    event_list.append(fabula.RoomCompleteEvent())
+
+    message = fabula.Message([])
+
+    start = time.perf_counter()
+
+    client._dispatch_events(event_list, message)
+
+    return time.perf_counter() - start, len(event_list)
+
+BENCHMARKS = [("spawn_move_delete", spawn_move_delete),
+              ("load_room_from_file", load_room_from_file),
+              ("client_enter_room", client_enter_room)]
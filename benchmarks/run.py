@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""Fabula Benchmark Runner
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 20 Oct 2012
+#
+# Usage:
+#
+#     python3 benchmarks/run.py [--save-baseline] [--repeat N] [NAME ...]
+#
+# Runs all benchmarks, or those whose name contains one of the NAMEs given,
+# writes the results to benchmarks/results.json and compares them to
+# benchmarks/baseline.json if that file exists. --save-baseline writes the
+# results to benchmarks/baseline.json as well. The exit status is 1 if any
+# benchmark is slower than the baseline by more than TOLERANCE, or misses
+# its target.
+#
+# Each benchmark module has a list BENCHMARKS of (name, function) tuples.
+# The function does its own setup, times the code under test using
+# time.perf_counter() and returns a tuple (seconds, operations). It may raise
+# unittest.SkipTest if the benchmark can not run in this environment.
+#
+# A module may also have a dict TARGETS mapping benchmark names to the
+# maximum median time per operation in seconds. Benchmarks above their
+# target are reported with a warning, and as failures if they exceed it by
+# more than TARGET_MARGIN.
+
+import os
+import sys
+
+# Make fabula importable when running from a source checkout
+#
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fabula
+import importlib
+import json
+import logging
+import platform
+import statistics
+import unittest
+
+MODULES = ["imports", "events", "rooms", "room_tiles", "server", "rendering"]
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+RESULTS_FILE = os.path.join(DIRECTORY, "results.json")
+
+BASELINE_FILE = os.path.join(DIRECTORY, "baseline.json")
+
+# A benchmark is reported as a regression if its median time per operation
+# exceeds the baseline by more than this fraction.
+#
+TOLERANCE = 0.2
+
+# A benchmark fails its target only if its median time per operation exceeds
+# the target by more than this fraction. Smaller excesses are within the
+# noise of a busy machine and only printed as a warning.
+#
+TARGET_MARGIN = 0.5
+
+def run_benchmarks(names = None, repeat = 5):
+    """Run the benchmarks whose name contains one of the strings in names, or all of them if names is empty.
+       Return a dict mapping "module.name" to a dict of results.
+    """
+
+    results = {}
+
+    for module_name in MODULES:
+
+        module = importlib.import_module(module_name)
+
+        for name, function in module.BENCHMARKS:
+
+            full_name = "{}.{}".format(module_name, name)
+
+            if names and not [part for part in names if part in full_name]:
+
+                continue
+
+            print("{:40} ".format(full_name), end = "", flush = True)
+
+            timings = []
+
+            try:
+                for i in range(repeat):
+
+                    seconds, operations = function()
+
+                    timings.append(seconds / operations)
+
+            except unittest.SkipTest as exception:
+
+                print("skipped: {}".format(exception))
+
+                results[full_name] = {"skipped" : str(exception)}
+
+                continue
+
+            median = statistics.median(timings)
+
+            results[full_name] = {"operations" : operations,
+                                  "repeat" : repeat,
+                                  "min" : min(timings),
+                                  "median" : median,
+                                  "ops_per_second" : 1.0 / median}
+
+            print("{:12.3f} us/op {:14.1f} ops/s".format(median * 1e6, 1.0 / median), end = "")
+
+            target = getattr(module, "TARGETS", {}).get(name)
+
+            if target is not None:
+
+                results[full_name]["target"] = target
+
+                if median > target * (1.0 + TARGET_MARGIN):
+
+                    print("  MISSED TARGET OF {:.3f} us/op".format(target * 1e6), end = "")
+
+                elif median > target:
+
+                    print("  WARNING: above target of {:.3f} us/op".format(target * 1e6), end = "")
+
+            print()
+
+    return results
+
+def missed_targets(results):
+    """Return a list of the names of benchmarks in results, as returned by run_benchmarks(), whose median exceeds their target by more than TARGET_MARGIN.
+    """
+
+    return [full_name for full_name, result in sorted(results.items())
+            if "target" in result and result["median"] > result["target"] * (1.0 + TARGET_MARGIN)]
+
+def compare(results, baseline):
+    """Print a comparison of results with baseline, both as returned by run_benchmarks().
+       Return a list of the names of benchmarks that are slower than the
+       baseline by more than TOLERANCE.
+    """
+
+    regressions = []
+
+    print("\nComparison with baseline:\n")
+
+    for full_name, result in sorted(results.items()):
+
+        if "median" not in result or "median" not in baseline.get(full_name, {}):
+
+            continue
+
+        change = result["median"] / baseline[full_name]["median"] - 1.0
+
+        flag = ""
+
+        if change > TOLERANCE:
+
+            flag = "  REGRESSION"
+
+            regressions.append(full_name)
+
+        print("{:40} {:+8.1%}{}".format(full_name, change, flag))
+
+    return regressions
+
+def main():
+    """Parse the command line, run the benchmarks, write and compare the results.
+    """
+
+    arguments = sys.argv[1:]
+
+    save_baseline = False
+
+    repeat = 5
+
+    names = []
+
+    while arguments:
+
+        argument = arguments.pop(0)
+
+        if argument == "--save-baseline":
+
+            save_baseline = True
+
+        elif argument == "--repeat":
+
+            repeat = int(arguments.pop(0))
+
+        else:
+            names.append(argument)
+
+    # Benchmark the engines, not the log handlers
+    #
+    fabula.LOGGER.setLevel(logging.CRITICAL)
+
+    results = {"environment" : {"fabula" : fabula.VERSION,
+                                "python" : platform.python_version(),
+                                "implementation" : platform.python_implementation(),
+                                "machine" : platform.machine(),
+                                "system" : platform.system()},
+               "benchmarks" : run_benchmarks(names, repeat)}
+
+    with open(RESULTS_FILE, "wt", encoding = "utf8") as results_file:
+
+        json.dump(results, results_file, indent = 1, sort_keys = True)
+
+    print("\nResults written to {}".format(RESULTS_FILE))
+
+    regressions = []
+
+    if os.path.exists(BASELINE_FILE):
+
+        with open(BASELINE_FILE, "rt", encoding = "utf8") as baseline_file:
+
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results["benchmarks"], baseline["benchmarks"])
+
+    if save_baseline:
+
+        with open(BASELINE_FILE, "wt", encoding = "utf8") as baseline_file:
+
+            json.dump(results, baseline_file, indent = 1, sort_keys = True)
+
+        print("Baseline written to {}".format(BASELINE_FILE))
+
+    missed = missed_targets(results["benchmarks"])
+
+    if missed:
+
+        print("\nMissed targets: {}".format(", ".join(missed)))
+
+    if regressions:
+
+        print("\n{} regressions.".format(len(regressions)))
+
+    if missed or regressions:
+
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+
+"""Fabula Server Benchmarks
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 20 Oct 2012
+
+
+import fabula
+import fabula.assets
+import fabula.core.server
+import fabula.interfaces
+import fabula.interfaces.python_tcp
+import fabula.plugins.serverside
+import os
+import random
+import resource
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+def _write_floorplan(size, identifiers):
+    """Auxiliary function. Write a size x size default.floorplan to the current directory, with a PLAYER Entity for each identifier in the first row.
+    """
+
+    with open("default.floorplan", "wt") as floorplan:
+
+        for x in range(size):
+
+            for y in range(size):
+
+                line = '"({}, {})"\t"FLOOR, floor.png"'.format(x, y)
+
+                if y == 0 and x < len(identifiers):
+
+                    line += '\t"{},PLAYER,True,True,player.png"'.format(identifiers[x])
+
+                floorplan.write(line + "\n")
+
+    return
+
+def _setup_server(interface, identifiers):
+    """Auxiliary function. Return a Server running DefaultGame, using interface, in a Room with players for all identifiers.
+       The current directory must be writable.
+    """
+
+    _write_floorplan(max(len(identifiers), 20), identifiers)
+
+    # Framerate 0 removes the sleep from Server._main_loop(), action time 0
+    # calls DefaultGame.next_action() in every iteration.
+    #
+    server = fabula.core.server.Server(interface, 0, 0)
+
+    server.set_plugin(fabula.plugins.serverside.DefaultGame(server))
+
+    return server
+
+def main_loop_standalone():
+    """Run Server._main_loop() with 20 clients connected through plain MessageBuffers, each sending a TriesToMoveEvent per iteration.
+    """
+
+    client_count = 20
+
+    rounds = 10
+
+    identifiers = ["bot-{}".format(i) for i in range(client_count)]
+
+    generator = random.Random(0)
+
+    cwd = os.getcwd()
+
+    directory = tempfile.mkdtemp()
+
+    os.chdir(directory)
+
+    try:
+        server = _setup_server(fabula.interfaces.Interface(), identifiers)
+
+        for identifier in identifiers:
+
+            server.interface.connections[identifier] = fabula.interfaces.MessageBuffer()
+
+            server.interface.connections[identifier].messages_for_local.append(fabula.Message([fabula.InitEvent(identifier)]))
+
+            server._main_loop()
+
+        for identifier in identifiers:
+
+            server.interface.connections[identifier].messages_for_remote.clear()
+
+        start = time.perf_counter()
+
+        for i in range(rounds):
+
+            for identifier in identifiers:
+
+                target = (generator.randrange(20), generator.randrange(20))
+
+                server.interface.connections[identifier].messages_for_local.append(fabula.Message([fabula.TriesToMoveEvent(identifier, target)]))
+
+            server._main_loop()
+
+            for identifier in identifiers:
+
+                server.interface.connections[identifier].messages_for_remote.clear()
+
+        seconds = time.perf_counter() - start
+
+        server._close_logfile()
+
+    finally:
+        os.chdir(cwd)
+
+        shutil.rmtree(directory)
+
+    return seconds, rounds * client_count
+
+def _receive_until(sockets, buffers, pattern):
+    """Auxiliary function. Read from sockets into buffers until each buffer contains the pattern formatted with the respective identifier.
+       sockets and buffers are dicts indexed by identifier. Matched data is
+       removed from the buffers.
+    """
+
+    pending = set(sockets.keys())
+
+    while pending:
+
+        for identifier in list(pending):
+
+            try:
+                chunk = sockets[identifier].recv(65536)
+
+            except BlockingIOError:
+
+                chunk = b""
+
+            buffers[identifier].extend(chunk)
+
+            if bytes(pattern.format(identifier), "utf8") in buffers[identifier]:
+
+                buffers[identifier].clear()
+
+                pending.discard(identifier)
+
+        time.sleep(0.001)
+
+    return
+
+def main_loop_tcp():
+    """Measure round trips of TriesToMoveEvents from 10 clients over loopback TCP, with the Server main loop running in a thread.
+    """
+
+    client_count = 10
+
+    rounds = 3
+
+    identifiers = ["bot-{}".format(i) for i in range(client_count)]
+
+    generator = random.Random(0)
+
+    cwd = os.getcwd()
+
+    directory = tempfile.mkdtemp()
+
+    os.chdir(directory)
+
+    interface = fabula.interfaces.python_tcp.TCPServerInterface()
+
+    interface.connect(("127.0.0.1", 0))
+
+    port = interface.server.server_address[1]
+
+    interface_thread = threading.Thread(target = interface.handle_messages)
+
+    interface_thread.start()
+
+    server = _setup_server(interface, identifiers)
+
+    def run_server():
+
+        while not server.exit_requested:
+
+            server._main_loop()
+
+            # Leave some time to the Interface threads
+            #
+            time.sleep(0.001)
+
+    server_thread = threading.Thread(target = run_server)
+
+    server_thread.start()
+
+    sockets = {}
+
+    buffers = {}
+
+    try:
+        for identifier in identifiers:
+
+            sockets[identifier] = socket.create_connection(("127.0.0.1", port))
+
+            sockets[identifier].setblocking(False)
+
+            buffers[identifier] = bytearray()
+
+            sockets[identifier].sendall(bytes(repr(fabula.Message([fabula.InitEvent(identifier)])) + "\n\n", "utf8"))
+
+            _receive_until({identifier : sockets[identifier]}, buffers, "RoomCompleteEvent")
+
+        start = time.perf_counter()
+
+        for i in range(rounds):
+
+            for identifier in identifiers:
+
+                target = (generator.randrange(20), generator.randrange(20))
+
+                sockets[identifier].sendall(bytes(repr(fabula.Message([fabula.TriesToMoveEvent(identifier, target)])) + "\n\n", "utf8"))
+
+            # Every client gets an answer to its own attempt
+            #
+            _receive_until(sockets, buffers, "Event(identifier = '{}'")
+
+        seconds = time.perf_counter() - start
+
+    finally:
+        server.exit_requested = True
+
+        server_thread.join()
+
+        # The Interface sends pending Messages before shutting down, so keep
+        # the client sockets open until it is done.
+        #
+        interface.shutdown()
+
+        interface_thread.join()
+
+        for client_socket in sockets.values():
+
+            client_socket.close()
+
+        server._close_logfile()
+
+        os.chdir(cwd)
+
+        shutil.rmtree(directory)
+
+    return seconds, rounds * client_count
+
+def interface_tcp_500():
+    """Measure a round trip of a Message between each of 500 clients and a bare TCPServerInterface.
+       The sockets use file descriptors beyond 1024.
+    """
+
+    client_count = 500
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if soft < 4 * client_count:
+
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(4 * client_count, hard), hard))
+
+    interface = fabula.interfaces.python_tcp.TCPServerInterface()
+
+    interface.connect(("127.0.0.1", 0))
+
+    interface_thread = threading.Thread(target = interface.handle_messages)
+
+    interface_thread.start()
+
+    sockets = []
+
+    data = bytes(repr(fabula.Message([])) + "\n\n", "utf8")
+
+    try:
+        for i in range(client_count):
+
+            sockets.append(socket.create_connection(interface.server.server_address))
+
+        while len(interface.connections) < client_count:
+
+            time.sleep(0.01)
+
+        message_buffers = [message_buffer for connector, message_buffer in interface.connections.snapshot]
+
+        start = time.perf_counter()
+
+        for client_socket in sockets:
+
+            client_socket.sendall(data)
+
+        for message_buffer in message_buffers:
+
+            while not message_buffer.messages_for_local.wait(5.0):
+
+                pass
+
+            message_buffer.send_message(message_buffer.grab_message())
+
+        for client_socket in sockets:
+
+            received = b""
+
+            while len(received) < len(data):
+
+                received += client_socket.recv(4096)
+
+        seconds = time.perf_counter() - start
+
+    finally:
+        interface.shutdown()
+
+        interface_thread.join()
+
+        for client_socket in sockets:
+
+            client_socket.close()
+
+    return seconds, client_count
+
+def next_action():
+    """Call DefaultGame.next_action() with 1000 moving Entities in a 100x100 Room.
+    """
+
+    size = 100
+
+    count = 1000
+
+    calls = 10
+
+    generator = random.Random(0)
+
+    server = fabula.core.server.Server(fabula.interfaces.Interface(), 0, 0)
+
+    plugin = fabula.plugins.serverside.DefaultGame(server)
+
+    server.set_plugin(plugin)
+
+    room = fabula.Room("benchmark")
+
+    server.room_by_id["benchmark"] = room
+
+    tile = fabula.Tile(fabula.FLOOR, {})
+
+    for x in range(size):
+
+        for y in range(size):
+
+            room.process_ChangeMapElementEvent(fabula.ChangeMapElementEvent(tile, (x, y, "benchmark")))
+
+    for i in range(count):
+
+        identifier = "npc-{}".format(i)
+
+        room.process_SpawnEvent(fabula.SpawnEvent(fabula.Entity(identifier, fabula.NPC, False, True, {}),
+                                                  (generator.randrange(size), generator.randrange(size), "benchmark")))
+
+        plugin.tries_to_move_dict[identifier] = (generator.randrange(size), generator.randrange(size))
+
+        plugin.path_dict[identifier] = []
+
+    seconds = 0.0
+
+    for i in range(calls):
+
+        start = time.perf_counter()
+
+        event_list = plugin.next_action()
+
+        seconds += time.perf_counter() - start
+
+        # Apply the movements, like the Server would
+        #
+        for event in event_list:
+
+            if isinstance(event, fabula.MovesToEvent):
+
+                room.process_MovesToEvent(event)
+
+    return seconds, calls * count
+
+BENCHMARKS = [("main_loop_standalone", main_loop_standalone),
+              ("main_loop_tcp", main_loop_tcp),
+              ("interface_tcp_500", interface_tcp_500),
+              ("next_action", next_action)]
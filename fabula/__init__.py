@@ -213,7 +213,7 @@ import fabula.eventprocessor
 import re
 import logging
 import json
-import configparser
+import importlib
 
 ############################################################
 # Version Information
@@ -1212,6 +1212,10 @@ class Tile:
        Tile.assets
            A dict, mapping strings denoting content types as per
            [RFC 2045](https://tools.ietf.org/html/rfc2045) to Asset instances.
+
+       Tiles compare equal and hash alike if they have the same tile_type and
+       the same asset URIs, regardless of the asset data. This allows a Tile to
+       be used as a dict key.
     """
 
     def __init__(self, tile_type, assets):
@@ -1224,16 +1228,28 @@ class Tile:
         self.tile_type = tile_type
         self.assets = dict(assets)
 
+    def key(self):
+        """Return a tuple (tile_type, ((content_type, uri), ...)) identifying the Tile.
+        """
+
+        return (self.tile_type,
+                tuple(sorted((content_type, asset.uri) for content_type, asset in self.assets.items())))
+
+    def __hash__(self):
+        """Return a hash of Tile.key(), so Tiles can be used in sets and as dict keys.
+        """
+
+        return hash(self.key())
+
     def __eq__(self, other):
         """Allow the == operator to be used on Tiles.
            Check if the object given has the same class, the same tile_type and
-           the same asset_desc.
+           the same asset URIs.
         """
 
         if other.__class__ == self.__class__:
 
-            if (other.tile_type == self.tile_type
-                and other.assets == self.assets):
+            if other.key() == self.key():
 
                 return True
 
@@ -1246,13 +1262,12 @@ class Tile:
     def __ne__(self, other):
         """Allow the != operator to be used on Tiles.
            Check if the object given has a different class or a different
-           tile_type or different asset_desc.
+           tile_type or different asset URIs.
         """
 
         if other.__class__ == self.__class__:
 
-            if (other.tile_type != self.tile_type
-                or other.assets != self.assets):
+            if other.key() != self.key():
 
                 return True
 
@@ -1326,6 +1341,11 @@ class Room(fabula.eventprocessor.EventProcessor):
        Room.tile_list
            A list of tiles for the current room, for easy asset fetching.
 
+       Room.tile_registry
+           A dict mapping each Tile in Room.tile_list to itself. Equal Tiles
+           share the registered instance, and thus their asset data. Use
+           Room.tile_registry[tile] to look up the registered instance.
+
        Room.active_clients
            A dict mapping connectors from Interface.connections.keys() to the
            respective client identifier. Dict elements represent the clients who
@@ -1359,6 +1379,8 @@ class Room(fabula.eventprocessor.EventProcessor):
 
         self.tile_list = []
 
+        self.tile_registry = {}
+
         self.entity_dict = {}
         self.entity_locations = {}
 
@@ -1372,19 +1394,25 @@ class Room(fabula.eventprocessor.EventProcessor):
            This method assumes that event.location is (x, y, "room_identifier").
         """
 
-        if event.location[:2] in self.floor_plan:
+        # Avoid duplicates. Equal Tiles share the registered instance.
+        #
+        tile = self.tile_registry.get(event.tile)
 
-            self.floor_plan[event.location[:2]].tile = event.tile
+        if tile is None:
 
-        else:
+            tile = event.tile
 
-            self.floor_plan[event.location[:2]] = FloorPlanElement(event.tile)
+            self.tile_registry[tile] = tile
 
-        # Avoid duplicates
-        #
-        if event.tile not in self.tile_list:
+            self.tile_list.append(tile)
+
+        if event.location[:2] in self.floor_plan:
 
-            self.tile_list.append(event.tile)
+            self.floor_plan[event.location[:2]].tile = tile
+
+        else:
+
+            self.floor_plan[event.location[:2]] = FloorPlanElement(tile)
 
         return
 
@@ -1421,6 +1449,94 @@ class Room(fabula.eventprocessor.EventProcessor):
 
         return
 
+    def build(self, event_list):
+        """Apply a list of ChangeMapElementEvents and SpawnEvents in one pass.
+           This has the same result as calling Room.process_ChangeMapElementEvent()
+           and Room.process_SpawnEvent() for each Event in turn, but nothing is
+           logged per Event, and the Room is only changed when all SpawnEvents
+           have been checked. If an Entity is to be spawned at an undefined
+           location, an Exception is raised and the Room is left as it was.
+           Map elements are applied before Entities, so the order of the
+           Events in event_list does not matter. Tiles which are replaced
+           within event_list are not added to Room.tile_list.
+
+           This method assumes that event.location is (x, y, "room_identifier").
+        """
+
+        tiles = {}
+
+        spawn_events = []
+
+        for event in event_list:
+
+            if event.__class__ is ChangeMapElementEvent:
+
+                tiles[event.location[:2]] = event.tile
+
+            else:
+                spawn_events.append(event)
+
+        spawns = {}
+
+        for event in spawn_events:
+
+            if event.entity.identifier in self.entity_dict or event.entity.identifier in spawns:
+
+                msg = "Entity '{}', to be spawned at {}, already exists in room '{}'"
+
+                fabula.LOGGER.warning(msg.format(event.entity.identifier,
+                                                 event.location,
+                                                 self.identifier))
+
+            elif event.location[:2] not in self.floor_plan and event.location[:2] not in tiles:
+
+                msg = "cannot spawn entity '{}' at undefined location {}"
+
+                raise Exception(msg.format(event.entity.identifier,
+                                           event.location))
+
+            else:
+                spawns[event.entity.identifier] = event
+
+        # All checks passed, now change the Room.
+        #
+        tile_registry = self.tile_registry
+
+        floor_plan = self.floor_plan
+
+        new_elements = {}
+
+        for location, tile in tiles.items():
+
+            # Avoid duplicates. Equal Tiles share the registered instance.
+            #
+            registered_tile = tile_registry.get(tile)
+
+            if registered_tile is None:
+
+                registered_tile = tile_registry[tile] = tile
+
+                self.tile_list.append(tile)
+
+            if location in floor_plan:
+
+                floor_plan[location].tile = registered_tile
+
+            else:
+                new_elements[location] = FloorPlanElement(registered_tile)
+
+        floor_plan.update(new_elements)
+
+        for identifier, event in spawns.items():
+
+            floor_plan[event.location[:2]].entities.append(event.entity)
+
+        self.entity_dict.update((identifier, event.entity) for identifier, event in spawns.items())
+
+        self.entity_locations.update((identifier, event.location[:2]) for identifier, event in spawns.items())
+
+        return
+
     def process_MovesToEvent(self, event):
         """Update all affected dicts.
         """
@@ -1810,10 +1926,57 @@ LOGGER = logging.getLogger("fabula")
 ############################################################
 # Config
 
-# Initialise parser and read config file
+# fabula.CONFIGPARSER is a configparser.ConfigParser holding the contents of
+# fabula.conf in the current directory, or None if there is no such file.
+# The file is read by load_config() upon first access to fabula.CONFIGPARSER,
+# see __getattr__() below.
+
+def load_config(filename = "fabula.conf"):
+    """Read the config file given and set fabula.CONFIGPARSER accordingly.
+       Returns the new value of fabula.CONFIGPARSER.
+    """
+
+    global CONFIGPARSER
+
+    import configparser
+
+    CONFIGPARSER = configparser.ConfigParser()
+
+    if not len(CONFIGPARSER.read(filename)):
+
+        CONFIGPARSER = None
+
+    return CONFIGPARSER
+
+############################################################
+# Lazy loading
+
+# Submodules of the fabula package which are imported upon first access to
+# fabula.<submodule>, so that "import fabula" does not pay for client, server,
+# asset or user interface code that is never used.
 #
-CONFIGPARSER = configparser.ConfigParser()
+SUBMODULES = ("assets",
+              "bots",
+              "core",
+              "interfaces",
+              "journal",
+              "metrics",
+              "plugins",
+              "profiling",
+              "run")
+
+def __getattr__(name):
+    """Called by Python for module attributes that do not exist (PEP 562).
+       Imports the submodules in fabula.SUBMODULES and reads fabula.conf
+       upon first access.
+    """
+
+    if name == "CONFIGPARSER":
+
+        return load_config()
+
+    if name in SUBMODULES:
 
-if not len(CONFIGPARSER.read("fabula.conf")):
+        return importlib.import_module("fabula." + name)
 
-    CONFIGPARSER = None
+    raise AttributeError("module 'fabula' has no attribute '{}'".format(name))
@@ -28,31 +28,446 @@
 import fabula
 import os.path
 import glob
+import io
+import collections
+import threading
+import struct
+import sys
+
+# zipfile and mmap are only needed for archives and are imported upon use,
+# as is site for searching installation prefixes. This keeps the import of
+# fabula.assets cheap.
 
 # TODO: support tar files with lzma compression
 # TODO: work as a standalone module
-# TODO: support archive creation; possibly transparent compared to working with actual files on disk
 
-# TODO: importing "site" leads to defunct executables using cx_Freeze 2.4.3 with Python 3.2 on Unix
-#
-import site
+class LRUCache:
+    """A dict-like cache which discards the least recently used entries when the sum of entry sizes exceeds a limit.
 
-import sys
+       Attributes:
+
+       LRUCache.max_size
+           The maximum sum of entry sizes. Entries larger than this are not
+           stored at all.
+
+       LRUCache.size
+           The current sum of entry sizes.
+
+       LRUCache.entries
+           A collections.OrderedDict mapping keys to (value, size) tuples,
+           least recently used first.
+    """
+
+    def __init__(self, max_size):
+        """Initialise.
+        """
+
+        self.max_size = max_size
+
+        self.size = 0
+
+        self.entries = collections.OrderedDict()
+
+        return
+
+    def get(self, key, default = None):
+        """Return the value for key and mark it as recently used, or return default.
+        """
+
+        if key not in self.entries:
+
+            return default
+
+        self.entries.move_to_end(key)
+
+        return self.entries[key][0]
+
+    def store(self, key, value, size):
+        """Store value under key, then discard least recently used entries until the cache fits into LRUCache.max_size.
+        """
+
+        self.discard(key)
+
+        if size > self.max_size:
+
+            fabula.LOGGER.debug("not caching '{}', size {} exceeds cache size".format(key, size))
+
+            return
+
+        self.entries[key] = (value, size)
+
+        self.size += size
+
+        while self.size > self.max_size:
+
+            old_key, (old_value, old_size) = self.entries.popitem(last = False)
+
+            self.size -= old_size
+
+            fabula.LOGGER.debug("discarded '{}' from cache".format(old_key))
+
+        return
+
+    def discard(self, key):
+        """Remove the entry for key, if there is one.
+        """
+
+        if key in self.entries:
+
+            self.size -= self.entries.pop(key)[1]
+
+        return
+
+    def clear(self):
+        """Remove all entries.
+        """
+
+        self.entries.clear()
+
+        self.size = 0
+
+        return
+
+    def __contains__(self, key):
+        """Return True if there is an entry for key.
+        """
+
+        return key in self.entries
+
+    def __len__(self):
+        """Return the number of entries.
+        """
+
+        return len(self.entries)
+
+class MemoryViewFile(io.RawIOBase):
+    """A read-only, seekable file-like object reading from a memoryview without copying it.
+
+       Attributes:
+
+       MemoryViewFile.view
+           The memoryview read from.
+
+       MemoryViewFile.position
+           The current read position.
+    """
+
+    def __init__(self, view):
+        """Initialise.
+        """
+
+        io.RawIOBase.__init__(self)
+
+        self.view = view
+
+        self.position = 0
+
+        return
+
+    def readable(self):
+        """Return True.
+        """
+
+        return True
+
+    def seekable(self):
+        """Return True.
+        """
+
+        return True
+
+    def readinto(self, buffer):
+        """Read bytes into the buffer given and return the number of bytes read.
+        """
+
+        length = min(len(buffer), len(self.view) - self.position)
+
+        buffer[:length] = self.view[self.position:self.position + length]
+
+        self.position += length
+
+        return length
+
+    def seek(self, offset, whence = io.SEEK_SET):
+        """Change the read position and return it.
+        """
+
+        if whence == io.SEEK_CUR:
+
+            offset += self.position
+
+        elif whence == io.SEEK_END:
+
+            offset += len(self.view)
+
+        self.position = max(0, offset)
+
+        return self.position
+
+    def tell(self):
+        """Return the current read position.
+        """
+
+        return self.position
+
+class PackedArchive:
+    """A read-only ZIP archive of assets, memory-mapped once.
+
+       Members stored without compression, as written by
+       fabula.assets.pack_directory(), are returned as slices of the mapped
+       file without copying. Compressed members are decompressed on access.
+
+       Attributes:
+
+       PackedArchive.filename
+           The name of the archive file.
+
+       PackedArchive.zip_file
+           The zipfile.ZipFile of the archive.
+
+       PackedArchive.mapped_file
+           An mmap.mmap of the whole archive.
+
+       PackedArchive.members
+           A dict mapping member names to zipfile.ZipInfo instances.
+
+       PackedArchive.data_offsets
+           A dict mapping member names of uncompressed members to the offset
+           of their data in the archive.
+    """
+
+    def __init__(self, filename):
+        """Open and map the archive. Raises IOError if it is not a ZIP file.
+        """
+
+        import zipfile
+        import mmap
+
+        self.filename = filename
+
+        try:
+            self.zip_file = zipfile.ZipFile(filename, "r")
+
+        except zipfile.BadZipFile:
+
+            msg = "'{}' is not a ZIP archive".format(filename)
+
+            fabula.LOGGER.error(msg)
+
+            raise IOError(msg)
+
+        self.members = dict((info.filename, info) for info in self.zip_file.infolist()
+                            if not info.filename.endswith("/"))
+
+        self.mapped_file = None
+
+        self.data_offsets = {}
+
+        self.file = open(filename, "rb")
+
+        if os.path.getsize(filename):
+
+            self.mapped_file = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+
+            for name, info in self.members.items():
+
+                if info.compress_type == zipfile.ZIP_STORED:
+
+                    # Skip the local file header. Its name and extra field
+                    # lengths may differ from the central directory.
+                    #
+                    name_length, extra_length = struct.unpack("<HH",
+                                                              self.mapped_file[info.header_offset + 26:info.header_offset + 30])
+
+                    self.data_offsets[name] = info.header_offset + 30 + name_length + extra_length
+
+        fabula.LOGGER.info("{} assets in archive '{}', {} memory-mapped".format(len(self.members),
+                                                                               filename,
+                                                                               len(self.data_offsets)))
+
+        return
+
+    def __contains__(self, name):
+        """Return True if the archive has a member of the name given.
+        """
+
+        return name in self.members
+
+    def names(self):
+        """Return a list of member names.
+        """
+
+        return list(self.members.keys())
+
+    def view(self, name):
+        """Return the contents of the member given as a memoryview.
+
+           Raises KeyError if there is no such member.
+        """
+
+        if name in self.data_offsets:
+
+            offset = self.data_offsets[name]
+
+            return memoryview(self.mapped_file)[offset:offset + self.members[name].file_size]
+
+        return memoryview(self.zip_file.read(name))
+
+    def open(self, name, mode = "b"):
+        """Return a file-like object reading the member given.
+
+           mode can be "b" for binary (default) or "t" for text mode.
+        """
+
+        file = MemoryViewFile(self.view(name))
+
+        if mode == "t":
+
+            return io.TextIOWrapper(io.BufferedReader(file))
+
+        return file
+
+    def close(self):
+        """Close the archive.
+        """
+
+        # Views handed out keep the map alive, so do not close it explicitly
+        #
+        self.mapped_file = None
+
+        self.zip_file.close()
+
+        self.file.close()
+
+        return
+
+def pack_directory(directory, filename):
+    """Write all files below the directory given to a ZIP archive suitable for PackedArchive.
+
+       Members are named by their path relative to the directory, using "/" as
+       separator. They are stored without compression, so they can be
+       memory-mapped. Returns the number of files packed.
+    """
+
+    import zipfile
+
+    count = 0
+
+    archive = zipfile.ZipFile(filename, "w", zipfile.ZIP_STORED)
+
+    for dirpath, dirnames, filenames in os.walk(directory):
+
+        # Deterministic archives
+        #
+        dirnames.sort()
+
+        for name in sorted(filenames):
+
+            path = os.path.join(dirpath, name)
+
+            if os.path.abspath(path) == os.path.abspath(filename):
+
+                continue
+
+            if not os.path.isfile(path):
+
+                fabula.LOGGER.warning("skipping '{}', not a regular file or broken link".format(path))
+
+                continue
+
+            archive.write(path,
+                          os.path.relpath(path, directory).replace(os.sep, "/"))
+
+            count += 1
+
+    archive.close()
+
+    fabula.LOGGER.info("packed {} files from '{}' into '{}'".format(count, directory, filename))
+
+    return count
 
 class Assets:
     """An assets manager which returns file-like objects for local files.
        It is used to retrieve media data - images, animations, 3D models, sound.
+
+       Resolved file paths and file contents are cached, so repeated fetches
+       do not touch the file system. Callers may cache objects decoded from
+       an asset, like images, using Assets.store_object() and
+       Assets.get_object(). All methods are thread-safe.
+
+       Attributes:
+
+       Assets.path_cache
+           A dict mapping asset descriptions to resolved file paths.
+
+       Assets.byte_cache
+           An LRUCache mapping resolved file paths to file contents, bounded by
+           the number of bytes.
+
+       Assets.object_cache
+           An LRUCache mapping keys to decoded objects, bounded by the
+           approximate object size given by the caller. Keys are asset URIs or
+           tuples starting with the asset URI, followed by decoding
+           parameters. The limit can be set in the "object_cache_bytes" option
+           of fabula.conf.
+
+       Assets.archives
+           A list of PackedArchive instances which are searched before local
+           files. Archives given in the "asset_archives" option of fabula.conf,
+           separated by commas, are added upon initialisation.
     """
 
-    def __init__(self):
+    def __init__(self, max_bytes = 32 * 1024 * 1024, max_object_bytes = 64 * 1024 * 1024):
         """Initialise.
+
+           max_bytes limits the memory used for cached file contents,
+           max_object_bytes the memory used for cached decoded objects.
         """
 
-        # TODO: Since an Assets instance is created only once, fetch() should do some asset caching (self.asset_dict) to prevent unnecessary file or network access. Problem: memory usage has to be limited. Probably use temporary files for downloaded assets?
-        # TODO: Add a function to cache an object associated with an asset description.
+        # TODO: Probably use temporary files for downloaded assets?
+
+        self.path_cache = {}
+
+        self.byte_cache = LRUCache(max_bytes)
+
+        if (fabula.CONFIGPARSER is not None
+            and fabula.CONFIGPARSER.has_option("fabula", "object_cache_bytes")):
+
+            max_object_bytes = int(fabula.CONFIGPARSER.get("fabula", "object_cache_bytes"))
+
+            fabula.LOGGER.info("using object_cache_bytes from fabula.conf: {}".format(max_object_bytes))
+
+        self.object_cache = LRUCache(max_object_bytes)
+
+        self.lock = threading.RLock()
+
+        self.archives = []
+
+        if (fabula.CONFIGPARSER is not None
+            and fabula.CONFIGPARSER.has_option("fabula", "asset_archives")):
+
+            for archive_name in fabula.CONFIGPARSER.get("fabula", "asset_archives").split(","):
+
+                if archive_name.strip():
+
+                    self.add_archive(archive_name.strip())
 
         return
 
+    def add_archive(self, filename):
+        """Open the ZIP archive given, using the usual search strategies, and serve assets from it.
+
+           Archives added later take precedence. Returns the PackedArchive.
+        """
+
+        archive = PackedArchive(self.find_local_file(filename))
+
+        with self.lock:
+
+            self.archives.insert(0, archive)
+
+        return archive
+
     def fetch(self, asset_desc, mode = "b"):
         """This method retrieves the file specified in asset_desc and returns a file-like object.
 
@@ -65,7 +480,13 @@ class Assets:
            This method actually is a dispatcher to more specialised methods.
         """
 
-        fabula.LOGGER.debug("unknown asset '{}', attempting to fetch".format(asset_desc))
+        archive, member_name = self._find_in_archives(asset_desc)
+
+        if archive is not None:
+
+            fabula.LOGGER.debug("returning '{}' from archive '{}'".format(asset_desc, archive.filename))
+
+            return archive.open(member_name, mode)
 
         if (asset_desc.startswith("http://") or asset_desc.startswith("ftp://")):
 
@@ -79,6 +500,134 @@ class Assets:
 
             return self.fetch_local_file(asset_desc, mode)
 
+    def prefetch(self, asset_desc_list):
+        """Read the local files given in asset_desc_list into the cache, so subsequent calls to fetch() do not access the file system.
+
+           Asset descriptions that can not be found or are remote are skipped.
+           Returns the number of assets now in the cache.
+        """
+
+        cached = 0
+
+        for asset_desc in asset_desc_list:
+
+            if self._find_in_archives(asset_desc)[0] is not None:
+
+                # Already mapped into memory
+                #
+                cached += 1
+
+                continue
+
+            if (asset_desc.startswith("http://")
+                or asset_desc.startswith("ftp://")
+                or asset_desc.lower().endswith(".zip")):
+
+                continue
+
+            try:
+                self._read_local_file(asset_desc)
+
+                cached += 1
+
+            except IOError:
+
+                fabula.LOGGER.warning("could not prefetch '{}'".format(asset_desc))
+
+        fabula.LOGGER.debug("{} of {} assets cached".format(cached, len(asset_desc_list)))
+
+        return cached
+
+    def prefetch_room(self, room):
+        """Prefetch the assets of all Tiles and Entities in the fabula.Room given.
+
+           Returns the number of assets now in the cache.
+        """
+
+        uri_list = []
+
+        for asset_holder in list(room.tile_list) + list(room.entity_dict.values()):
+
+            for asset in asset_holder.assets.values():
+
+                if asset.uri not in uri_list:
+
+                    uri_list.append(asset.uri)
+
+        return self.prefetch(uri_list)
+
+    def get_object(self, key, default = None):
+        """Return the object cached under key using Assets.store_object(), or default.
+        """
+
+        with self.lock:
+
+            return self.object_cache.get(key, default)
+
+    def store_object(self, key, obj, size):
+        """Cache an object decoded from an asset, for example an image, under key.
+
+           key is the asset URI, or a tuple starting with the asset URI if an
+           asset is decoded in different ways. size is the approximate memory
+           used by the object in bytes.
+        """
+
+        with self.lock:
+
+            self.object_cache.store(key, obj, size)
+
+        return
+
+    def invalidate(self, asset_desc = None):
+        """Remove the asset_desc given from all caches, or clear all caches if asset_desc is None.
+
+           Call this when asset files change on disk.
+        """
+
+        with self.lock:
+
+            if asset_desc is None:
+
+                self.path_cache.clear()
+                self.byte_cache.clear()
+                self.object_cache.clear()
+
+            else:
+
+                if asset_desc in self.path_cache:
+
+                    self.byte_cache.discard(self.path_cache.pop(asset_desc))
+
+                for key in list(self.object_cache.entries.keys()):
+
+                    if key == asset_desc or (isinstance(key, tuple) and key[0] == asset_desc):
+
+                        self.object_cache.discard(key)
+
+        return
+
+    def _find_in_archives(self, asset_desc):
+        """Auxiliary method. Return a tuple (PackedArchive, member_name) for the asset given, or (None, None) if no archive contains it.
+        """
+
+        if self.archives:
+
+            # Member names use "/" and have no leading "./"
+            #
+            member_name = asset_desc.replace(os.sep, "/")
+
+            while member_name.startswith("./"):
+
+                member_name = member_name[2:]
+
+            for archive in self.archives:
+
+                if member_name in archive:
+
+                    return (archive, member_name)
+
+        return (None, None)
+
     def fetch_uri(self, asset_desc):
 
         # TODO: timeout!
@@ -90,47 +639,96 @@ class Assets:
         raise Exception(errormessage)
 
     def fetch_zip_file(self, asset_desc):
-        """This method reads a ZIP file and returns a dict with the asset_desc minus extension as keys and a PyGame surface as values.
-           The file name must contain only one dot right before the extension.
-           You are strongly advised to call Surface.convert() for each surface
-           once you have set up your display.
+        """Add the ZIP archive specified using Assets.add_archive() and return the PackedArchive.
+
+           Subsequent calls to fetch() will return members of the archive.
         """
 
-#        surface_dict = {}
-#        zip_file = zipfile.ZipFile(asset_desc, 'r')
-#
-#        for name in zip_file.namelist():
-#
-#            fabula.LOGGER.debug("retrieving %s from ZIP file %s" % (name, asset_desc))
-#
-#            string_io = StringIO.StringIO(zip_file.read(name))
-#
-#            # Dict key is file name cut behind the
-#            # first dot.
-#            #
-#            # Using load(fileobject, namehint)
-#            #
-#            surface_dict[name.split('.')[0]] = pygame.image.load(string_io, name)
-#
-#        zip_file.close()
-#
-#        return surface_dict
+        with self.lock:
 
-        errormessage = ("Assets.fetch_zip_file() is not implemented")
+            for archive in self.archives:
 
-        fabula.LOGGER.critical(errormessage)
+                if archive.filename == self.find_local_file(asset_desc):
 
-        raise Exception(errormessage)
+                    return archive
+
+        return self.add_archive(asset_desc)
 
     def fetch_local_file(self, asset_desc, mode):
         """This method returns a a file-like object for the file specified.
 
            It will raise IOError if the file is not found.
 
+           The file will be searched in the local script directory first,
+           then in parent, sub and sibling directiries, then in site.PREFIXES.
+           See Assets.find_local_file().
+
+           Files are served from Assets.byte_cache where possible.
+        """
+
+        data = self._read_local_file(asset_desc)
+
+        msg = "returning '{}' from cache in {} mode"
+
+        fabula.LOGGER.debug(msg.format(asset_desc,
+                                       {"t" : "text", "b" : "binary"}[mode]))
+
+        if mode == "t":
+
+            # Like open() in text mode, use the default encoding and
+            # universal newlines
+            #
+            return io.TextIOWrapper(io.BytesIO(data))
+
+        return io.BytesIO(data)
+
+    def _read_local_file(self, asset_desc):
+        """Auxiliary method. Return the contents of the local file specified as bytes, using and filling the caches.
+        """
+
+        with self.lock:
+
+            path = self.find_local_file(asset_desc)
+
+            data = self.byte_cache.get(path)
+
+        if data is None:
+
+            fabula.LOGGER.debug("attempting to retrieve '{}' from local file".format(path))
+
+            file = open(path, mode = "rb")
+
+            data = file.read()
+
+            file.close()
+
+            with self.lock:
+
+                self.byte_cache.store(path, data, len(data))
+
+        return data
+
+    def find_local_file(self, asset_desc):
+        """Return the path to the local file specified, using Assets.path_cache.
+
+           It will raise IOError if the file is not found.
+
            The file will be searched in the local script directory first,
            then in parent, sub and sibling directiries, then in site.PREFIXES.
         """
 
+        # TODO: importing "site" leads to defunct executables using cx_Freeze 2.4.3 with Python 3.2 on Unix
+        #
+        import site
+
+        with self.lock:
+
+            if asset_desc in self.path_cache:
+
+                return self.path_cache[asset_desc]
+
+        original_asset_desc = asset_desc
+
         # TODO: check the script base directory?
 
         if os.path.exists(asset_desc):
@@ -199,13 +797,12 @@ class Assets:
 
                 return
 
-        msg = "attempting to retrieve '{}' from local file in {} mode"
-
-        fabula.LOGGER.debug(msg.format(asset_desc,
-                                       {"t" : "text", "b" : "binary"}[mode]))
+        # Make the path independent of later changes of the working directory
+        #
+        asset_desc = os.path.abspath(asset_desc)
 
-        file = open(asset_desc, mode = "r" + mode)
+        with self.lock:
 
-        fabula.LOGGER.debug("returning {}".format(file))
+            self.path_cache[original_asset_desc] = asset_desc
 
-        return file
+        return asset_desc
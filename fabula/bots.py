@@ -0,0 +1,529 @@
+"""Fabula Load Generator
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 21 Oct 2012
+#
+# A Client needs a UserInterface and an Interface thread, which makes it
+# expensive to run thousands of them. The bots in this module speak the
+# protocol of fabula.interfaces.python_tcp directly and share a single
+# selectors loop.
+
+import fabula
+import fabula.metrics
+import random
+import selectors
+import socket
+import time
+
+# Events which confirm a pending attempt when they refer to the bot. This
+# mirrors the places where Client unsets Client.await_confirmation.
+#
+CONFIRMATION_EVENTS = (fabula.ConfirmEvent,
+                       fabula.SaysEvent,
+                       fabula.ChangePropertyEvent)
+
+# Movement vectors for "move" actions
+#
+MOVES = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+class Bot:
+    """The state of a single simulated client connection.
+
+       Attributes:
+
+       Bot.identifier
+           The client identifier, sent in the InitEvent.
+
+       Bot.socket
+           The non-blocking socket connected to the server.
+
+       Bot.received_data
+       Bot.outgoing_data
+           bytearrays buffering incoming data and data to be sent.
+
+       Bot.location
+           The (x, y) location of the bot's Entity, or None if it has not been
+           spawned.
+
+       Bot.room_complete
+           True when the first RoomCompleteEvent has been received.
+
+       Bot.pending
+           A tuple (action, send_time) of the attempt awaiting confirmation,
+           or None.
+
+       Bot.next_action_time
+           time.monotonic() value after which the bot may act again.
+
+       Bot.actions_done
+           The number of scripted actions sent.
+    """
+
+    def __init__(self, identifier, client_socket):
+        """Initialise.
+        """
+
+        self.identifier = identifier
+        self.socket = client_socket
+        self.received_data = bytearray()
+        self.outgoing_data = bytearray()
+        self.location = None
+        self.room_complete = False
+        self.pending = None
+        self.next_action_time = 0.0
+        self.actions_done = 0
+
+        return
+
+    def send(self, message):
+        """Queue the Message for sending, in the format of fabula.interfaces.python_tcp.
+        """
+
+        self.outgoing_data.extend(bytes(repr(message) + "\n\n", "utf8"))
+
+        return
+
+    def read_messages(self):
+        """Return a list of the Messages complete in Bot.received_data, and remove them from the buffer.
+        """
+
+        messages = []
+
+        double_newline_index = self.received_data.find(b"\n\n")
+
+        while double_newline_index > -1:
+
+            message_str = str(self.received_data[:double_newline_index], "utf8")
+
+            del self.received_data[:double_newline_index + 2]
+
+            # TODO: eval() is as dangerous here as in the TCP Interfaces.
+            #
+            messages.append(eval(message_str))
+
+            double_newline_index = self.received_data.find(b"\n\n")
+
+        return messages
+
+class LoadGenerator:
+    """Drive a Fabula server with many bots over TCP, using a single thread.
+
+       Each bot connects, sends an InitEvent and waits for the server to
+       send its room. Then it performs the actions of the script in turn,
+       waiting for a confirmation of each attempt like Client.run() does
+       before sending the next one.
+
+       Script actions are "move", a TriesToMoveEvent to a neighbouring
+       location, and "say", a SaysEvent. A bot whose Entity has not been
+       spawned says something instead of moving.
+
+       Attributes:
+
+       LoadGenerator.connector
+           A tuple (ip_address, port) of the server.
+
+       LoadGenerator.bot_count
+       LoadGenerator.script
+       LoadGenerator.actions
+       LoadGenerator.think_time
+       LoadGenerator.timeout
+           See LoadGenerator.__init__().
+
+       LoadGenerator.bots
+           A list of connected Bot instances.
+
+       LoadGenerator.latency
+           A dict mapping action names, plus "init" and "room", to
+           fabula.metrics.Histogram instances of confirmation latencies.
+
+       LoadGenerator.counts
+           A dict of counters: "connected", "connection_errors",
+           "actions_sent", "confirmed", "attempts_failed", "timeouts",
+           "disconnects".
+    """
+
+    def __init__(self, connector,
+                       bot_count,
+                       script = ("move", "move", "say"),
+                       actions = 30,
+                       think_time = 0.1,
+                       timeout = 5.0,
+                       prefix = "bot"):
+        """Initialise.
+
+           connector
+               A tuple (ip_address, port) of the server.
+
+           bot_count
+               The number of connections to open.
+
+           script
+               A sequence of action names, repeated by each bot.
+
+           actions
+               The number of actions each bot performs before disconnecting.
+
+           think_time
+               Seconds a bot waits after a confirmation before its next
+               action.
+
+           timeout
+               Seconds to wait for a confirmation before counting a timeout
+               and going on.
+
+           prefix
+               Bots are called "<prefix>-0", "<prefix>-1" and so on.
+        """
+
+        self.connector = connector
+        self.bot_count = bot_count
+        self.script = script
+        self.actions = actions
+        self.think_time = think_time
+        self.timeout = timeout
+        self.prefix = prefix
+
+        self.bots = []
+
+        self.latency = {}
+
+        self.counts = {"connected" : 0,
+                       "connection_errors" : 0,
+                       "actions_sent" : 0,
+                       "confirmed" : 0,
+                       "attempts_failed" : 0,
+                       "timeouts" : 0,
+                       "disconnects" : 0}
+
+        self.selector = selectors.DefaultSelector()
+
+        self.random = random.Random(0)
+
+        return
+
+    def run(self, duration = None):
+        """Connect all bots and run them until they are done, or until duration seconds have passed.
+           Return LoadGenerator.report().
+        """
+
+        for i in range(self.bot_count):
+
+            self._connect("{}-{}".format(self.prefix, i))
+
+        deadline = None
+
+        if duration is not None:
+
+            deadline = time.monotonic() + duration
+
+        while self.bots and (deadline is None or time.monotonic() < deadline):
+
+            now = time.monotonic()
+
+            for bot in list(self.bots):
+
+                if bot.pending is not None and now - bot.pending[1] > self.timeout:
+
+                    fabula.LOGGER.warning("'{}' timed out waiting for confirmation of '{}'".format(bot.identifier, bot.pending[0]))
+
+                    self.counts["timeouts"] += 1
+
+                    bot.pending = None
+
+                if (bot.room_complete
+                    and bot.pending is None
+                    and now >= bot.next_action_time):
+
+                    if bot.actions_done < self.actions:
+
+                        self._act(bot, now)
+
+                    else:
+                        bot.send(fabula.Message([fabula.ExitEvent(bot.identifier)]))
+
+                        self._flush(bot)
+
+                        self._close(bot)
+
+                        continue
+
+                if bot.outgoing_data:
+
+                    self.selector.modify(bot.socket, selectors.EVENT_READ | selectors.EVENT_WRITE, bot)
+
+            for key, mask in self.selector.select(timeout = 0.01):
+
+                bot = key.data
+
+                if mask & selectors.EVENT_WRITE:
+
+                    self._flush(bot)
+
+                if mask & selectors.EVENT_READ and bot in self.bots:
+
+                    self._receive(bot)
+
+        for bot in list(self.bots):
+
+            self._close(bot)
+
+        self.selector.close()
+
+        return self.report()
+
+    def report(self):
+        """Return a dict with the counters of LoadGenerator.counts, and for each action a dict of latency statistics in seconds.
+        """
+
+        report = dict(self.counts)
+
+        report["bots"] = self.bot_count
+
+        report["latency"] = {}
+
+        for action, histogram in self.latency.items():
+
+            mean = 0.0
+
+            if histogram.count:
+
+                mean = histogram.sum / histogram.count
+
+            report["latency"][action] = {"count" : histogram.count,
+                                         "mean" : mean,
+                                         "p50" : histogram.percentile(50),
+                                         "p95" : histogram.percentile(95),
+                                         "p99" : histogram.percentile(99),
+                                         "max" : histogram.max}
+
+        return report
+
+    def _connect(self, identifier):
+        """Auxiliary method. Open a connection for a new Bot and send its InitEvent.
+        """
+
+        try:
+            client_socket = socket.create_connection(self.connector)
+
+        except OSError:
+
+            fabula.LOGGER.error("'{}' could not connect to {}".format(identifier, self.connector))
+
+            self.counts["connection_errors"] += 1
+
+            return
+
+        client_socket.setblocking(False)
+
+        bot = Bot(identifier, client_socket)
+
+        self.bots.append(bot)
+
+        self.selector.register(client_socket, selectors.EVENT_READ, bot)
+
+        self.counts["connected"] += 1
+
+        bot.send(fabula.Message([fabula.InitEvent(identifier)]))
+
+        bot.pending = ("init", time.monotonic())
+
+        return
+
+    def _act(self, bot, now):
+        """Auxiliary method. Send the next scripted attempt of the bot.
+        """
+
+        action = self.script[bot.actions_done % len(self.script)]
+
+        if action == "move" and bot.location is not None:
+
+            vector = self.random.choice(MOVES)
+
+            event = fabula.TriesToMoveEvent(bot.identifier,
+                                            (bot.location[0] + vector[0],
+                                             bot.location[1] + vector[1]))
+
+        else:
+            action = "say"
+
+            event = fabula.SaysEvent(bot.identifier, "Hello from {}".format(bot.identifier))
+
+        bot.send(fabula.Message([event]))
+
+        bot.pending = (action, now)
+
+        bot.actions_done += 1
+
+        self.counts["actions_sent"] += 1
+
+        return
+
+    def _observe(self, action, seconds):
+        """Auxiliary method. Add a latency to the histogram of the action.
+        """
+
+        if action not in self.latency:
+
+            self.latency[action] = fabula.metrics.Histogram()
+
+        self.latency[action].observe(seconds)
+
+        return
+
+    def _receive(self, bot):
+        """Auxiliary method. Read from the bot's socket and process complete Messages.
+        """
+
+        try:
+            chunk = bot.socket.recv(65536)
+
+        except BlockingIOError:
+
+            return
+
+        except OSError:
+
+            chunk = b""
+
+        if not chunk:
+
+            fabula.LOGGER.warning("'{}' lost the connection".format(bot.identifier))
+
+            self.counts["disconnects"] += 1
+
+            self._close(bot)
+
+            return
+
+        bot.received_data.extend(chunk)
+
+        for message in bot.read_messages():
+
+            for event in message.event_list:
+
+                self._process_event(bot, event)
+
+        return
+
+    def _process_event(self, bot, event):
+        """Auxiliary method. Update the bot from an Event sent by the server.
+        """
+
+        now = time.monotonic()
+
+        if isinstance(event, fabula.ServerParametersEvent):
+
+            if bot.pending is not None and bot.pending[0] == "init":
+
+                self._observe("init", now - bot.pending[1])
+
+                bot.pending = ("room", bot.pending[1])
+
+        elif isinstance(event, fabula.RoomCompleteEvent):
+
+            if bot.pending is not None and bot.pending[0] == "room":
+
+                self._observe("room", now - bot.pending[1])
+
+                bot.pending = None
+
+            bot.room_complete = True
+
+        elif (isinstance(event, fabula.SpawnEvent)
+              and event.entity.identifier == bot.identifier):
+
+            bot.location = event.location[:2]
+
+        elif isinstance(event, fabula.ExitEvent):
+
+            fabula.LOGGER.warning("'{}' received {}".format(bot.identifier, event))
+
+            self.counts["disconnects"] += 1
+
+            self._close(bot)
+
+            return
+
+        if (isinstance(event, CONFIRMATION_EVENTS)
+            and event.identifier == bot.identifier):
+
+            if isinstance(event, fabula.MovesToEvent):
+
+                bot.location = event.location
+
+            if bot.pending is not None and bot.pending[0] not in ("init", "room"):
+
+                if isinstance(event, fabula.AttemptFailedEvent):
+
+                    self.counts["attempts_failed"] += 1
+
+                else:
+                    self.counts["confirmed"] += 1
+
+                self._observe(bot.pending[0], now - bot.pending[1])
+
+                bot.pending = None
+
+                bot.next_action_time = now + self.think_time
+
+        return
+
+    def _flush(self, bot):
+        """Auxiliary method. Send as much of the bot's outgoing data as the socket accepts.
+        """
+
+        try:
+            sent = bot.socket.send(bot.outgoing_data)
+
+            del bot.outgoing_data[:sent]
+
+        except BlockingIOError:
+
+            pass
+
+        except OSError:
+
+            fabula.LOGGER.warning("'{}' could not send".format(bot.identifier))
+
+            self.counts["disconnects"] += 1
+
+            self._close(bot)
+
+            return
+
+        if not bot.outgoing_data:
+
+            self.selector.modify(bot.socket, selectors.EVENT_READ, bot)
+
+        return
+
+    def _close(self, bot):
+        """Auxiliary method. Close the bot's connection and remove it.
+        """
+
+        if bot in self.bots:
+
+            self.bots.remove(bot)
+
+            self.selector.unregister(bot.socket)
+
+            bot.socket.close()
+
+        return
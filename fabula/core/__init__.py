@@ -24,8 +24,27 @@
 
 import fabula
 import fabula.eventprocessor
+import fabula.journal
+import fabula.metrics
+import time
+import importlib
 from time import sleep
 
+# Submodules which are imported upon first access, see fabula.__getattr__().
+#
+SUBMODULES = ("client",
+              "server")
+
+def __getattr__(name):
+    """Import the submodules in SUBMODULES upon first access.
+    """
+
+    if name in SUBMODULES:
+
+        return importlib.import_module(__name__ + "." + name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
 class Engine(fabula.eventprocessor.EventProcessor):
     """Common base class for Fabula server and client engines.
        Most likely you will want to override all of the methods when subclassing
@@ -39,6 +58,10 @@ class Engine(fabula.eventprocessor.EventProcessor):
            The name of a logfile that Engine.run() will log incoming
            messages to. Initially "messages.log".
 
+       Engine.journal
+           A fabula.journal.Journal writing to Engine.logfile_name, created
+           upon the first call to Engine._write_logfile(). Initially None.
+
        Engine.plugin
            This is None upon initialisation and must be set to an instance of
            fabula.plugins.Plugin using Engine.set_plugin().
@@ -49,6 +72,23 @@ class Engine(fabula.eventprocessor.EventProcessor):
 
        Engine.rack
            An instance of fabula.Rack.
+
+       Engine.metrics
+           An instance of fabula.metrics.Registry, collecting event counts,
+           handler timings, queue depths and traffic of this Engine.
+
+       Engine.metrics_file
+           The name of a file Engine._update_metrics() periodically writes
+           a JSON snapshot of Engine.metrics to, or None to disable the
+           export. Initially None, can be set using the "metrics_file" option
+           in fabula.conf.
+
+       Engine.metrics_interval
+           Interval in seconds between metrics snapshots. Initially 10.0, can
+           be set using the "metrics_interval" option in fabula.conf.
+
+       Engine.metrics_timestamp
+           time.monotonic() value of the last metrics snapshot.
     """
 
     def __init__(self, interface_instance):
@@ -69,6 +109,8 @@ class Engine(fabula.eventprocessor.EventProcessor):
 
         self.logfile_name = "messages.log"
 
+        self.journal = None
+
         self.plugin = None
 
         # The Engine examines the events of a received
@@ -90,6 +132,24 @@ class Engine(fabula.eventprocessor.EventProcessor):
         #
         self.rack = fabula.Rack()
 
+        self.metrics = fabula.metrics.Registry()
+
+        self.metrics_file = None
+
+        self.metrics_interval = 10.0
+
+        if fabula.CONFIGPARSER is not None:
+
+            if fabula.CONFIGPARSER.has_option("fabula", "metrics_file"):
+
+                self.metrics_file = fabula.CONFIGPARSER.get("fabula", "metrics_file")
+
+            if fabula.CONFIGPARSER.has_option("fabula", "metrics_interval"):
+
+                self.metrics_interval = fabula.CONFIGPARSER.getfloat("fabula", "metrics_interval")
+
+        self.metrics_timestamp = time.monotonic()
+
         fabula.LOGGER.debug("complete")
 
         return
@@ -105,6 +165,128 @@ class Engine(fabula.eventprocessor.EventProcessor):
 
         return
 
+    def _write_logfile(self, message):
+        """Auxiliary method. Log the Message to the journal at Engine.logfile_name.
+
+           The journal is created, and an existing file is cleared, upon the
+           first call. Compression, rotation and flushing can be configured
+           using the options "journal_compression" ("none", "zlib" or "lzma"),
+           "journal_max_bytes", "journal_flush_interval" and "journal_fsync"
+           in the [fabula] section of fabula.conf.
+        """
+
+        if self.journal is None:
+
+            options = {}
+
+            if fabula.CONFIGPARSER is not None:
+
+                if fabula.CONFIGPARSER.has_option("fabula", "journal_compression"):
+
+                    options["compression"] = fabula.CONFIGPARSER.get("fabula", "journal_compression").lower()
+
+                if fabula.CONFIGPARSER.has_option("fabula", "journal_max_bytes"):
+
+                    options["max_bytes"] = fabula.CONFIGPARSER.getint("fabula", "journal_max_bytes")
+
+                if fabula.CONFIGPARSER.has_option("fabula", "journal_flush_interval"):
+
+                    options["flush_interval"] = fabula.CONFIGPARSER.getfloat("fabula", "journal_flush_interval")
+
+                if fabula.CONFIGPARSER.has_option("fabula", "journal_fsync"):
+
+                    options["fsync"] = fabula.CONFIGPARSER.get("fabula", "journal_fsync").lower() in ("true", "yes", "1")
+
+            fabula.LOGGER.debug("starting message journal '{}' with options {}".format(self.logfile_name, options))
+
+            self.journal = fabula.journal.Journal(self.logfile_name, **options)
+
+        self.journal.write(message)
+
+        return
+
+    def _close_logfile(self):
+        """Auxiliary method. Write pending journal records and close the journal, if there is one.
+        """
+
+        if self.journal is not None:
+
+            self.journal.close()
+
+            self.journal = None
+
+        return
+
+    def _dispatch(self, event, **kwargs):
+        """Auxiliary method. Call the handler for event from Engine.event_dict, handing over kwargs.
+           The call is timed in the Engine.metrics histogram
+           "dispatch <event class name>", whose count is the number of
+           events of that class processed.
+        """
+
+        start = time.perf_counter()
+
+        self.event_dict[event.__class__](event, **kwargs)
+
+        self.metrics.histogram("dispatch " + event.__class__.__name__).observe(time.perf_counter() - start)
+
+        return
+
+    def _update_metrics(self):
+        """Auxiliary method. Write a snapshot of Engine.metrics to Engine.metrics_file when Engine.metrics_interval has passed.
+           The queue depths and traffic of all connections are recorded right
+           before, so idle connections cost nothing in between.
+           To be called once per main loop iteration.
+        """
+
+        if (self.metrics_file is None
+            or time.monotonic() - self.metrics_timestamp < self.metrics_interval):
+
+            return
+
+        self.metrics_timestamp = time.monotonic()
+
+        # The Interface thread may add connections while we iterate, so use
+        # the snapshot.
+        #
+        for connector, message_buffer in self.interface.connections.snapshot:
+
+            prefix = "connection {} ".format(connector)
+
+            local_queue = message_buffer.messages_for_local
+
+            remote_queue = message_buffer.messages_for_remote
+
+            self.metrics.gauge(prefix + "messages_for_local").set(len(local_queue))
+
+            self.metrics.gauge(prefix + "messages_for_remote").set(len(remote_queue))
+
+            # The queues record their high-water marks themselves, so peaks
+            # between two calls are not missed.
+            #
+            self.metrics.gauge(prefix + "messages_for_local high_water").set(local_queue.high_water)
+
+            self.metrics.gauge(prefix + "messages_for_remote high_water").set(remote_queue.high_water)
+
+            self.metrics.gauge(prefix + "coalesced_events").set(local_queue.coalesced_events
+                                                                + remote_queue.coalesced_events)
+
+            self.metrics.gauge(prefix + "dropped_events").set(local_queue.dropped_events
+                                                              + remote_queue.dropped_events)
+
+            self.metrics.gauge(prefix + "bytes_received").set(message_buffer.bytes_received)
+
+            self.metrics.gauge(prefix + "bytes_sent").set(message_buffer.bytes_sent)
+
+        try:
+            self.metrics.write(self.metrics_file)
+
+        except OSError:
+
+            fabula.LOGGER.error("could not write metrics to '{}'".format(self.metrics_file))
+
+        return
+
     def run(self):
         """This is the main loop of an Engine. Put all the business logic here.
 
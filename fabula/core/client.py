@@ -27,6 +27,12 @@ import datetime
 import traceback
 import os
 
+# Events which are collected in Client.room_events while a room is being
+# entered
+#
+ROOM_SETUP_EVENTS = (fabula.ChangeMapElementEvent,
+                     fabula.SpawnEvent)
+
 class Client(fabula.core.Engine):
     """An instance of this class is the main engine in every Fabula client.
        It connects to the Client Interface and to the UserInterface,
@@ -54,6 +60,12 @@ class Client(fabula.core.Engine):
 
        Client.room
            An instance of fabula.Room, initialy None.
+
+       Client.room_events
+           A list of the ChangeMapElementEvents and SpawnEvents received since
+           the last EnterRoomEvent, to be applied to Client.room by
+           Room.build() when the RoomCompleteEvent arrives. None when no room
+           is being entered.
     """
 
     ####################
@@ -88,6 +100,12 @@ class Client(fabula.core.Engine):
         #
         self.room = None
 
+        # ChangeMapElementEvents and SpawnEvents received after an
+        # EnterRoomEvent are collected here and applied to self.room in one go
+        # by self._build_room(). None when no room is being entered.
+        #
+        self.room_events = None
+
         # Override logfile name
         # Use PID for unique name. Two clients may run in the same directory.
         #
@@ -206,10 +224,6 @@ class Client(fabula.core.Engine):
         #
         self.await_confirmation = True
 
-        # Local timestamp for messages
-        #
-        message_timestamp = None
-
         # Now loop
         #
         while not self.plugin.exit_requested:
@@ -219,44 +233,17 @@ class Client(fabula.core.Engine):
             #
             server_message = self.message_buffer.grab_message()
 
-            if server_message.event_list:
-
-                fabula.LOGGER.debug("server incoming: {}".format(server_message))
-
-                # Log to logfile
-                # TODO: this could be a method. But the we would have to maintain the message_timestamp in the instance.
-
-                # Clear file and start Message log timer with first incoming
-                # message
-                #
-                if message_timestamp is None:
-
-                    fabula.LOGGER.debug("Clearing log file")
-
-                    message_log_file = open(self.logfile_name, "wt")
-                    message_log_file.write("")
-                    message_log_file.close()
+            if self.message_buffer.overflowed():
 
-                    fabula.LOGGER.debug("Starting message log timer")
+                fabula.LOGGER.critical("message queue overflowed, the connection can not be trusted anymore")
 
-                    message_timestamp = datetime.datetime.today()
+                self.plugin.exit_requested = True
 
-                message_log_file = open(self.logfile_name, "at")
-
-                timedifference = datetime.datetime.today() - message_timestamp
-
-                # Logging time difference in seconds and message, tab-separated,
-                # terminated with double-newline.
-                # timedifference as seconds + tenth of a second
-                #
-                message_log_file.write("{}\t{}\n\n".format(timedifference.seconds + timedifference.microseconds / 1000000.0,
-                                                           repr(server_message)))
+            if server_message.event_list:
 
-                message_log_file.close()
+                fabula.LOGGER.debug("server incoming: {}".format(server_message))
 
-                # Renew timestamp
-                #
-                message_timestamp = datetime.datetime.today()
+                self._write_logfile(server_message)
 
                 # Message was not empty
                 #
@@ -275,20 +262,18 @@ class Client(fabula.core.Engine):
             # First handle the events in the Client, updating the room and
             # preparing self.message_for_plugin for the UserInterface
             #
-            for current_event in server_message.event_list:
-
-                # This is a bit of Python magic.
-                # self.event_dict is a dict which maps classes to handling
-                # functions. We use the class of the event supplied as
-                # a key to call the appropriate handler, and hand over
-                # the event.
-                # These methods may add events for the plugin engine
-                # to self.message_for_plugin
-                #
-                # TODO: This really should return a message, instead of giving one to write to
-                #
-                self.event_dict[current_event.__class__](current_event,
-                                                         message = self.message_for_plugin)
+            # This is a bit of Python magic.
+            # self.event_dict is a dict which maps classes to handling
+            # functions. We use the class of the event supplied as
+            # a key to call the appropriate handler, and hand over
+            # the event.
+            # These methods may add events for the plugin engine
+            # to self.message_for_plugin
+            #
+            # TODO: This really should return a message, instead of giving one to write to
+            #
+            self._dispatch_events(server_message.event_list,
+                                  self.message_for_plugin)
 
             # Now that everything is set and stored, call the UserInterface to
             # process the messages.
@@ -298,6 +283,8 @@ class Client(fabula.core.Engine):
             # At least process_message() must be called regularly even if the
             # server Message and thus message_for_plugin  are empty.
             #
+            start = time.perf_counter()
+
             try:
 
                 message_from_plugin = self.plugin.process_message(self.message_for_plugin)
@@ -309,10 +296,14 @@ class Client(fabula.core.Engine):
 
                 self.interface.shutdown()
 
+                self._close_logfile()
+
                 fabula.LOGGER.info("exiting")
 
                 return
 
+            self.metrics.histogram("call_plugin").observe(time.perf_counter() - start)
+
             # The UserInterface returned, the Server Message has been applied
             # and processed. Clean up.
             #
@@ -487,6 +478,8 @@ class Client(fabula.core.Engine):
                 #
                 self.message_for_remote = fabula.Message([])
 
+            self._update_metrics()
+
             # OK, done with the whole server message.
             # If no exit requested, grab the next one!
 
@@ -506,6 +499,8 @@ class Client(fabula.core.Engine):
 
         fabula.LOGGER.info("shutdown confirmed.")
 
+        self._close_logfile()
+
         # TODO: possibly exit cleanly from the UserInterface here
 
         return
@@ -644,6 +639,58 @@ class Client(fabula.core.Engine):
 
         return
 
+    def _dispatch_events(self, event_list, message):
+        """Auxiliary method. Call the handlers for the Events in event_list, handing over message.
+           While a room is being entered, ChangeMapElementEvents and
+           SpawnEvents are collected in self.room_events instead. They are
+           applied by self._build_room() when the RoomCompleteEvent arrives,
+           or before any other Event which might refer to the room.
+        """
+
+        for event in event_list:
+
+            if self.room_events is not None:
+
+                if event.__class__ in ROOM_SETUP_EVENTS:
+
+                    self.room_events.append(event)
+
+                    continue
+
+                if self.room_events:
+
+                    self._build_room(message)
+
+            self._dispatch(event, message = message)
+
+        return
+
+    def _build_room(self, message):
+        """Auxiliary method. Apply the Events in self.room_events to self.room in one go.
+           If self.plugin.setup_events is True, the Events are added to
+           message as well. The call is timed in the Engine.metrics histogram
+           "build room".
+        """
+
+        start = time.perf_counter()
+
+        room_events = self.room_events
+
+        self.room_events = []
+
+        fabula.LOGGER.info("building room '{}' from {} events".format(self.room.identifier,
+                                                                      len(room_events)))
+
+        self.room.build(room_events)
+
+        if self.plugin.setup_events:
+
+            message.event_list.extend(room_events)
+
+        self.metrics.histogram("build room").observe(time.perf_counter() - start)
+
+        return
+
     def process_ChangeMapElementEvent(self, event, **kwargs):
         """Let the fabula.Room instance in self.room process the Event and add it to message.
         """
@@ -833,11 +880,15 @@ class Client(fabula.core.Engine):
         #
         self.room = fabula.Room(event.room_identifier)
 
+        # Collect the map and the Entities until RoomCompleteEvent
+        #
+        self.room_events = []
+
         # Clear Rack from items we don't own
         #
-        for item_identifier in list(self.rack.owner_dict.keys()):
+        for item_identifier, owner in list(self.rack.owner_dict.items()):
 
-            if self.rack.owner_dict[item_identifier] != self.client_id:
+            if owner != self.client_id:
 
                 del self.rack.owner_dict[item_identifier]
 
@@ -883,8 +934,18 @@ class Client(fabula.core.Engine):
            all map elements, items and NPCs have been transfered.
            By the time the event arrives the Client
            should have saved all important data in data structures.
+           The Events collected since the EnterRoomEvent are applied to
+           self.room now.
         """
 
+        if self.room_events is not None:
+
+            if self.room_events:
+
+                self._build_room(kwargs["message"])
+
+            self.room_events = None
+
         # Call default implementation
         #
         fabula.core.Engine.process_RoomCompleteEvent(self,
@@ -26,9 +26,20 @@ import fabula
 import fabula.core
 import time
 import traceback
-import datetime
 import collections
 import itertools
+import logging
+import os
+import pickle
+import threading
+
+# Phases of a main loop iteration, used to attribute overrun time. "input"
+# covers reading and dispatching client Messages, "plugin" the calls to
+# Plugin.process_message(), "routing" processing Plugin Events and sorting
+# them into client Messages, "send" handing Messages to the Interface and
+# "housekeeping" snapshots and metrics.
+#
+TICK_PHASES = ("input", "plugin", "routing", "send", "housekeeping")
 
 # TODO: Add a decent default server CLI.
 
@@ -57,11 +68,72 @@ class Server(fabula.core.Engine):
        Server.message_by_room_id
            A dict of outgoing Messages, indexed by room identifier.
 
-       Server.message_timestamp
-           Timestamp for messages. Initially None.
-
        Server.exit_requested
            Flag to be changed by signal handler
+
+       Server.snapshot_file
+           The name of the file Server.write_snapshot() writes to by default.
+           Initially "fabula-server.snapshot", can be set using the
+           "snapshot_file" option in fabula.conf.
+
+       Server.snapshot_interval
+           Interval in seconds between periodic snapshots written by the main
+           loop. 0 disables periodic snapshots. Initially 0, can be set using
+           the "snapshot_interval" option in fabula.conf.
+
+       Server.restore_on_start
+           If True, Server.run() restores an existing Server.snapshot_file
+           before entering the main loop. Initially False, can be set using
+           the "restore_snapshot" option in fabula.conf.
+
+       Server.snapshot_timestamp
+           time.monotonic() value of the last snapshot.
+
+       Server.snapshot_writer
+           The child process id or the thread of a snapshot being written in
+           the background, or None.
+
+       Server.profile_ticks
+           The number of main loop iterations to profile after
+           Server.toggle_profile() has been called. Initially 1000, can be set
+           using the "profile_ticks" option in fabula.conf.
+
+       Server.profile_file
+           The name of the file to write profiling statistics to. "{}" is
+           replaced by a timestamp. Initially "fabula-server-{}.prof", can be
+           set using the "profile_file" option in fabula.conf.
+
+       Server.profile_requested
+           Flag to be changed by signal handler. When set, the main loop calls
+           Server.toggle_profile().
+
+       Server.profile_session
+           A fabula.profiling.ProfileSession while profiling, else None.
+
+       Server.tick_deadline
+           time.perf_counter() value by which the current iteration of the
+           main loop should be done. Deadlines advance by Server.interval,
+           so the main loop only sleeps for the time left in the budget.
+
+       Server.tick_phases
+           A dict mapping the phases of a main loop iteration, "input",
+           "plugin", "routing", "send" and "housekeeping", to the seconds
+           spent in them during the current iteration.
+
+       Server.deferred_log
+           A collections.deque of (template, arguments) tuples of debug
+           messages deferred by Server._log_debug() while over budget. They
+           are logged at the end of the next iteration that has time left.
+
+       Server.connections_version
+           The Interface.connections.version for which the main loop has
+           last checked for clients that left without notice, or None to
+           check in the next iteration.
+
+       Server.metrics_connectors
+           A set of the connectors present at the last call of
+           Server._check_exit(). The per-connection metrics of connectors
+           that are gone are removed from Server.metrics there.
      """
 
     def __init__(self,
@@ -84,10 +156,6 @@ class Server(fabula.core.Engine):
         #
         self.logfile_name = "messages-server-received.log"
 
-        # Timestamp for messages
-        #
-        self.message_timestamp = None
-
         # If framerate is 0, run as fast as possible
         #
         if framerate:
@@ -115,6 +183,64 @@ class Server(fabula.core.Engine):
         #
         self.exit_requested = False
 
+        # State snapshots
+        #
+        self.snapshot_file = "fabula-server.snapshot"
+        self.snapshot_interval = 0
+        self.restore_on_start = False
+
+        if fabula.CONFIGPARSER is not None:
+
+            if fabula.CONFIGPARSER.has_option("fabula", "snapshot_file"):
+
+                self.snapshot_file = fabula.CONFIGPARSER.get("fabula", "snapshot_file")
+
+            if fabula.CONFIGPARSER.has_option("fabula", "snapshot_interval"):
+
+                self.snapshot_interval = fabula.CONFIGPARSER.getfloat("fabula", "snapshot_interval")
+
+            if fabula.CONFIGPARSER.has_option("fabula", "restore_snapshot"):
+
+                self.restore_on_start = fabula.CONFIGPARSER.get("fabula", "restore_snapshot").lower() in ("true", "yes", "1")
+
+        self.snapshot_timestamp = time.monotonic()
+
+        self.snapshot_writer = None
+
+        # Runtime profiling
+        #
+        self.profile_ticks = 1000
+        self.profile_file = "fabula-server-{}.prof"
+
+        if fabula.CONFIGPARSER is not None:
+
+            if fabula.CONFIGPARSER.has_option("fabula", "profile_ticks"):
+
+                self.profile_ticks = fabula.CONFIGPARSER.getint("fabula", "profile_ticks")
+
+            if fabula.CONFIGPARSER.has_option("fabula", "profile_file"):
+
+                self.profile_file = fabula.CONFIGPARSER.get("fabula", "profile_file")
+
+        self.profile_requested = False
+
+        self.profile_session = None
+
+        # Tick budget
+        #
+        self.tick_deadline = 0.0
+
+        self.tick_phases = dict.fromkeys(TICK_PHASES, 0.0)
+
+        # Bounded, so a server that is overloaded for a long time does not
+        # pile up log records. The oldest ones are dropped.
+        #
+        self.deferred_log = collections.deque(maxlen = 1000)
+
+        self.connections_version = None
+
+        self.metrics_connectors = set()
+
         if not threadsafe:
 
             # install signal handlers
@@ -132,6 +258,14 @@ class Server(fabula.core.Engine):
                 #
                 pass
 
+            try:
+                signal.signal(signal.SIGUSR1, self.handle_profile)
+
+            except:
+                # Microsoft Windows has no SIGUSR1 - ignore
+                #
+                pass
+
             # TODO: restart plugin when SIGHUP is received
 
         return
@@ -167,6 +301,10 @@ class Server(fabula.core.Engine):
 
         print("Press [Ctrl] + [C] to stop the server.")
 
+        if self.restore_on_start and os.path.exists(self.snapshot_file):
+
+            self.restore_snapshot(self.snapshot_file)
+
         fabula.LOGGER.info("starting main loop")
 
         # MAIN LOOP
@@ -174,7 +312,20 @@ class Server(fabula.core.Engine):
         #
         while not self.exit_requested:
 
-            self._main_loop()
+            if self.profile_requested:
+
+                self.toggle_profile()
+
+            if self.profile_session is None:
+
+                self._main_loop()
+
+            else:
+                self._profile_main_loop()
+
+        if self.profile_session is not None:
+
+            self.toggle_profile()
 
         # exit has been requested
         #
@@ -196,30 +347,128 @@ class Server(fabula.core.Engine):
 
         fabula.LOGGER.info("shutdown confirmed")
 
+        self._close_logfile()
+
+        if self.snapshot_interval:
+
+            self._write_final_snapshot()
+
         # TODO: possibly exit cleanly from the plugin here
 
         print("Shutdown complete. A log file should be at fabula-server.log\n")
 
         return
 
+    def toggle_profile(self):
+        """Start profiling the next Server.profile_ticks iterations of the main loop, or stop a running profile early.
+
+           The main loop is profiled using cProfile, and all threads,
+           including those of the Interface, are sampled. When profiling
+           stops, the statistics are written to Server.profile_file, and a
+           text report with the time spent per event handler and per thread
+           to Server.profile_file + ".txt". If the files can not be
+           written, an error is logged.
+        """
+
+        self.profile_requested = False
+
+        if self.profile_session is None:
+
+            filename = self.profile_file.format(time.strftime("%Y%m%d-%H%M%S"))
+
+            self.profile_session = fabula.profiling.ProfileSession(filename,
+                                                                   self.profile_ticks)
+
+        else:
+            # Profiling is meant for live servers, so a profile that can not
+            # be written must not take them down.
+            #
+            try:
+                self.profile_session.dump()
+
+            except OSError as error:
+
+                fabula.LOGGER.error("could not write profile to '{}': {}".format(self.profile_session.filename, error))
+
+            self.profile_session = None
+
+        return
+
+    def _profile_main_loop(self):
+        """Auxiliary method. Execute the main loop of the server once under the profiler, and stop profiling after the last tick.
+        """
+
+        if self.profile_session.call(self._main_loop):
+
+            self.toggle_profile()
+
+        return
+
+    def budget_exceeded(self):
+        """Return True if the current iteration of the main loop has run past Server.tick_deadline.
+           Always False when running as fast as possible, i.e. if
+           Server.interval is 0.
+        """
+
+        return bool(self.interval) and time.perf_counter() > self.tick_deadline
+
     def _main_loop(self):
         """Auxiliary method. Execute the main loop of the server once.
         """
 
-        # Client connections may come and go. So rebuild the list of
-        # connections at every run.
+        tick_start = time.perf_counter()
+
+        # Deadlines advance by the interval so that the time spent working
+        # is not added to the sleep. After a stall, or in the first
+        # iteration, start over from now instead of rushing through
+        # iterations to catch up.
         #
-        connector_list = list(self.interface.connections.keys())
+        if tick_start - self.tick_deadline > self.interval:
 
-        self._check_exit(connector_list)
+            self.tick_deadline = tick_start
 
-        for connector in connector_list:
+        self.tick_deadline += self.interval
 
-            message = self.interface.connections[connector].grab_message()
+        for phase in TICK_PHASES:
+
+            self.tick_phases[phase] = 0.0
+
+        # Client connections may come and go. Read the version before the
+        # snapshot, so a change in between is caught in the next iteration.
+        # Clients can only have left without notice if a connection has been
+        # removed since the last check.
+        #
+        connections = self.interface.connections
+
+        version = connections.version
+
+        if version != self.connections_version:
+
+            self._check_exit(set(connections.connectors))
+
+            self.connections_version = version
+
+        for connector, message_buffer in connections.snapshot:
+
+            if message_buffer.overflowed():
+
+                # The client does not keep up, or floods us. Removing the
+                # connection makes the Interface close it, and
+                # _check_exit() remove the client in the next iteration.
+                #
+                fabula.LOGGER.error("message queue for '{}' overflowed, dropping connection".format(connector))
+
+                self.metrics.counter("connections dropped").increment()
+
+                connections.pop(connector, None)
+
+                continue
+
+            message = message_buffer.grab_message()
 
             if len(message.event_list):
 
-                fabula.LOGGER.debug("'{0}' incoming: {1}".format(connector, message))
+                self._log_debug("'{0}' incoming: {1}", connector, message)
 
                 self._write_logfile(message)
 
@@ -249,9 +498,9 @@ class Server(fabula.core.Engine):
                         # avoid splitting this beautiful call we submit
                         # it to all of them.
                         #
-                        self.event_dict[event.__class__](event,
-                                                         message = self.message_for_plugin,
-                                                         connector = connector)
+                        self._dispatch(event,
+                                       message = self.message_for_plugin,
+                                       connector = connector)
 
                     else:
                         # Looks like the Client sent an Event typically
@@ -279,12 +528,49 @@ class Server(fabula.core.Engine):
 
             # read from next client message_buffer
 
+        input_end = time.perf_counter()
+
+        # Everything in the loop above that was not spent in _call_plugin()
+        #
+        self.tick_phases["input"] = (input_end - tick_start
+                                     - self.tick_phases["plugin"]
+                                     - self.tick_phases["routing"]
+                                     - self.tick_phases["send"])
+
+        if (self.snapshot_interval
+            and time.monotonic() - self.snapshot_timestamp >= self.snapshot_interval):
+
+            self.write_snapshot()
+
+        self._update_metrics()
+
+        tick_end = time.perf_counter()
+
+        self.tick_phases["housekeeping"] = tick_end - input_end
+
+        # Record the time spent in this iteration, and whether it took longer
+        # than the interval it is supposed to fit in.
+        #
+        self.metrics.histogram("tick").observe(tick_end - tick_start)
+
+        remaining = self.tick_deadline - tick_end
+
+        if self.interval and remaining < 0:
+
+            self._record_overrun(-remaining)
+
+        elif self.deferred_log:
+
+            self._flush_deferred_log()
+
+            remaining = self.tick_deadline - time.perf_counter()
+
         # There is no need to run as fast as possible.
-        # We slow it down a bit to prevent high CPU load.
-        # Interval between loops has been computed from
-        # framerate given.
+        # Sleep for what is left of the interval computed from the framerate
+        # given. When running as fast as possible, still sleep(0) to let the
+        # Interface threads run.
         #
-        time.sleep(self.interval)
+        time.sleep(max(0.0, remaining))
 
         # reiterate over client connections
         #
@@ -292,8 +578,63 @@ class Server(fabula.core.Engine):
 
         return
 
+    def _record_overrun(self, overrun):
+        """Auxiliary method. Record a main loop iteration that took overrun seconds longer than its budget.
+
+           The time spent in each phase of an overrunning iteration goes to
+           the histogram "tick overrun <phase>", and the counter
+           "tick overruns <phase>" counts the phase that took longest.
+        """
+
+        self.metrics.counter("tick overruns").increment()
+
+        self.metrics.histogram("tick overrun").observe(overrun)
+
+        for phase, seconds in self.tick_phases.items():
+
+            self.metrics.histogram("tick overrun {}".format(phase)).observe(seconds)
+
+        slowest_phase = max(self.tick_phases, key = self.tick_phases.get)
+
+        self.metrics.counter("tick overruns {}".format(slowest_phase)).increment()
+
+        return
+
+    def _log_debug(self, template, *arguments):
+        """Auxiliary method. Log template.format(*arguments) as debug message.
+
+           Formatting is skipped if debug messages are not logged at all. If
+           the current iteration of the main loop is over budget, the message
+           is deferred to Server.deferred_log instead.
+        """
+
+        if fabula.LOGGER.isEnabledFor(logging.DEBUG):
+
+            if self.budget_exceeded():
+
+                self.deferred_log.append((template, arguments))
+
+            else:
+                fabula.LOGGER.debug(template.format(*arguments))
+
+        return
+
+    def _flush_deferred_log(self):
+        """Auxiliary method. Log the messages in Server.deferred_log until it is empty or the budget is exceeded.
+        """
+
+        while self.deferred_log and not self.budget_exceeded():
+
+            template, arguments = self.deferred_log.popleft()
+
+            fabula.LOGGER.debug(template.format(*arguments))
+
+        return
+
     def _check_exit(self, connector_list):
         """Auxiliary method. Check if someone has left who is supposed to be there.
+           Also remove the per-connection metrics of connectors not in
+           connector_list.
         """
 
         for room in self.room_by_id.values():
@@ -322,43 +663,221 @@ class Server(fabula.core.Engine):
 
                     self._add_event_to_room_message(fabula.DeleteEvent(client_id), room)
 
+        # Per-connection metrics would otherwise pile up with every client
+        # that ever connected.
+        #
+        for connector in self.metrics_connectors.difference(connector_list):
+
+            self.metrics.remove("connection {} ".format(connector))
+
+        self.metrics_connectors = set(connector_list)
+
         return
 
-    def _write_logfile(self, message):
-        """Auxiliary method. Log to logfile.
+    def get_state(self):
+        """Return a dict holding the complete game state of the Server and its Plugin.
+
+           Interface and connections are not part of the state.
         """
 
-        # Clear file and start Message log timer with first incoming
-        # message
-        #
-        if self.message_timestamp is None:
+        state = {"version" : fabula.VERSION,
+                 "room_by_id" : self.room_by_id,
+                 "room_by_client" : self.room_by_client,
+                 "rack" : self.rack,
+                 "plugin" : None}
+
+        if self.plugin is not None:
 
-            fabula.LOGGER.debug("Clearing log file")
+            state["plugin"] = self.plugin.__getstate__()
 
-            message_log_file = open(self.logfile_name, "wt")
-            message_log_file.write("")
-            message_log_file.close()
+        return state
 
-            fabula.LOGGER.debug("Starting message log timer")
+    def write_snapshot(self, filename = None, background = True):
+        """Write the state returned by Server.get_state() to a file, by default Server.snapshot_file.
 
-            self.message_timestamp = datetime.datetime.today()
+           If background is True, the main loop is not stalled: where
+           available, a forked child process pickles and writes a copy-on-write
+           image of the state. Otherwise the state is pickled in place and
+           written by a thread. A snapshot is skipped if the previous one is
+           still being written.
 
-        message_log_file = open(self.logfile_name, "at")
+           The file is replaced atomically, so an existing snapshot stays
+           intact if writing fails.
+        """
 
-        timedifference = datetime.datetime.today() - self.message_timestamp
+        if filename is None:
 
-        # Logging time difference in seconds and message, tab-separated,
-        # terminated with double-newline.
-        # timedifference as seconds + tenth of a second
-        #
-        message_log_file.write("{}\t{}\n\n".format(timedifference.seconds + timedifference.microseconds / 1000000.0,
-                                                   repr(message)))
+            filename = self.snapshot_file
+
+        self.snapshot_timestamp = time.monotonic()
+
+        if not self.snapshot_done():
+
+            fabula.LOGGER.warning("previous snapshot still being written, skipping")
+
+            return
+
+        if background and hasattr(os, "fork"):
+
+            pid = os.fork()
+
+            if pid == 0:
+
+                # Child process. Do not return into the main loop, and do
+                # not run any cleanup inherited from the parent.
+                #
+                exit_status = 0
+
+                try:
+                    self._write_snapshot_file(filename,
+                                              pickle.dumps(self.get_state(),
+                                                           pickle.HIGHEST_PROTOCOL))
 
-        message_log_file.close()
+                except:
+                    exit_status = 1
+
+                os._exit(exit_status)
+
+            fabula.LOGGER.debug("snapshot process {} writing '{}'".format(pid, filename))
+
+            self.snapshot_writer = pid
+
+            return
+
+        try:
+            data = pickle.dumps(self.get_state(), pickle.HIGHEST_PROTOCOL)
+
+        except:
+            fabula.LOGGER.error("could not pickle server state:\n{}".format(traceback.format_exc()))
+
+            return
+
+        if background:
+
+            self.snapshot_writer = threading.Thread(target = self._write_snapshot_file,
+                                                    args = (filename, data))
+
+            self.snapshot_writer.start()
+
+        else:
+            self._write_snapshot_file(filename, data)
+
+            fabula.LOGGER.info("snapshot written to '{}'".format(filename))
+
+        return
+
+    def snapshot_done(self, wait = False):
+        """Return True if no snapshot is being written in the background.
+
+           If wait is True, block until the snapshot is complete.
+        """
+
+        if self.snapshot_writer is None:
+
+            return True
+
+        if isinstance(self.snapshot_writer, threading.Thread):
+
+            if wait:
+
+                self.snapshot_writer.join()
+
+            if self.snapshot_writer.is_alive():
+
+                return False
+
+        else:
+            pid, status = os.waitpid(self.snapshot_writer,
+                                     0 if wait else os.WNOHANG)
 
-        # Renew timestamp
+            if pid == 0:
+
+                return False
+
+            if status:
+
+                fabula.LOGGER.error("snapshot process {} failed with status {}".format(pid, status))
+
+        self.snapshot_writer = None
+
+        return True
+
+    def _write_final_snapshot(self):
+        """Auxiliary method. Wait for a background snapshot to complete, then write the current state to Server.snapshot_file.
+           Called by Server.run() upon exit. Without waiting, the final
+           snapshot would be skipped if the main loop had just started a
+           periodic one.
+        """
+
+        self.snapshot_done(wait = True)
+
+        fabula.LOGGER.info("writing final snapshot")
+
+        self.write_snapshot(background = False)
+
+        return
+
+    def _write_snapshot_file(self, filename, data):
+        """Auxiliary method. Write data to a temporary file, then replace filename with it.
+        """
+
+        snapshot_file = open(filename + ".tmp", "wb")
+
+        snapshot_file.write(data)
+
+        snapshot_file.close()
+
+        os.replace(filename + ".tmp", filename)
+
+        return
+
+    def restore_snapshot(self, filename = None):
+        """Restore the state written by Server.write_snapshot(), by default from Server.snapshot_file.
+
+           Rooms, Rack and Plugin state are replaced. Clients which were
+           connected when the snapshot was taken and have not reconnected will
+           be removed by the main loop.
+        """
+
+        if filename is None:
+
+            filename = self.snapshot_file
+
+        fabula.LOGGER.info("restoring snapshot from '{}'".format(filename))
+
+        snapshot_file = open(filename, "rb")
+
+        state = pickle.load(snapshot_file)
+
+        snapshot_file.close()
+
+        if not isinstance(state, dict) or "room_by_id" not in state:
+
+            msg = "'{}' is not a Fabula server snapshot".format(filename)
+
+            fabula.LOGGER.error(msg)
+
+            raise RuntimeError(msg)
+
+        if state["version"] != fabula.VERSION:
+
+            fabula.LOGGER.warning("snapshot was written by Fabula {}, this is {}".format(state["version"], fabula.VERSION))
+
+        self.room_by_id = state["room_by_id"]
+        self.room_by_client = state["room_by_client"]
+        self.rack = state["rack"]
+
+        if self.plugin is not None and state["plugin"] is not None:
+
+            # Keeps Plugin.host
+            #
+            self.plugin.__setstate__(state["plugin"])
+
+        # Check the restored rooms against the current connections
         #
-        self.message_timestamp = datetime.datetime.today()
+        self.connections_version = None
+
+        fabula.LOGGER.info("restored {} rooms".format(len(self.room_by_id)))
 
         return
 
@@ -368,6 +887,8 @@ class Server(fabula.core.Engine):
 
         # TODO: Check all code relying on connector being the origin of an Event - this might not be the case!!!
 
+        start = time.perf_counter()
+
         # Put in a method to avoid duplication.
         # Must not take too long since the client is waiting.
         # Call Plugin even if there were no Events from the client to catch
@@ -375,6 +896,10 @@ class Server(fabula.core.Engine):
         #
         message_from_plugin = self.plugin.process_message(self.message_for_plugin)
 
+        plugin_end = time.perf_counter()
+
+        send_duration = 0.0
+
         # The plugin returned. Clean up.
         #
         self.message_for_plugin = fabula.Message([])
@@ -390,9 +915,9 @@ class Server(fabula.core.Engine):
         #
         for event in message_from_plugin.event_list:
 
-            self.event_dict[event.__class__](event,
-                                             message = self.message_for_remote,
-                                             connector = connector)
+            self._dispatch(event,
+                           message = self.message_for_remote,
+                           connector = connector)
 
         # If this iteration yielded any events, send them.
         # Message for remote host first
@@ -506,19 +1031,24 @@ class Server(fabula.core.Engine):
 
                             client_message_dict[single_client].event_list.append(event)
 
-                fabula.LOGGER.debug("client_message_dict == {}".format(client_message_dict))
+                self._log_debug("client_message_dict == {}", client_message_dict)
 
                 # Now. Off with them!
                 #
+                send_start = time.perf_counter()
+
                 for connector, client_identifier in self.room_by_id[room_identifier].active_clients.items():
 
                     message = client_message_dict[client_identifier]
 
                     if len(message.event_list):
 
-                        fabula.LOGGER.debug("'{}' ({}) outgoing: {}".format(connector,
-                                                                            client_identifier,
-                                                                            message))
+                        self._log_debug("'{}' ({}) outgoing: {}",
+                                        connector,
+                                        client_identifier,
+                                        message)
+
+                        self.metrics.counter("room {} events_sent".format(room_identifier)).increment(len(message.event_list))
 
                         try:
                             self.interface.connections[connector].send_message(message)
@@ -529,11 +1059,30 @@ class Server(fabula.core.Engine):
 
                             fabula.LOGGER.error(msg.format(connector))
 
+                send_duration += time.perf_counter() - send_start
+
         # Clean up
         #
         self.message_for_remote = fabula.Message([])
         self.message_by_room_id = {}
 
+        # Time the whole call per connection, to find the clients that keep
+        # the Server busy.
+        #
+        end = time.perf_counter()
+
+        duration = end - start
+
+        self.tick_phases["plugin"] += plugin_end - start
+
+        self.tick_phases["send"] += send_duration
+
+        self.tick_phases["routing"] += end - plugin_end - send_duration
+
+        self.metrics.histogram("call_plugin").observe(duration)
+
+        self.metrics.histogram("connection {} call_plugin".format(connector)).observe(duration)
+
         return
 
     def _add_event_to_room_message(self, event, room = None):
@@ -619,6 +1168,18 @@ class Server(fabula.core.Engine):
 
         return
 
+    def handle_profile(self, signalnum, frame):
+        """Callback to start or stop profiling when SIGUSR1 is received.
+           The main loop calls Server.toggle_profile() at the beginning of the
+           next iteration.
+        """
+
+        fabula.LOGGER.info("caught signal {} (SIGUSR1), setting profile flag".format(signalnum))
+
+        self.profile_requested = True
+
+        return
+
     def process_TriesToMoveEvent(self, event, **kwargs):
         """Perform sanity checks on target and either confirm, reject or forward to Plugin.
         """
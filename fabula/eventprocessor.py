@@ -102,13 +102,15 @@ class EventProcessor:
         return dict
 
     def __setstate__(self, state_dict):
-        """Update self.__dict__ with state_dict provided by the pickle module, then call __init__().
+        """Update self.__dict__ with state_dict provided by the pickle module, then call EventProcessor.__init__().
         """
         self.__dict__.update(state_dict)
 
-        # Setup the un-pickleable event_dict
+        # Setup the un-pickleable event_dict.
+        # Subclass constructors take arguments and might reset state, so
+        # only call the base class.
         #
-        self.__init__()
+        EventProcessor.__init__(self)
 
     def process_TriesToMoveEvent(self, event, **kwargs):
         """Process the Event.
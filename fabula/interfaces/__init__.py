@@ -30,9 +30,50 @@
 # Work on Fabula server interface started on 24. Sep 2009
 
 import fabula
+import importlib
+import threading
 from collections import deque
 from time import sleep
 
+# Submodules which are imported upon first access, see fabula.__getattr__().
+#
+SUBMODULES = ("json_rpc",
+              "python_tcp",
+              "python_udp",
+              "replay",
+              "twisted_tcp")
+
+def __getattr__(name):
+    """Import the submodules in SUBMODULES upon first access.
+    """
+
+    if name in SUBMODULES:
+
+        return importlib.import_module(__name__ + "." + name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+# Policies of a MessageQueue for the Events of a class when the queue is full.
+#
+# COALESCE keeps only the latest Event per Entity identifier.
+# DROP_OLDEST drops the oldest Messages consisting only of such Events.
+# DISCONNECT marks the queue as overflowed, which makes the engine drop the
+# connection.
+#
+COALESCE = "coalesce"
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# Default policies by Event class. Events of other classes use
+# MessageQueue.default_policy.
+#
+DEFAULT_POLICIES = {fabula.MovesToEvent : COALESCE}
+
+# Default maximum number of Messages in a MessageQueue. Can be set using the
+# "message_queue_limit" option in fabula.conf. 0 means no limit.
+#
+DEFAULT_LIMIT = 1000
+
 class Interface:
     """This is a base class for Fabula interfaces which handle all the network traffic.
        A customised implementation will likely have a client- and a server side
@@ -41,9 +82,9 @@ class Interface:
        Attributes:
 
        Interface.connections
-           A dict of connector objects mapping to MessageBuffer instances.
-           A connector is an object that specifies how to connect to the remote
-           host.
+           A ConnectionRegistry, mapping connector objects to MessageBuffer
+           instances. A connector is an object that specifies how to connect
+           to the remote host.
 
        Interface.connected
            Flag to indicate whether Interface.connect() has been called.
@@ -52,6 +93,14 @@ class Interface:
        Interface.shutdown_flag
        Interface.shutdown_confirmed
            Flags for shutdown handling.
+
+       Interface.shutdown_event
+           A threading.Event, set together with Interface.shutdown_flag, for
+           threads that have nothing to do but wait for the shutdown.
+
+       Interface.wakeup
+           A Wakeup, shared by all connections, for a thread that waits for
+           sockets and Messages to send at once. It is set on shutdown.
     """
 
     def __init__(self):
@@ -61,7 +110,7 @@ class Interface:
         # connections is a dict of MessageBuffer instances, indexed by
         # connectors.
         #
-        self.connections = {}
+        self.connections = ConnectionRegistry()
 
         # Flag to indicate whether Interface.connect() has been called.
         #
@@ -75,6 +124,10 @@ class Interface:
         #
         self.shutdown_confirmed = False
 
+        self.shutdown_event = threading.Event()
+
+        self.wakeup = Wakeup()
+
         fabula.LOGGER.debug("complete")
 
         return
@@ -138,11 +191,7 @@ class Interface:
 
         # Run thread as long as no shutdown is requested
         #
-        while not self.shutdown_flag:
-
-            # No need to run as fast as possible
-            #
-            sleep(1/60)
+        self.shutdown_event.wait()
 
         # Caught shutdown notification, stopping thread
         #
@@ -175,6 +224,16 @@ class Interface:
         #
         self.shutdown_flag = True
 
+        self.shutdown_event.set()
+
+        # Wake up threads waiting for Messages to send, so they see the flag
+        #
+        for connector, message_buffer in self.connections.snapshot:
+
+            message_buffer.messages_for_remote.notify()
+
+        self.wakeup.set()
+
         # Wait for confirmation (blocks interface and client!)
         #
         while not self.shutdown_confirmed:
@@ -185,31 +244,494 @@ class Interface:
 
         return True
 
+class ConnectionRegistry(dict):
+    """A dict mapping connectors to MessageBuffers, shared by Interface threads and the engine.
+
+       Interface threads add and remove connections at any time. Adding,
+       removing and popping items is serialised by a lock, and each change
+       increments ConnectionRegistry.version and replaces the snapshot
+       tuples. Engines read the snapshots instead of copying the dict in
+       every iteration, and compare the version with the one they have seen
+       to learn about connects and disconnects.
+
+       Removing a MessageBuffer notifies its messages_for_remote queue, so
+       an Interface thread waiting on it learns about the removal at once.
+
+       Attributes:
+
+       ConnectionRegistry.version
+           An int, incremented by every change. Initially 0.
+
+       ConnectionRegistry.connectors
+           A tuple of the connectors at the time of the last change.
+
+       ConnectionRegistry.snapshot
+           A tuple of (connector, MessageBuffer) tuples at the time of the
+           last change.
+    """
+
+    def __init__(self):
+        """Initialise an empty registry.
+        """
+
+        dict.__init__(self)
+
+        self.version = 0
+        self.connectors = ()
+        self.snapshot = ()
+
+        self.lock = threading.Lock()
+
+        return
+
+    def __setitem__(self, connector, message_buffer):
+        """Add or replace the connection for connector.
+        """
+
+        with self.lock:
+
+            dict.__setitem__(self, connector, message_buffer)
+
+            self._changed()
+
+        return
+
+    def __delitem__(self, connector):
+        """Remove the connection for connector. Raises KeyError if there is none.
+        """
+
+        with self.lock:
+
+            message_buffer = dict.pop(self, connector)
+
+            self._changed()
+
+        self._notify_removed(message_buffer)
+
+        return
+
+    def pop(self, connector, *default):
+        """Remove the connection for connector and return its MessageBuffer, like dict.pop().
+        """
+
+        with self.lock:
+
+            if connector not in self:
+
+                return dict.pop(self, connector, *default)
+
+            message_buffer = dict.pop(self, connector)
+
+            self._changed()
+
+        self._notify_removed(message_buffer)
+
+        return message_buffer
+
+    def _notify_removed(self, message_buffer):
+        """Auxiliary method. Wake up threads waiting for Messages to send to a removed connection.
+        """
+
+        if isinstance(message_buffer, MessageBuffer):
+
+            message_buffer.messages_for_remote.notify()
+
+        return
+
+    def _changed(self):
+        """Auxiliary method. Rebuild the snapshots, then increment the version.
+           To be called with ConnectionRegistry.lock held.
+        """
+
+        self.snapshot = tuple(dict.items(self))
+
+        self.connectors = tuple(connector for connector, message_buffer in self.snapshot)
+
+        # Readers check the version first, so publish it last. A reader that
+        # gets a new snapshot with an old version will just check again.
+        #
+        self.version += 1
+
+        return
+
+class MessageQueue(deque):
+    """A deque of Messages with a maximum length and overflow policies.
+
+       When a Message is appended to a full queue, the Events in the queue
+       are compacted according to the policy for their class: Events with
+       the COALESCE policy are reduced to the latest one per identifier,
+       then the oldest Messages made up of DROP_OLDEST Events only are
+       dropped until the queue is half full. If there is still no room, the
+       queue is marked as overflowed and rejects all further Messages.
+
+       MessageQueue.append() and MessageQueue.popleft() are safe to be
+       called from different threads.
+
+       Consumers do not need to poll. A thread can block in
+       MessageQueue.wait() until a Message arrives. A thread that also
+       waits for sockets can set MessageQueue.wakeup and register the
+       Wakeup with a selector along with the sockets. Many queues can share
+       one Wakeup, so a queue does not cost any file descriptors.
+
+       Attributes:
+
+       MessageQueue.limit
+           The maximum number of Messages. 0 means no limit.
+
+       MessageQueue.policies
+           A dict mapping Event classes to COALESCE, DROP_OLDEST or
+           DISCONNECT. Initially a copy of DEFAULT_POLICIES.
+
+       MessageQueue.default_policy
+           The policy for Event classes not in MessageQueue.policies.
+           Initially DISCONNECT.
+
+       MessageQueue.overflowed
+           True if the queue could not make room for a Message.
+
+       MessageQueue.high_water
+           The highest number of Messages ever queued.
+
+       MessageQueue.coalesced_events
+       MessageQueue.dropped_events
+           The number of Events removed by coalescing, and dropped or
+           rejected.
+
+       MessageQueue.wakeup
+           A Wakeup to set when a Message is appended or
+           MessageQueue.notify() is called, or None. Initially None.
+    """
+
+    def __init__(self, limit = 0):
+        """Initialise.
+        """
+
+        deque.__init__(self)
+
+        self.limit = limit
+        self.policies = dict(DEFAULT_POLICIES)
+        self.default_policy = DISCONNECT
+        self.overflowed = False
+        self.high_water = 0
+        self.coalesced_events = 0
+        self.dropped_events = 0
+
+        self.lock = threading.Lock()
+
+        self.ready = threading.Condition(self.lock)
+
+        self.wakeup = None
+
+        return
+
+    def append(self, message):
+        """Add a Message to the right side of the queue, making room if the queue is full.
+        """
+
+        with self.lock:
+
+            if self.overflowed:
+
+                self.dropped_events += len(message.event_list)
+
+                return
+
+            if self.limit and len(self) >= self.limit:
+
+                self._make_room(message)
+
+            else:
+                deque.append(self, message)
+
+            if len(self) > self.high_water:
+
+                self.high_water = len(self)
+
+            self._notify()
+
+        return
+
+    def popleft(self):
+        """Remove and return the Message on the left side of the queue.
+        """
+
+        with self.lock:
+
+            return deque.popleft(self)
+
+    def wait(self, timeout = None):
+        """Block until the queue is not empty, MessageQueue.notify() is called, or timeout seconds have passed.
+           Return True if there are Messages in the queue.
+        """
+
+        with self.ready:
+
+            if not len(self):
+
+                self.ready.wait(timeout)
+
+            return bool(len(self))
+
+    def notify(self):
+        """Wake up all threads waiting for this queue, e.g. to let them check a shutdown flag.
+        """
+
+        with self.lock:
+
+            self._notify()
+
+        return
+
+    def _notify(self):
+        """Auxiliary method. Wake up waiting threads and set MessageQueue.wakeup, if any.
+           To be called with MessageQueue.lock held.
+        """
+
+        self.ready.notify_all()
+
+        if self.wakeup is not None:
+
+            self.wakeup.set()
+
+        return
+
+    def _make_room(self, message):
+        """Auxiliary method. Compact the queue and the new Message according to MessageQueue.policies.
+           To be called with MessageQueue.lock held.
+        """
+
+        # Coalesce, keeping the latest Event, so walk from newest to oldest
+        #
+        latest = set()
+
+        messages = []
+
+        for queued_message in reversed(list(self) + [message]):
+
+            event_list = []
+
+            for event in reversed(queued_message.event_list):
+
+                if self.policies.get(event.__class__, self.default_policy) == COALESCE:
+
+                    key = (event.__class__, event.identifier)
+
+                    if key in latest:
+
+                        self.coalesced_events += 1
+
+                        continue
+
+                    latest.add(key)
+
+                event_list.append(event)
+
+            if event_list:
+
+                event_list.reverse()
+
+                messages.append(fabula.Message(event_list))
+
+        messages.reverse()
+
+        # Drop oldest, down to half the limit to not compact on every append
+        #
+        index = 0
+
+        while len(messages) > self.limit // 2 and index < len(messages):
+
+            event_list = messages[index].event_list
+
+            if all(self.policies.get(event.__class__, self.default_policy) == DROP_OLDEST
+                   for event in event_list):
+
+                self.dropped_events += len(event_list)
+
+                del messages[index]
+
+            else:
+                index += 1
+
+        deque.clear(self)
+
+        if len(messages) > self.limit:
+
+            fabula.LOGGER.error("message queue overflow at {} messages".format(len(messages) - 1))
+
+            self.overflowed = True
+
+            # The new Message is rejected, the rest is kept for inspection.
+            #
+            self.dropped_events += len(messages[-1].event_list)
+
+            del messages[-1]
+
+        deque.extend(self, messages)
+
+        return
+
+class Wakeup:
+    """A flag for threads that wait for sockets with a selector, to be woken up for anything else.
+
+       Wakeup.set() may be called from any thread. Afterwards the file
+       descriptor returned by Wakeup.fileno() is readable until
+       Wakeup.clear() is called. Pass the Wakeup to
+       selectors.DefaultSelector.register() along with the sockets.
+
+       The socket pair behind the Wakeup is created upon the first call to
+       Wakeup.fileno(), so a Wakeup nobody waits for costs nothing.
+
+       Attributes:
+
+       Wakeup.sockets
+           A socket pair, or None.
+
+       Wakeup.pending
+           True if the Wakeup has been set and not cleared yet.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.lock = threading.Lock()
+
+        self.sockets = None
+
+        self.pending = False
+
+        return
+
+    def set(self):
+        """Make Wakeup.fileno() readable.
+        """
+
+        with self.lock:
+
+            if self.sockets is not None and not self.pending:
+
+                self.sockets[1].send(b"\0")
+
+                self.pending = True
+
+        return
+
+    def clear(self):
+        """Make Wakeup.fileno() unreadable again until the next call to Wakeup.set().
+           Call this before looking for things to do, so no wakeup is missed.
+        """
+
+        with self.lock:
+
+            if self.pending:
+
+                try:
+                    self.sockets[0].recv(64)
+
+                except BlockingIOError:
+
+                    pass
+
+                self.pending = False
+
+        return
+
+    def fileno(self):
+        """Return a file descriptor that is readable while the Wakeup is set.
+        """
+
+        # Local import, as only the network Interfaces need this
+        #
+        import socket
+
+        with self.lock:
+
+            if self.sockets is None:
+
+                self.sockets = socket.socketpair()
+
+                for wakeup_socket in self.sockets:
+
+                    wakeup_socket.setblocking(False)
+
+                # Calls to Wakeup.set() before now were lost, so start set
+                #
+                self.sockets[1].send(b"\0")
+
+                self.pending = True
+
+            return self.sockets[0].fileno()
+
+    def close(self):
+        """Close the socket pair, if any.
+        """
+
+        with self.lock:
+
+            if self.sockets is not None:
+
+                for wakeup_socket in self.sockets:
+
+                    wakeup_socket.close()
+
+                self.sockets = None
+
+                self.pending = False
+
+        return
+
 class MessageBuffer:
     """Buffer messages received and to be sent over the network.
 
        Attributes:
 
        MessageBuffer.messages_for_local
-           A deque, buffering messages from the remote host.
+           A MessageQueue, buffering messages from the remote host.
 
        MessageBuffer.messages_for_remote
-           A deque, buffering messages from the local host.
+           A MessageQueue, buffering messages from the local host.
+
+       MessageBuffer.bytes_received
+       MessageBuffer.bytes_sent
+           The number of bytes transferred over the network for this
+           connection, maintained by network Interfaces. Initially 0.
     """
 
-    def __init__(self):
+    def __init__(self, limit = None):
         """This method sets up the internal queues.
+           limit is the maximum number of Messages per queue, see
+           MessageQueue. If it is None, the "message_queue_limit" option from
+           fabula.conf or DEFAULT_LIMIT is used.
         """
 
+        if limit is None:
+
+            limit = DEFAULT_LIMIT
+
+            if (fabula.CONFIGPARSER is not None
+                and fabula.CONFIGPARSER.has_option("fabula", "message_queue_limit")):
+
+                limit = fabula.CONFIGPARSER.getint("fabula", "message_queue_limit")
+
         # A hint from the Python documentation:
         # deques are a fast, thread-safe replacement for queues.
         # Use deque.append(x) and deque.popleft()
         #
-        self.messages_for_local = deque()
-        self.messages_for_remote = deque()
+        self.messages_for_local = MessageQueue(limit)
+        self.messages_for_remote = MessageQueue(limit)
+
+        self.bytes_received = 0
+
+        self.bytes_sent = 0
 
         return
 
+    def overflowed(self):
+        """Return True if one of the queues has overflowed, in which case the connection should be dropped.
+        """
+
+        return self.messages_for_local.overflowed or self.messages_for_remote.overflowed
+
     def send_message(self, message):
         """Called by the local engine with a message ready to be sent to the remote host.
            The Message object given is an instance of fabula.Message.
@@ -266,9 +788,10 @@ class StandaloneInterface(Interface):
         #
         while not self.shutdown_flag:
 
-            # Get messages from remote
+            # Get messages from remote. Wait for them rather than sleeping,
+            # but return in time to check the shutdown flag.
             #
-            if remote_message_buffer.messages_for_remote:
+            if remote_message_buffer.messages_for_remote.wait(1 / self.framerate):
 
                 original_message = remote_message_buffer.messages_for_remote.popleft()
 
@@ -308,10 +831,6 @@ class StandaloneInterface(Interface):
             # No need to deliver messages to remote since it will grab them -
             # see above.
 
-            # No need to run as fast as possible
-            #
-            sleep(1 / self.framerate)
-
         # Caught shutdown notification, stopping thread
         #
         fabula.LOGGER.info("shutting down")
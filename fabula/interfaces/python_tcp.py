@@ -38,11 +38,18 @@
 
 import fabula.interfaces
 from time import sleep
+import selectors
 import socket
 import socketserver
 import threading
 import traceback
 
+# Seconds after which a thread waiting for data wakes up anyway. It is woken
+# up earlier for Messages to send, shutdown and removed connections, so this
+# only limits the damage of a missed notification.
+#
+WAKEUP_TIMEOUT = 1.0
+
 class TCPClientInterface(fabula.interfaces.Interface):
     """Fabula Client interface using TCP.
 
@@ -113,7 +120,13 @@ class TCPClientInterface(fabula.interfaces.Interface):
 
             fabula.LOGGER.info("connected, local address is {}".format(self.sock.getsockname()))
 
-            self.connections[connector] = fabula.interfaces.MessageBuffer()
+            message_buffer = fabula.interfaces.MessageBuffer()
+
+            # Wake up handle_messages() for Messages to send
+            #
+            message_buffer.messages_for_remote.wakeup = self.wakeup
+
+            self.connections[connector] = message_buffer
 
         else:
 
@@ -153,13 +166,28 @@ class TCPClientInterface(fabula.interfaces.Interface):
         #
         message_buffer = list(self.connections.values())[0]
 
+        # Wait for the socket and for Messages to send, instead of polling.
+        #
+        selector = selectors.DefaultSelector()
+
+        selector.register(self.sock, selectors.EVENT_READ)
+
+        selector.register(self.wakeup, selectors.EVENT_READ)
+
         # Run thread as long as no shutdown is requested
         #
         while not self.shutdown_flag:
 
+            # The timeout is a safeguard only. Interface.shutdown() wakes us
+            # up.
+            #
+            readable = [key.fileobj for key, events in selector.select(WAKEUP_TIMEOUT)]
+
+            self.wakeup.clear()
+
             # First deliver waiting local messages.
             #
-            if message_buffer.messages_for_remote:
+            while message_buffer.messages_for_remote:
 
                 fabula.LOGGER.debug("sending 1 message of {}".format(len(message_buffer.messages_for_remote)))
 
@@ -171,30 +199,42 @@ class TCPClientInterface(fabula.interfaces.Interface):
                 # Add a double newline as separator.
                 # TODO: this may block for an arbitrary time. Delegate to a new thread.
                 #
-                self.sock.sendall(bytes(representation + "\n\n", "utf8"))
+                data = bytes(representation + "\n\n", "utf8")
+
+                self.sock.sendall(data)
 
-            # Now listen for incoming server messages for some time (set in
-            # connect()). This should catch any messages received in the
-            # meantime by the OS.
+                message_buffer.bytes_sent += len(data)
+
+            # Now read what the server has sent, if anything.
             #
             chunk = None
 
-            try:
+            if self.sock in readable:
 
-                # TODO: evaluate recv size
-                #
-                chunk = self.sock.recv(4096)
+                try:
 
-            except socket.timeout:
+                    # TODO: evaluate recv size
+                    #
+                    chunk = self.sock.recv(4096)
 
-                # Nobody likes us, evereyone left us, there all out without us,
-                # having fun...
-                #
-                pass
+                except socket.timeout:
 
-            except socket.error:
+                    # Nobody likes us, evereyone left us, there all out
+                    # without us, having fun...
+                    #
+                    pass
+
+                except socket.error:
+
+                    fabula.LOGGER.error("socket error while receiving")
+
+                if chunk == b"":
+
+                    # The socket will stay readable, so stop waiting for it
+                    #
+                    fabula.LOGGER.error("server has closed the connection")
 
-                fabula.LOGGER.error("socket error while receiving")
+                    selector.unregister(self.sock)
 
             if chunk:
 
@@ -204,6 +244,8 @@ class TCPClientInterface(fabula.interfaces.Interface):
                 #
                 self.received_data.extend(chunk)
 
+                message_buffer.bytes_received += len(chunk)
+
                 # Now: look for Messages, separated by double newlines.
                 #
                 double_newline_index = self.received_data.find(b"\n\n")
@@ -234,14 +276,12 @@ class TCPClientInterface(fabula.interfaces.Interface):
 
                 # No more double newlines, end of evaluation.
 
-            # No need to run as fast as possible.
-            #
-            sleep(1/60)
-
             # Check shutdown_flag. Possibly start again.
 
         fabula.LOGGER.info("caught shutdown notification")
 
+        selector.close()
+
         # Deliver waiting local messages.
         #
         while len(message_buffer.messages_for_remote):
@@ -260,7 +300,11 @@ class TCPClientInterface(fabula.interfaces.Interface):
             #
             # TODO: Exception handling, especially here!
             #
-            self.sock.sendall(bytes(representation + "\n\n", "utf8"))
+            data = bytes(representation + "\n\n", "utf8")
+
+            self.sock.sendall(data)
+
+            message_buffer.bytes_sent += len(data)
 
         try:
 
@@ -274,6 +318,8 @@ class TCPClientInterface(fabula.interfaces.Interface):
 
         self.sock.close()
 
+        self.wakeup.close()
+
         fabula.LOGGER.info("server connection closed")
 
         fabula.LOGGER.info("stopping thread")
@@ -297,6 +343,12 @@ class TCPServerInterface(fabula.interfaces.Interface):
 
        TCPServerInterface.thread_list
            A list of threads spawned for handling incoming connections.
+
+       TCPServerInterface.selector
+           A selectors.DefaultSelector to wait for the listening socket, the
+           sockets of all clients and TCPServerInterface.wakeup at once.
+           Created by connect(). It uses epoll or kqueue where available,
+           so there is no limit on the file descriptor numbers.
     """
 
     def __init__(self):
@@ -311,6 +363,8 @@ class TCPServerInterface(fabula.interfaces.Interface):
 
         self.thread_list = []
 
+        self.selector = None
+
         parent = self
 
         # We define the class here to be able to access local variables through
@@ -320,12 +374,10 @@ class TCPServerInterface(fabula.interfaces.Interface):
 
             def handle(self):
 
-                # TODO: this will run in a thread spawned by the custom ThreadingTCPServer class. How thread safe are these operations?
-
                 # Fabula uses persistent TCP connections, so every call to this
                 # method should be from a new client. Blindly add this one.
                 #
-                message_buffer = parent.connections[self.client_address] = fabula.interfaces.MessageBuffer()
+                self.message_buffer = parent.connections[self.client_address] = fabula.interfaces.MessageBuffer()
 
                 fabula.LOGGER.info("adding and handling new client: {}".format(self.client_address))
 
@@ -337,15 +389,65 @@ class TCPServerInterface(fabula.interfaces.Interface):
 
                 self.request.settimeout(0.3)
 
-                received_data = bytearray()
+                self.received_data = bytearray()
+
+                # TCPServerInterface.handle_messages() waits for the sockets
+                # of all clients at once and calls receive(). This thread only
+                # sends, and blocks in MessageQueue.wait() in between.
+                #
+                parent.selector.register(self.request, selectors.EVENT_READ, self)
+
+                # Selectors other than epoll and kqueue only see the new
+                # socket in their next call
+                #
+                parent.wakeup.set()
+
+                try:
+                    self.send_messages()
+
+                except:
+
+                    # Make sure the Server learns about the lost client
+                    #
+                    parent.connections.pop(self.client_address, None)
+
+                    raise
+
+                finally:
+                    parent._unregister(self.request)
+
+                    try:
+
+                        self.request.shutdown(socket.SHUT_RDWR)
+
+                    except:
+
+                        # Socket may be unavailable already
+                        #
+                        fabula.LOGGER.warning("could not shut down socket")
+
+                    self.request.close()
+
+                    fabula.LOGGER.info("handler connection closed, stopping thread")
+
+                return
+
+            def send_messages(self):
+                """Send Messages as they arrive, until shutdown or until the client is removed.
+                """
+
+                message_buffer = self.message_buffer
 
                 while not parent.shutdown_flag:
 
-                    # TODO: partly copied from TCPClientInterface.handle_messages() with a few renamings
+                    # The timeout is a safeguard only. Interface.shutdown()
+                    # and removing the connection wake us up.
+                    #
+                    message_buffer.messages_for_remote.wait(WAKEUP_TIMEOUT)
 
                     # First deliver waiting local messages.
                     #
-                    if message_buffer.messages_for_remote:
+                    while message_buffer.messages_for_remote:
 
                         fabula.LOGGER.debug("sending 1 message of {} to {}".format(len(message_buffer.messages_for_remote),
                                                                                    self.client_address))
@@ -358,40 +460,27 @@ class TCPServerInterface(fabula.interfaces.Interface):
                         try:
                             # Add a double newline as separator.
                             #
-                            self.request.sendall(bytes(representation + "\n\n", "utf8"))
-
-                        except socket.error:
-
-                            fabula.LOGGER.error("socket error while sending to {}".format(self.client_address))
-
-                            try:
-                                fabula.LOGGER.debug("closing socket")
+                            data = bytes(representation + "\n\n", "utf8")
 
-                                self.request.shutdown(socket.SHUT_RDWR)
+                            self.request.sendall(data)
 
-                            except:
+                            message_buffer.bytes_sent += len(data)
 
-                                # Socket may be unavailable already
-                                #
-                                fabula.LOGGER.warning("could not shut down socket")
-
-                            self.request.close()
+                        except socket.error:
 
-                            fabula.LOGGER.info("handler connection closed")
+                            fabula.LOGGER.error("socket error while sending to {}".format(self.client_address))
 
                             # This is the only way to notify the Server
                             #
                             fabula.LOGGER.debug("removing connection from connections dict")
 
-                            del parent.connections[self.client_address]
+                            parent.connections.pop(self.client_address, None)
 
                             fabula.LOGGER.debug("removing thread from thread list")
 
                             parent.thread_list.remove(threading.current_thread())
 
-                            fabula.LOGGER.info("stopping thread")
-
-                            raise SystemExit
+                            return
 
                     # Only the Interface may add connections to
                     # Interface.connections, but the server may remove them if
@@ -407,124 +496,115 @@ class TCPServerInterface(fabula.interfaces.Interface):
                         # We are *not* setting parent.shutdown_flag, since only
                         # this connection should terminate.
 
-                        try:
-
-                            self.request.shutdown(socket.SHUT_RDWR)
-
-                        except:
-
-                            # Socket may be unavailable already
-                            #
-                            fabula.LOGGER.warning("could not shut down socket")
+                        return
 
-                        self.request.close()
+                fabula.LOGGER.debug("shutdown flag set in parent")
 
-                        fabula.LOGGER.info("handler connection closed, stopping thread")
+                # Deliver waiting local messages.
+                #
+                while len(message_buffer.messages_for_remote):
 
-                        raise SystemExit
+                    # Copied from above
+                    #
+                    fabula.LOGGER.debug("sending 1 message of {} to {}".format(len(message_buffer.messages_for_remote),
+                                                                               self.client_address))
 
-                    # Now listen for incoming client messages for some time (set
-                    # above). This should catch any messages received in the
-                    # meantime by the OS.
+                    # Send a clear-text representation. This is supposed to
+                    # be a Python expression to recreate the instance.
                     #
-                    chunk = None
+                    representation = repr(message_buffer.messages_for_remote.popleft())
 
-                    try:
+                    # Add a double newline as separator.
+                    #
+                    data = bytes(representation + "\n\n", "utf8")
 
-                        # TODO: evaluate recv size
-                        #
-                        chunk = self.request.recv(4096)
+                    self.request.sendall(data)
 
-                    except socket.timeout:
+                    message_buffer.bytes_sent += len(data)
 
-                        # Nobody likes us, evereyone left us, there all out
-                        # without us, having fun...
-                        #
-                        pass
+                return
 
-                    except socket.error:
+            def receive(self):
+                """Read what the client has sent and add complete Messages to MessageBuffer.messages_for_local.
+                   Called by TCPServerInterface.handle_messages() when the socket is readable.
+                """
 
-                        fabula.LOGGER.error("socket error while receiving")
+                message_buffer = self.message_buffer
 
-                    if chunk:
+                chunk = None
 
-                        fabula.LOGGER.debug("received {} bytes from {}".format(len(chunk),
-                                                                               self.client_address))
+                try:
 
-                        # Assuming we are dealing with bytes here
-                        #
-                        received_data.extend(chunk)
+                    # TODO: evaluate recv size
+                    #
+                    chunk = self.request.recv(4096)
 
-                        # Now: look for Messages, separated by double newlines.
-                        #
-                        double_newline_index = received_data.find(b"\n\n")
+                except socket.timeout:
 
-                        # There actually may be more than one b"\n\n" separator
-                        # in a message. Catch them all!
-                        #
-                        while double_newline_index > -1:
+                    # Nobody likes us, evereyone left us, there all
+                    # out without us, having fun...
+                    #
+                    pass
 
-                            # Found!
+                except socket.error:
 
-                            message_str = str(received_data[:double_newline_index], "utf8")
+                    fabula.LOGGER.error("socket error while receiving")
 
-                            received_data = received_data[double_newline_index + 2:]
+                    parent._unregister(self.request)
 
-                            msg = "message from {} complete at {} bytes, {} left in buffer"
+                if chunk == b"":
 
-                            fabula.LOGGER.debug(msg.format(self.client_address,
-                                                           len(message_str),
-                                                           len(received_data)))
+                    # The socket will stay readable, so stop waiting for it.
+                    # The Server removes the client when the connection is
+                    # removed or the client exits.
+                    #
+                    fabula.LOGGER.warning("client {} has closed the connection".format(self.client_address))
 
-                            # TODO: eval() is the most dangerous thing you can do with data just received over the network.
-                            #
-                            message_buffer.messages_for_local.append(eval(message_str))
+                    parent._unregister(self.request)
 
-                            # Next
-                            #
-                            double_newline_index = received_data.find(b"\n\n")
+                if chunk:
 
-                        # No more double newlines, end of evaluation.
+                    fabula.LOGGER.debug("received {} bytes from {}".format(len(chunk),
+                                                                           self.client_address))
 
-                    # No need to run as fast as possible.
+                    # Assuming we are dealing with bytes here
                     #
-                    sleep(1/60)
+                    self.received_data.extend(chunk)
 
-                fabula.LOGGER.debug("shutdown flag set in parent")
+                    message_buffer.bytes_received += len(chunk)
 
-                # Deliver waiting local messages.
-                #
-                while len(message_buffer.messages_for_remote):
-
-                    # Copied from above
+                    # Now: look for Messages, separated by double newlines.
                     #
-                    fabula.LOGGER.debug("sending 1 message of {} to {}".format(len(message_buffer.messages_for_remote),
-                                                                               self.client_address))
+                    double_newline_index = self.received_data.find(b"\n\n")
 
-                    # Send a clear-text representation. This is supposed to
-                    # be a Python expression to recreate the instance.
+                    # There actually may be more than one b"\n\n" separator
+                    # in a message. Catch them all!
                     #
-                    representation = repr(message_buffer.messages_for_remote.popleft())
+                    while double_newline_index > -1:
 
-                    # Add a double newline as separator.
-                    #
-                    self.request.sendall(bytes(representation + "\n\n", "utf8"))
+                        # Found!
 
-                try:
+                        message_str = str(self.received_data[:double_newline_index], "utf8")
 
-                    self.request.shutdown(socket.SHUT_RDWR)
+                        self.received_data = self.received_data[double_newline_index + 2:]
 
-                except:
+                        msg = "message from {} complete at {} bytes, {} left in buffer"
 
-                    # Socket may be unavailable already
-                    #
-                    fabula.LOGGER.warning("could not shut down socket")
+                        fabula.LOGGER.debug(msg.format(self.client_address,
+                                                       len(message_str),
+                                                       len(self.received_data)))
 
-                self.request.close()
+                        # TODO: eval() is the most dangerous thing you can do with data just received over the network.
+                        #
+                        message_buffer.messages_for_local.append(eval(message_str))
 
-                fabula.LOGGER.info("handler connection closed, stopping thread")
+                        # Next
+                        #
+                        double_newline_index = self.received_data.find(b"\n\n")
 
-                raise SystemExit
+                    # No more double newlines, end of evaluation.
+
+                return
 
         # End of class.
 
@@ -555,6 +635,11 @@ class TCPServerInterface(fabula.interfaces.Interface):
         class ThreadingTCPServer(socketserver.ThreadingMixIn,
                                  socketserver.TCPServer):
 
+            # The default backlog of 5 drops connection attempts when many
+            # clients connect at once, and they retry only after a second.
+            #
+            request_queue_size = 1024
+
             def handle_error(self, request, client_address):
                 """Log the exception using fabula.LOGGER.
                 """
@@ -574,6 +659,12 @@ class TCPServerInterface(fabula.interfaces.Interface):
         #
         self.server.timeout = 0.1
 
+        self.selector = selectors.DefaultSelector()
+
+        self.selector.register(self.server.socket, selectors.EVENT_READ)
+
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+
         self.connected = True
 
         return
@@ -606,9 +697,37 @@ class TCPServerInterface(fabula.interfaces.Interface):
         #
         while not self.shutdown_flag:
 
-            # Wait at most server.timeout seconds until a request comes in:
+            # The timeout is a safeguard only. Interface.shutdown() wakes us
+            # up.
             #
-            self.server.handle_request()
+            for key, events in self.selector.select(WAKEUP_TIMEOUT):
+
+                if key.fileobj is self.server.socket:
+
+                    # Accept the connection and spawn a handler thread
+                    #
+                    self.server.handle_request()
+
+                elif key.fileobj is self.wakeup:
+
+                    self.wakeup.clear()
+
+                else:
+                    try:
+                        key.data.receive()
+
+                    except:
+
+                        # Drop the client, not the whole Interface. This
+                        # wakes up the handler thread, which closes the
+                        # socket.
+                        #
+                        fabula.LOGGER.warning("exception while receiving from {}, dropping client:\n{}".format(key.data.client_address,
+                                                                                                             traceback.format_exc()))
+
+                        self._unregister(key.fileobj)
+
+                        self.connections.pop(key.data.client_address, None)
 
         fabula.LOGGER.info("caught shutdown notification")
 
@@ -642,8 +761,26 @@ class TCPServerInterface(fabula.interfaces.Interface):
 
             thread.join()
 
+        self.selector.close()
+
+        self.wakeup.close()
+
         fabula.LOGGER.info("stopping thread")
 
         self.shutdown_confirmed = True
 
         raise SystemExit
+
+    def _unregister(self, sock):
+        """Auxiliary method. Stop waiting for data on sock, if still waiting.
+           May be called from any thread, but before the socket is closed.
+        """
+
+        try:
+            self.selector.unregister(sock)
+
+        except (KeyError, ValueError):
+
+            pass
+
+        return
@@ -24,9 +24,10 @@
 # work started on 7. Dec 2009
 
 import fabula.interfaces
+import fabula.journal
 import sys
 import logging
-from time import sleep
+from time import sleep, monotonic
 
 # Set up stdout logger
 #
@@ -40,13 +41,27 @@ LOGGER.addHandler(STDOUT_HANDLER)
 class PythonReplayInterface(fabula.interfaces.Interface):
     """An Interface which replays Python message logs.
 
+       Both binary journals written by fabula.journal.Journal and plain text
+       logs of tab-separated time differences and Message representations
+       are supported. The log is streamed, and each Message is decoded just
+       before it is replayed. Rotated segments of a journal are replayed
+       first, oldest first, see fabula.journal.journal_segments().
+
        Additional attributes:
 
        PythonReplayInterface.filename
            The name of the message logfile to replay.
+
+       PythonReplayInterface.speed
+           Replay speed factor, e.g. 0.5 for half speed or 100 for a hundred
+           times the recorded speed. 0 means as fast as possible.
+
+       PythonReplayInterface.start_time
+           Time in seconds since the start of the log. Messages recorded
+           before that time are skipped.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, speed = 1.0, start_time = 0.0):
         """Initialisation.
         """
 
@@ -54,42 +69,92 @@ class PythonReplayInterface(fabula.interfaces.Interface):
 
         self.filename = filename
 
+        if speed < 0:
+
+            msg = "replay speed must not be negative: {}".format(speed)
+
+            fabula.LOGGER.error(msg)
+
+            raise RuntimeError(msg)
+
+        self.speed = speed
+
+        self.start_time = start_time
+
         return
 
-    def handle_messages(self):
-        """Read the file and fill MessageBuffer.messages_for_local with these messages.
+    def _read_text_log(self):
+        """Auxiliary generator. Yield (timestamp, Message) tuples from a plain text log, starting at PythonReplayInterface.start_time.
         """
 
-        fabula.LOGGER.debug("opening file '{}'".format(self.filename))
+        timestamp = 0.0
 
-        if self.filename in ("messages-client.log", "messages-server.log"):
+        with open(self.filename, "rt") as message_log_file:
 
-            raise RuntimeError("Can not read from '{}', it might be overwritten during replay. Please rename the file and try again.".format(self.filename))
+            for line in message_log_file:
 
-        message_log_file = open(self.filename, "rt")
+                # Records are terminated with an empty line
+                #
+                if len(line.strip()):
+
+                    time_difference, message_repr = line.split("\t", 1)
+
+                    timestamp += float(time_difference)
+
+                    # Only decode what is actually replayed
+                    #
+                    if timestamp >= self.start_time:
+
+                        yield (timestamp, eval(message_repr))
+
+        return
 
-        fabula.LOGGER.debug("reading data")
+    def _read_journal(self):
+        """Auxiliary generator. Yield (timestamp, Message) tuples from a binary journal and its rotated segments, starting at PythonReplayInterface.start_time.
+        """
+
+        if self.start_time:
 
-        # TODO: read and process line by line to save memory
+            LOGGER.info("seeking to {} s".format(self.start_time))
+            fabula.LOGGER.info("seeking to {} s".format(self.start_time))
+
+        # Timestamps continue across rotations, so each segment can seek on
+        # its own. Segments ending before start_time yield nothing.
         #
-        data = message_log_file.read()
+        for segment in fabula.journal.journal_segments(self.filename):
 
-        #fabula.LOGGER.debug("data read: '{}'".format(data))
+            journal_reader = fabula.journal.JournalReader(segment)
 
-        fabula.LOGGER.debug("closing file")
+            if self.start_time:
 
-        message_log_file.close()
+                journal_reader.seek(self.start_time)
 
-        message_log = []
+            for record in journal_reader:
 
-        for tab_separated in data.split("\n\n"):
+                yield record
 
-            if len(tab_separated):
+        return
 
-                # Append a tuple (float, Message)
-                #
-                message_log.append((float(tab_separated.split("\t")[0]),
-                                    eval(tab_separated.split("\t")[1])))
+    def handle_messages(self):
+        """Read the file and fill MessageBuffer.messages_for_local with these messages.
+        """
+
+        fabula.LOGGER.debug("opening file '{}'".format(self.filename))
+
+        if self.filename in ("messages-client.log", "messages-server.log"):
+
+            raise RuntimeError("Can not read from '{}', it might be overwritten during replay. Please rename the file and try again.".format(self.filename))
+
+        if fabula.journal.is_journal(self.filename):
+
+            fabula.LOGGER.debug("reading binary journal")
+
+            message_log = self._read_journal()
+
+        else:
+            fabula.LOGGER.debug("reading plain text log")
+
+            message_log = self._read_text_log()
 
         LOGGER.info("wating for first connection")
         fabula.LOGGER.info("wating for first connection")
@@ -105,35 +170,56 @@ class PythonReplayInterface(fabula.interfaces.Interface):
 
         message_buffer = list(self.connections.values())[0]
 
+        # Messages are scheduled relative to the start of the replay rather
+        # than to the previous message, so sleeping does not add up to drift.
+        #
+        replay_start = monotonic()
+
+        replayed = 0
+
         # Fill MessageBuffer.messages_for_local with messages from the file.
         #
-        while message_log and not self.shutdown_flag:
+        for timestamp, message in message_log:
+
+            if self.shutdown_flag:
+
+                break
+
+            if self.speed:
+
+                delay = replay_start + (timestamp - self.start_time) / self.speed - monotonic()
+
+                if delay > 0:
+
+                    LOGGER.debug("sleeping {} s".format(delay))
+                    fabula.LOGGER.debug("sleeping {} s".format(delay))
 
-            time_message_tuple = message_log.pop(0)
+                    sleep(delay)
 
-            LOGGER.debug("sleeping {} s".format(time_message_tuple[0]))
-            fabula.LOGGER.debug("sleeping {} s".format(time_message_tuple[0]))
+            # Do not let the queue compact a replay. Wait for the Client to
+            # catch up instead.
+            #
+            queue = message_buffer.messages_for_local
+
+            while queue.limit and len(queue) >= queue.limit and not self.shutdown_flag:
 
-            sleep(time_message_tuple[0])
+                sleep(1/60)
 
-            LOGGER.debug("adding message: {}".format(time_message_tuple[1]))
-            fabula.LOGGER.debug("adding message: {}".format(time_message_tuple[1]))
+            LOGGER.debug("adding message: {}".format(message))
+            fabula.LOGGER.debug("adding message: {}".format(message))
 
-            message_buffer.messages_for_local.append(time_message_tuple[1])
+            message_buffer.messages_for_local.append(message)
 
-            LOGGER.debug("{} messages left for replay".format(len(message_log)))
-            fabula.LOGGER.debug("{} messages left for replay".format(len(message_log)))
+            replayed += 1
 
-        LOGGER.info("done with replay or shutdown request")
-        fabula.LOGGER.info("done with replay or shutdown request")
+        message_log.close()
+
+        LOGGER.info("done with replay or shutdown request, {} messages replayed".format(replayed))
+        fabula.LOGGER.info("done with replay or shutdown request, {} messages replayed".format(replayed))
 
         # Run thread as long as no shutdown is requested
         #
-        while not self.shutdown_flag:
-
-            # No need to run as fast as possible
-            #
-            sleep(1/60)
+        self.shutdown_event.wait()
 
         # Caught shutdown notification, stopping thread
         #
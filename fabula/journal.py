@@ -0,0 +1,629 @@
+"""Fabula Message Journal
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 02. Jul 2012
+#
+# Replaces the plain text message logs written by Server._write_logfile()
+# and Client.run().
+
+import fabula
+import os
+import bisect
+import struct
+import threading
+import queue
+import time
+import zlib
+
+# A journal file starts with MAGIC, followed by a single byte giving the
+# format version and a single byte giving the compression method.
+#
+MAGIC = b"FABJ"
+
+VERSION = 1
+
+# Compression methods, as stored in the file header
+#
+NONE = 0
+ZLIB = 1
+LZMA = 2
+
+COMPRESSION_BY_NAME = {"none" : NONE,
+                       "zlib" : ZLIB,
+                       "lzma" : LZMA}
+
+HEADER = struct.Struct("<4sBB")
+
+# Each record starts with the time in seconds since the journal was started
+# (taken from time.monotonic()), the length of the payload in bytes and the
+# CRC-32 checksum of the payload. The payload is the UTF-8 encoded repr() of
+# the Message, compressed if the header says so.
+#
+RECORD_HEADER = struct.Struct("<dII")
+
+# The index file "<filename>.idx" written alongside a journal holds one entry
+# per record: the record timestamp and the offset of the record in the
+# journal file.
+#
+INDEX_ENTRY = struct.Struct("<dQ")
+
+def _compressor(compression):
+    """Auxiliary function. Return a function compressing a bytes object using the given method.
+    """
+
+    if compression == NONE:
+
+        return lambda data: data
+
+    elif compression == ZLIB:
+
+        return zlib.compress
+
+    elif compression == LZMA:
+
+        # lzma may be missing in minimal Python builds, so import it on demand
+        #
+        import lzma
+
+        return lzma.compress
+
+    msg = "unknown compression method: {}".format(compression)
+
+    fabula.LOGGER.error(msg)
+
+    raise RuntimeError(msg)
+
+def _decompressor(compression):
+    """Auxiliary function. Return a function decompressing a bytes object using the given method.
+    """
+
+    if compression == NONE:
+
+        return lambda data: data
+
+    elif compression == ZLIB:
+
+        return zlib.decompress
+
+    elif compression == LZMA:
+
+        import lzma
+
+        return lzma.decompress
+
+    msg = "unknown compression method: {}".format(compression)
+
+    fabula.LOGGER.error(msg)
+
+    raise RuntimeError(msg)
+
+def is_journal(filename):
+    """Return True if the file given starts with a journal header, False otherwise.
+    """
+
+    with open(filename, "rb") as journal_file:
+
+        return journal_file.read(len(MAGIC)) == MAGIC
+
+def journal_segments(filename):
+    """Return a list of the names of the journal file given and of its rotated segments, oldest first.
+
+       Rotated segments "<filename>.1", "<filename>.2" and so on are included
+       as long as they exist, are journals and end before the following
+       segment starts. This skips segments left over from an earlier journal
+       of the same name, unless their timestamps happen to fit.
+    """
+
+    segments = [filename]
+
+    # The first timestamp of the oldest segment found so far
+    #
+    following_start = None
+
+    index = JournalReader(filename).build_index()
+
+    if index:
+
+        following_start = index[0][0]
+
+    number = 1
+
+    while (os.path.exists("{}.{}".format(filename, number))
+           and is_journal("{}.{}".format(filename, number))):
+
+        segment = "{}.{}".format(filename, number)
+
+        index = JournalReader(segment).build_index()
+
+        if index:
+
+            if following_start is not None and index[-1][0] > following_start:
+
+                fabula.LOGGER.warning("'{}' ends after the following segment starts, not replaying it and older segments".format(segment))
+
+                break
+
+            following_start = index[0][0]
+
+        segments.insert(0, segment)
+
+        number += 1
+
+    return segments
+
+class Journal:
+    """An append-only binary message journal.
+
+       Messages handed to Journal.write() are time-stamped and encoded in the
+       calling thread. Compression, writing, flushing and rotating is done by a
+       background thread, so that the caller does not wait for the file system.
+
+       Attributes:
+
+       Journal.filename
+           The name of the journal file. Rotated files are named
+           "<filename>.1", "<filename>.2" and so on, "<filename>.1" being the
+           most recent. An index of record offsets is written to
+           "<filename>.idx", and rotated alongside.
+
+       Journal.compression
+           One of fabula.journal.NONE, fabula.journal.ZLIB or
+           fabula.journal.LZMA.
+
+       Journal.max_bytes
+           If a file grows larger than this, it is rotated. 0 means never
+           rotate.
+
+       Journal.backup_count
+           The number of rotated files to keep.
+
+       Journal.flush_interval
+           Maximum time in seconds that written records are buffered before
+           they are flushed to the file. 0 means flush after every record.
+
+       Journal.fsync
+           If True, call os.fsync() after each flush, so records survive a
+           system crash.
+
+       Journal.start_time
+           The time.monotonic() value at the start of the journal.
+
+       Journal.record_queue
+           A queue.Queue of (timestamp, payload) tuples to be written.
+
+       Journal.writer_thread
+           The background thread writing the records. It stops when a file
+           can not be written.
+
+       Journal.dropped_records
+           The number of Messages dropped by Journal.write() because the
+           writer thread had stopped.
+    """
+
+    def __init__(self,
+                 filename,
+                 compression = NONE,
+                 max_bytes = 0,
+                 backup_count = 5,
+                 flush_interval = 1.0,
+                 fsync = False):
+        """Initialise. This will truncate an existing file of the same name and start the writer thread.
+        """
+
+        self.filename = filename
+
+        if compression in COMPRESSION_BY_NAME:
+
+            compression = COMPRESSION_BY_NAME[compression]
+
+        # Fail early when the method is not available
+        #
+        self.compress = _compressor(compression)
+
+        self.compression = compression
+
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.start_time = time.monotonic()
+
+        self.record_queue = queue.Queue()
+
+        self.dropped_records = 0
+
+        fabula.LOGGER.debug("opening journal file '{}'".format(self.filename))
+
+        self.journal_file, self.index_file = self._open_files()
+
+        self.writer_thread = threading.Thread(target = self._write_records,
+                                              name = "fabula-journal")
+
+        self.writer_thread.daemon = True
+
+        self.writer_thread.start()
+
+        return
+
+    def write(self, message):
+        """Queue the Message given to be written to the journal.
+           If the writer thread has stopped after an error, the Message is
+           dropped and counted in Journal.dropped_records.
+        """
+
+        # Do not let the queue grow without bounds when nobody takes records
+        #
+        if not self.writer_thread.is_alive():
+
+            self.dropped_records += 1
+
+            return
+
+        # Encode in the calling thread, since the Message might be changed
+        # by the time the writer thread gets to it.
+        #
+        self.record_queue.put((time.monotonic() - self.start_time,
+                               repr(message).encode("utf-8")))
+
+        return
+
+    def close(self):
+        """Write all pending records, close the file and stop the writer thread.
+        """
+
+        if self.writer_thread.is_alive():
+
+            fabula.LOGGER.debug("closing journal '{}'".format(self.filename))
+
+            self.record_queue.put(None)
+
+            self.writer_thread.join()
+
+        return
+
+    def _open_files(self):
+        """Auxiliary method. Open Journal.filename and its index for writing, write the header and return both files.
+        """
+
+        journal_file = open(self.filename, "wb")
+
+        journal_file.write(HEADER.pack(MAGIC, VERSION, self.compression))
+
+        return (journal_file, open(self.filename + ".idx", "wb"))
+
+    def _flush(self):
+        """Auxiliary method. Flush the journal file and its index, calling os.fsync() if requested.
+        """
+
+        # Flush the journal first, so the index never points beyond its end
+        #
+        for current_file in (self.journal_file, self.index_file):
+
+            current_file.flush()
+
+            if self.fsync:
+
+                os.fsync(current_file.fileno())
+
+        return
+
+    def _rotate(self):
+        """Auxiliary method. Close the current file, shift the backups and open a new file.
+        """
+
+        fabula.LOGGER.info("rotating journal '{}'".format(self.filename))
+
+        self._flush()
+
+        self.journal_file.close()
+        self.index_file.close()
+
+        if self.backup_count:
+
+            for i in range(self.backup_count - 1, 0, -1):
+
+                for suffix in ("", ".idx"):
+
+                    source = "{}.{}{}".format(self.filename, i, suffix)
+
+                    if os.path.exists(source):
+
+                        os.replace(source,
+                                   "{}.{}{}".format(self.filename, i + 1, suffix))
+
+            os.replace(self.filename, "{}.1".format(self.filename))
+
+            os.replace(self.filename + ".idx",
+                       "{}.1.idx".format(self.filename))
+
+        self.journal_file, self.index_file = self._open_files()
+
+        return
+
+    def _write_records(self):
+        """Auxiliary method. Main loop of the writer thread.
+           An OSError, e.g. from a full disk, is logged and ends the thread.
+        """
+
+        try:
+            self._write_loop()
+
+        except OSError as error:
+
+            fabula.LOGGER.error("could not write journal '{}', dropping further records: {}".format(self.filename, error))
+
+            for current_file in (self.journal_file, self.index_file):
+
+                try:
+                    current_file.close()
+
+                except OSError:
+
+                    pass
+
+            return
+
+        fabula.LOGGER.debug("journal '{}' closed".format(self.filename))
+
+        return
+
+    def _write_loop(self):
+        """Auxiliary method. Write records until None is taken from Journal.record_queue, then close the files.
+        """
+
+        last_flush = time.monotonic()
+
+        unflushed = False
+
+        while True:
+
+            try:
+                # Wake up regularly to honour the flush interval, even if no
+                # new records arrive.
+                #
+                record = self.record_queue.get(timeout = self.flush_interval or None)
+
+            except queue.Empty:
+
+                record = ()
+
+            if record is None:
+
+                break
+
+            if record:
+
+                payload = self.compress(record[1])
+
+                self.index_file.write(INDEX_ENTRY.pack(record[0],
+                                                       self.journal_file.tell()))
+
+                self.journal_file.write(RECORD_HEADER.pack(record[0],
+                                                           len(payload),
+                                                           zlib.crc32(payload)))
+
+                self.journal_file.write(payload)
+
+                unflushed = True
+
+            if unflushed and time.monotonic() - last_flush >= self.flush_interval:
+
+                self._flush()
+
+                last_flush = time.monotonic()
+
+                unflushed = False
+
+            if self.max_bytes and self.journal_file.tell() >= self.max_bytes:
+
+                self._rotate()
+
+        self._flush()
+
+        self.journal_file.close()
+        self.index_file.close()
+
+        return
+
+class JournalReader:
+    """Read the records of a journal file written by fabula.journal.Journal.
+
+       Iterating over a JournalReader yields (timestamp, Message) tuples, where
+       timestamp is the time in seconds since the journal was started. The
+       file is read and decoded one record at a time, starting at
+       JournalReader.offset.
+
+       A truncated or corrupt record, as left by a crash, ends the iteration.
+
+       Attributes:
+
+       JournalReader.filename
+           The name of the journal file.
+
+       JournalReader.compression
+           The compression method read from the file header.
+
+       JournalReader.offset
+           The file offset at which iteration starts. Initially the first
+           record, changed by JournalReader.seek().
+
+       JournalReader.index
+           A list of (timestamp, offset) tuples, one per record. Initially
+           None, built by JournalReader.build_index().
+    """
+
+    def __init__(self, filename):
+        """Initialise. Raises IOError if the file is not a journal.
+        """
+
+        self.filename = filename
+
+        with open(filename, "rb") as journal_file:
+
+            header = journal_file.read(HEADER.size)
+
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+
+            msg = "'{}' is not a Fabula journal file".format(filename)
+
+            fabula.LOGGER.error(msg)
+
+            raise IOError(msg)
+
+        magic, version, self.compression = HEADER.unpack(header)
+
+        if version > VERSION:
+
+            msg = "'{}' has unsupported journal version {}".format(filename, version)
+
+            fabula.LOGGER.error(msg)
+
+            raise IOError(msg)
+
+        self.decompress = _decompressor(self.compression)
+
+        self.offset = HEADER.size
+
+        self.index = None
+
+        return
+
+    def build_index(self):
+        """Read the index file written alongside the journal and return JournalReader.index.
+
+           Records not covered by the index file, or all records if there is
+           no index file, are indexed by reading the record headers only.
+        """
+
+        self.index = []
+
+        if os.path.exists(self.filename + ".idx"):
+
+            with open(self.filename + ".idx", "rb") as index_file:
+
+                data = index_file.read()
+
+            # Ignore a partially written last entry
+            #
+            data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+
+            self.index = list(INDEX_ENTRY.iter_unpack(data))
+
+        with open(self.filename, "rb") as journal_file:
+
+            # Do not trust entries pointing beyond the end of the journal
+            #
+            journal_file.seek(0, os.SEEK_END)
+
+            size = journal_file.tell()
+
+            while self.index and self.index[-1][1] + RECORD_HEADER.size > size:
+
+                self.index.pop()
+
+            offset = HEADER.size
+
+            if self.index:
+
+                journal_file.seek(self.index[-1][1])
+
+                timestamp, length, checksum = RECORD_HEADER.unpack(journal_file.read(RECORD_HEADER.size))
+
+                offset = self.index[-1][1] + RECORD_HEADER.size + length
+
+            journal_file.seek(offset)
+
+            while True:
+
+                record_header = journal_file.read(RECORD_HEADER.size)
+
+                if len(record_header) < RECORD_HEADER.size:
+
+                    break
+
+                timestamp, length, checksum = RECORD_HEADER.unpack(record_header)
+
+                self.index.append((timestamp, offset))
+
+                offset = journal_file.seek(length, os.SEEK_CUR)
+
+        fabula.LOGGER.debug("{} records in '{}'".format(len(self.index), self.filename))
+
+        return self.index
+
+    def seek(self, timestamp):
+        """Make iteration start at the first record with a timestamp greater than or equal to the timestamp given.
+
+           Returns the timestamp of that record, or None if there is none.
+        """
+
+        if self.index is None:
+
+            self.build_index()
+
+        # Timestamps are monotonic, so the index is sorted
+        #
+        i = bisect.bisect_left([entry[0] for entry in self.index], timestamp)
+
+        if i < len(self.index):
+
+            self.offset = self.index[i][1]
+
+            return self.index[i][0]
+
+        # Seeking past the end
+        #
+        with open(self.filename, "rb") as journal_file:
+
+            self.offset = journal_file.seek(0, os.SEEK_END)
+
+        return None
+
+    def __iter__(self):
+        """Yield (timestamp, Message) tuples, starting at JournalReader.offset.
+        """
+
+        with open(self.filename, "rb") as journal_file:
+
+            journal_file.seek(self.offset)
+
+            while True:
+
+                record_header = journal_file.read(RECORD_HEADER.size)
+
+                if len(record_header) < RECORD_HEADER.size:
+
+                    break
+
+                timestamp, length, checksum = RECORD_HEADER.unpack(record_header)
+
+                payload = journal_file.read(length)
+
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+
+                    fabula.LOGGER.warning("truncated or corrupt record in '{}', stopping".format(self.filename))
+
+                    break
+
+                yield (timestamp,
+                       eval(self.decompress(payload).decode("utf-8")))
+
+        return
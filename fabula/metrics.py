@@ -0,0 +1,295 @@
+"""Fabula Engine Metrics
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 24. Jul 2012
+#
+# Counters, gauges and latency histograms for the hot paths of
+# fabula.core.Engine, exported as periodic JSON snapshot files.
+
+import bisect
+import json
+import os
+import time
+
+# Upper bounds in seconds of the Histogram buckets, roughly three per decade
+# from 1 microsecond to 10 seconds. Values above the last bound go into an
+# overflow bucket.
+#
+BUCKET_BOUNDS = tuple(factor * 10 ** exponent
+                      for exponent in range(-6, 1)
+                      for factor in (1, 2, 5)) + (10.0,)
+
+class Counter:
+    """A monotonically increasing count.
+
+       Attributes:
+
+       Counter.value
+           The current count, initially 0.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.value = 0
+
+        return
+
+    def increment(self, amount = 1):
+        """Add amount to the count.
+        """
+
+        self.value += amount
+
+        return
+
+class Gauge:
+    """A value that may go up and down, like a queue length.
+
+       Attributes:
+
+       Gauge.value
+           The value last set, initially 0.
+
+       Gauge.max
+           The highest value ever set, initially 0.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.value = 0
+
+        self.max = 0
+
+        return
+
+    def set(self, value):
+        """Set the gauge to value.
+        """
+
+        self.value = value
+
+        if value > self.max:
+
+            self.max = value
+
+        return
+
+class Histogram:
+    """A distribution of durations in seconds, counted in the fixed buckets of BUCKET_BOUNDS.
+
+       Attributes:
+
+       Histogram.counts
+           A list with one count per bucket, plus one for values exceeding
+           the last bound.
+
+       Histogram.count
+           The number of values observed.
+
+       Histogram.sum
+           The sum of the values observed.
+
+       Histogram.max
+           The largest value observed.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+
+        self.count = 0
+
+        self.sum = 0.0
+
+        self.max = 0.0
+
+        return
+
+    def observe(self, value):
+        """Add a value to the distribution.
+        """
+
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+
+        self.count += 1
+
+        self.sum += value
+
+        if value > self.max:
+
+            self.max = value
+
+        return
+
+    def percentile(self, percent):
+        """Return an upper estimate of the given percentile, which is the bound of the bucket it falls into.
+           Values in the overflow bucket are estimated by Histogram.max.
+           Returns 0.0 if no values have been observed.
+        """
+
+        if not self.count:
+
+            return 0.0
+
+        rank = self.count * percent / 100.0
+
+        seen = 0
+
+        for index, bucket_count in enumerate(self.counts):
+
+            seen += bucket_count
+
+            if bucket_count and seen >= rank:
+
+                if index < len(BUCKET_BOUNDS):
+
+                    return min(BUCKET_BOUNDS[index], self.max)
+
+                return self.max
+
+        return self.max
+
+class Registry:
+    """A collection of named Counters, Gauges and Histograms.
+
+       Metrics are created upon first access, so the hot paths do not need to
+       register them beforehand. Names are plain strings; per-connection
+       metrics put the connector into the name, e.g.
+       "connection ('127.0.0.1', 4011) bytes_received".
+
+       Attributes:
+
+       Registry.counters
+       Registry.gauges
+       Registry.histograms
+           Dicts mapping names to Counter, Gauge and Histogram instances.
+
+       Registry.start_time
+           time.time() when the Registry was created.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.counters = {}
+
+        self.gauges = {}
+
+        self.histograms = {}
+
+        self.start_time = time.time()
+
+        return
+
+    def counter(self, name):
+        """Return the Counter called name, creating it if necessary.
+        """
+
+        if name not in self.counters:
+
+            self.counters[name] = Counter()
+
+        return self.counters[name]
+
+    def gauge(self, name):
+        """Return the Gauge called name, creating it if necessary.
+        """
+
+        if name not in self.gauges:
+
+            self.gauges[name] = Gauge()
+
+        return self.gauges[name]
+
+    def histogram(self, name):
+        """Return the Histogram called name, creating it if necessary.
+        """
+
+        if name not in self.histograms:
+
+            self.histograms[name] = Histogram()
+
+        return self.histograms[name]
+
+    def remove(self, prefix):
+        """Remove all Counters, Gauges and Histograms whose names start with prefix.
+           Use this to drop per-connection metrics when a connection is gone.
+        """
+
+        for metrics in (self.counters, self.gauges, self.histograms):
+
+            for name in [name for name in metrics if name.startswith(prefix)]:
+
+                del metrics[name]
+
+        return
+
+    def snapshot(self):
+        """Return a dict of the current values, ready to be serialised as JSON.
+           Histograms are summarised by count, sum, mean, max and the 50th,
+           95th and 99th percentile, all in seconds.
+        """
+
+        histograms = {}
+
+        for name, histogram in self.histograms.items():
+
+            mean = 0.0
+
+            if histogram.count:
+
+                mean = histogram.sum / histogram.count
+
+            histograms[name] = {"count" : histogram.count,
+                                "sum" : histogram.sum,
+                                "mean" : mean,
+                                "max" : histogram.max,
+                                "p50" : histogram.percentile(50),
+                                "p95" : histogram.percentile(95),
+                                "p99" : histogram.percentile(99)}
+
+        return {"time" : time.time(),
+                "uptime" : time.time() - self.start_time,
+                "counters" : {name : counter.value for name, counter in self.counters.items()},
+                "gauges" : {name : {"value" : gauge.value, "max" : gauge.max} for name, gauge in self.gauges.items()},
+                "histograms" : histograms}
+
+    def write(self, filename):
+        """Write Registry.snapshot() as JSON to filename.
+           The file is replaced atomically, so readers never see a partial
+           snapshot.
+        """
+
+        temporary_filename = filename + ".tmp"
+
+        with open(temporary_filename, "wt", encoding = "utf8") as snapshot_file:
+
+            json.dump(self.snapshot(), snapshot_file, indent = 1, sort_keys = True)
+
+        os.replace(temporary_filename, filename)
+
+        return
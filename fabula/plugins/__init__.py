@@ -22,6 +22,23 @@
 
 import fabula
 import fabula.eventprocessor
+import importlib
+
+# Submodules which are imported upon first access, see fabula.__getattr__().
+#
+SUBMODULES = ("pygameui",
+              "serverside",
+              "ui")
+
+def __getattr__(name):
+    """Import the submodules in SUBMODULES upon first access.
+    """
+
+    if name in SUBMODULES:
+
+        return importlib.import_module(__name__ + "." + name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
 
 class Plugin(fabula.eventprocessor.EventProcessor):
     """Base class for plugins to be used by a fabula.core.Engine.
@@ -49,6 +66,19 @@ class Plugin(fabula.eventprocessor.EventProcessor):
 
         self.message_for_host = fabula.Message([])
 
+    def __getstate__(self):
+        """Return a copy of self.__dict__ without the event_dict and the host to the pickle module.
+
+           The host is not part of the Plugin state and must be set after
+           unpickling.
+        """
+
+        state_dict = fabula.eventprocessor.EventProcessor.__getstate__(self)
+
+        del state_dict["host"]
+
+        return state_dict
+
     def process_message(self, message):
         """This is the main method of a plugin.
 
@@ -38,6 +38,9 @@ import tkinter.filedialog
 import tkinter.simpledialog
 import datetime
 import os
+import concurrent.futures
+import collections
+import array
 import planes.gui.lmr
 import planes.gui.tmb
 import surfacecatcher
@@ -54,110 +57,959 @@ import tkinter._fix
 #
 PIX_PER_CHAR = 8
 
+# Seconds between updates of PygameUserInterface.stats
+#
+STATS_INTERVAL = 1.0
+
 def load_image(title):
     """Auxiliary function to make the user open an image file.
        Returns a tuple (Surface, filename) upon success, (None, None) otherwise.
     """
 
-    surface = None
-    filename = None
+    surface = None
+    filename = None
+
+    tk = tkinter.Tk()
+    tk.withdraw()
+
+    image_types = ("Image Files",
+                   ".jpg .png .gif .bmp .pcx .tga .tif .lbm .pbm .xpm")
+
+    fullpath = tkinter.filedialog.askopenfilename(filetypes = [image_types],
+                                                  title = title)
+    tk.destroy()
+
+    if fullpath:
+
+        filename = os.path.basename(fullpath)
+
+        try:
+            surface = pygame.image.load(fullpath)
+
+        except pygame.error:
+
+            # This will return None
+            #
+            pass
+
+    return (surface, filename)
+
+class MovementAnimator:
+    """A shared animation system which moves EntityPlanes along straight lines.
+
+       Instead of per-Plane lists of positions, the active movements of all
+       EntityPlanes are stored in parallel arrays of start and end positions,
+       start frames and durations. MovementAnimator.step() computes the
+       positions of all Planes for a frame in a single pass. Positions refer
+       to the bottom center of a Plane's rect.
+
+       Attributes:
+
+       MovementAnimator.frame
+           The number of the current frame.
+
+       MovementAnimator.planes
+           A list of the EntityPlanes of all queued movements.
+
+       MovementAnimator.start_x
+       MovementAnimator.start_y
+       MovementAnimator.end_x
+       MovementAnimator.end_y
+           array.array instances of start and end coordinates, parallel to
+           MovementAnimator.planes.
+
+       MovementAnimator.start_frame
+       MovementAnimator.duration
+           array.array instances of the frame a movement starts after, and of
+           its length in frames.
+
+       MovementAnimator.targets
+           A dict mapping EntityPlanes to a tuple (x, y, end_frame, min_x,
+           min_y, max_x, max_y) of their last queued movement, and the
+           bounds of all positions queued since the Plane last arrived.
+
+       MovementAnimator.added
+           A set of EntityPlanes which got new movements since the last step.
+
+       MovementAnimator.steps
+           The number of frames to advance in the next step(). Set this from a
+           fabula.plugins.ui.FrameScheduler to keep the real duration of
+           movements constant when frames are dropped. Default 1.
+
+       MovementAnimator.alpha
+           The fraction of the following frame to add for interpolated
+           positions, from 0.0 to 1.0. Default 0.0.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.frame = 0
+
+        self.steps = 1
+
+        self.alpha = 0.0
+
+        self.clear()
+
+        return
+
+    def clear(self):
+        """Drop all movements.
+        """
+
+        self.planes = []
+        self.start_x = array.array("d")
+        self.start_y = array.array("d")
+        self.end_x = array.array("d")
+        self.end_y = array.array("d")
+        self.start_frame = array.array("l")
+        self.duration = array.array("l")
+        self.targets = {}
+        self.added = set()
+
+        return
+
+    def target(self, plane):
+        """Return the (x, y) end position of the last queued movement of plane, or None.
+        """
+
+        if plane in self.targets:
+
+            return self.targets[plane][:2]
+
+        return None
+
+    def add(self, plane, position, frame_count):
+        """Queue a movement of plane to the (x, y) position given over frame_count frames.
+           The movement starts when the previously queued movement of that Plane ends.
+        """
+
+        if plane in self.targets:
+
+            start_x, start_y, start_frame, min_x, min_y, max_x, max_y = self.targets[plane]
+
+        else:
+            start_x, start_y, start_frame = plane.rect.centerx, plane.rect.bottom, self.frame
+
+            min_x, min_y, max_x, max_y = position[0], position[1], position[0], position[1]
+
+        start_frame = max(start_frame, self.frame)
+
+        self.planes.append(plane)
+        self.start_x.append(start_x)
+        self.start_y.append(start_y)
+        self.end_x.append(position[0])
+        self.end_y.append(position[1])
+        self.start_frame.append(start_frame)
+        self.duration.append(frame_count)
+
+        self.targets[plane] = (position[0], position[1], start_frame + frame_count,
+                               min(min_x, position[0]), min(min_y, position[1]),
+                               max(max_x, position[0]), max(max_y, position[1]))
+
+        self.added.add(plane)
+
+        return
+
+    def swept_rect(self, plane):
+        """Return a Rect covering the current rect of plane and all positions queued since it last arrived.
+        """
+
+        rect = pygame.Rect(plane.rect)
+
+        if plane in self.targets:
+
+            min_x, min_y, max_x, max_y = self.targets[plane][3:]
+
+            # All positions have the size of plane.rect, so the rects at
+            # the extremes cover all others.
+            #
+            end_rect = pygame.Rect(plane.rect)
+
+            end_rect.centerx = int(min_x)
+            end_rect.bottom = int(min_y)
+
+            rect.union_ip(end_rect)
+
+            end_rect.centerx = int(max_x)
+            end_rect.bottom = int(max_y)
+
+            rect.union_ip(end_rect)
+
+        return rect
+
+    def step(self, visible_names = None):
+        """Advance by MovementAnimator.steps frames and move all Planes.
+
+           If visible_names is given, only Planes whose names are in
+           visible_names and Planes that reach their target are moved.
+           Returns a list of Planes whose last queued movement has ended.
+        """
+
+        self.frame = self.frame + self.steps
+
+        frame = self.frame
+
+        alpha = self.alpha
+
+        finished = []
+
+        # Local names save attribute lookups in the loop over all movements
+        #
+        start_x, start_y, end_x, end_y = self.start_x, self.start_y, self.end_x, self.end_y
+
+        for index, (plane, start_frame, duration) in enumerate(zip(self.planes,
+                                                                   self.start_frame,
+                                                                   self.duration)):
+
+            elapsed = frame - start_frame
+
+            if elapsed + alpha <= 0:
+
+                continue
+
+            if elapsed >= duration:
+
+                finished.append(index)
+
+                plane.rect.midbottom = (int(end_x[index]), int(end_y[index]))
+
+            elif visible_names is None or plane.name in visible_names:
+
+                share = min((elapsed + alpha) / duration, 1.0)
+
+                x = start_x[index]
+                y = start_y[index]
+
+                plane.rect.midbottom = (int(x + (end_x[index] - x) * share),
+                                        int(y + (end_y[index] - y) * share))
+
+        arrived = []
+
+        if finished:
+
+            finished_set = set(finished)
+
+            keep = [index for index in range(len(self.planes)) if index not in finished_set]
+
+            for index in finished:
+
+                plane = self.planes[index]
+
+                if plane in self.targets and self.targets[plane][2] <= frame:
+
+                    del self.targets[plane]
+
+                    arrived.append(plane)
+
+            self.planes = [self.planes[index] for index in keep]
+
+            for name in ("start_x", "start_y", "end_x", "end_y", "start_frame", "duration"):
+
+                values = getattr(self, name)
+
+                setattr(self, name, array.array(values.typecode, [values[index] for index in keep]))
+
+        return arrived
+
+class EntityPlane(planes.Plane):
+    """Subclass of Plane with an extended update() method that handles animation.
+
+       Additional attributes:
+
+       EntityPlane.animator
+           The MovementAnimator which moves this Plane, or None.
+
+       EntityPlane.spritesheet
+           If not None, a Pygame Surface that contains a sprite sheet. The sheet
+           is assumed to consist of 4 rows. The first column contains the
+           static view of the Entity in front, left, back and right view (from
+           the first row down). Rows are supposed to contain movement animation
+           frames: the first row a downward movement in front view, the second
+           row a movement to the left in left view etc. Frames are assumed to be
+           of equal width and height.
+
+       EntityPlane.frames
+           A tuple of subsurfaces of the sprite sheet, sliced once upon
+           loading. Frame row * EntityPlane.columns + column is the image in
+           the given row and column. Empty if there is no sprite sheet.
+
+       EntityPlane.columns
+           The number of columns in the sprite sheet.
+
+       EntityPlane.frame_list
+           A collections.deque of indices into EntityPlane.frames, one per
+           frame to be displayed.
+
+       EntityPlane.animation_cache
+           A dict mapping tuples (row, frame_count) to tuples of frame indices
+           for a movement in that row, see EntityPlane.animation().
+    """
+
+    def __init__(self, name, rect, draggable = False,
+                                   grab = False,
+                                   left_click_callback = None,
+                                   right_click_callback = None,
+                                   dropped_upon_callback = None,
+                                   spritesheet = None,
+                                   frames = (),
+                                   animator = None):
+        """Initialise.
+           frames is a tuple of subsurfaces of spritesheet as returned by
+           slice_spritesheet().
+        """
+
+        # Call base class
+        #
+        planes.Plane.__init__(self,
+                              name,
+                              rect,
+                              draggable = draggable,
+                              grab = grab,
+                              highlight = True,
+                              left_click_callback = left_click_callback,
+                              right_click_callback = right_click_callback,
+                              dropped_upon_callback = dropped_upon_callback)
+
+        self.animator = animator
+        self.spritesheet = spritesheet
+        self.frames = frames
+        self.columns = int(len(frames) / 4)
+        self.frame_list = collections.deque()
+        self.animation_cache = {}
+
+        return
+
+    def update(self):
+        """Display the next animation frame from EntityPlane.frame_list.
+           Movement is done by EntityPlane.animator.
+        """
+
+        # Call base class to update() all subplanes
+        #
+        planes.Plane.update(self)
+
+        # Change image, skipping frames along with the animator
+        #
+        steps = 1
+
+        if self.animator is not None:
+
+            steps = self.animator.steps
+
+        for i in range(min(steps, len(self.frame_list))):
+
+            self.image = self.frames[self.frame_list.popleft()]
+
+        return
+
+    def advance(self):
+        """Cheap replacement for update() while the EntityPlane is not visible.
+           Skip the animation frame and do not update subplanes.
+        """
+
+        steps = 1
+
+        if self.animator is not None:
+
+            steps = self.animator.steps
+
+        for i in range(min(steps, len(self.frame_list))):
+
+            self.frame_list.popleft()
+
+        return
+
+    def move_to(self, position, frame_count):
+        """Move the bottom center of the Plane to the (x, y) position given over frame_count frames, after all queued movements.
+        """
+
+        if self.animator is None:
+
+            self.rect.centerx, self.rect.bottom = position
+
+        else:
+            self.animator.add(self, position, frame_count)
+
+        return
+
+    def target(self):
+        """Return the (x, y) bottom center position after all queued movements.
+        """
+
+        if self.animator is not None and self.animator.target(self) is not None:
+
+            return self.animator.target(self)
+
+        return (self.rect.centerx, self.rect.bottom)
+
+    def animation(self, row, frame_count):
+        """Return a tuple of frame_count indices into EntityPlane.frames to animate a movement in the sprite sheet row given.
+
+           Columns from the second on are cycled, each being displayed for an
+           equal share of the frames. The last frame is the neutral image in
+           the first column. Results are cached.
+        """
+
+        key = (row, frame_count)
+
+        if key not in self.animation_cache:
+
+            # That is, if there is only one column, then use the default image
+            # all the time
+            #
+            column = 0
+            repeat_frames = frame_count
+
+            if self.columns > 1:
+
+                column = 1
+
+                repeat_frames = max(1, int(frame_count / self.columns))
+
+            fabula.LOGGER.debug("repeat_frames for {} == {}".format(self.name,
+                                                                    repeat_frames))
+
+            indices = []
+
+            repeat_count = 0
+
+            # Omit last step
+            #
+            for i in range(frame_count - 1):
+
+                indices.append(row * self.columns + column)
+
+                repeat_count = repeat_count + 1
+
+                if repeat_count == repeat_frames:
+
+                    column = column + 1
+
+                    if column >= self.columns:
+
+                        column = 1
+
+                    repeat_count = 0
+
+            # Append neutral image as final
+            #
+            indices.append(row * self.columns)
+
+            self.animation_cache[key] = tuple(indices)
+
+        return self.animation_cache[key]
+
+def slice_spritesheet(spritesheet):
+    """Slice a Fabula sprite sheet into a tuple of subsurfaces, row by row.
+
+       The sheet is assumed to have 4 rows of square frames, see the
+       EntityPlane docstring. Raises RuntimeError if the sheet can not be
+       sliced.
+    """
+
+    sprite_height = int(spritesheet.get_height() / 4)
+
+    fabula.LOGGER.debug("assuming sprite height: {} px".format(sprite_height))
+
+    if sprite_height < 1:
+
+        msg = "Error: could not create subsurface from spritesheet"
+
+        fabula.LOGGER.critical(msg)
+
+        raise RuntimeError(msg)
+
+    columns = max(1, int(spritesheet.get_width() / sprite_height))
+
+    frames = []
+
+    try:
+        for row in range(4):
+
+            for column in range(columns):
+
+                frames.append(spritesheet.subsurface(pygame.Rect((column * sprite_height,
+                                                                  row * sprite_height),
+                                                                 (sprite_height,
+                                                                  sprite_height))))
+
+    except ValueError:
+
+        msg = "Error: could not create subsurface from spritesheet"
+
+        fabula.LOGGER.critical(msg)
+
+        raise RuntimeError(msg)
+
+    return tuple(frames)
+
+class TileLayer(planes.Plane):
+    """Subclass of Plane which renders its tile Planes from cached chunks.
+
+       Tile Planes, whose names are coordinate tuple strings, remain subplanes
+       so clicks and drops are dispatched to them as usual. But they are
+       neither updated nor rendered individually. Instead they are baked into
+       chunk Surfaces of TileLayer.chunk_size x TileLayer.chunk_size tiles. A
+       chunk is baked again only when a tile in it is added, removed or given
+       a new image using TileLayer.set_image(). Only chunks in the visible
+       area of the screen are blitted. Other subplanes, like editor overlays,
+       are baked on top of the tiles.
+
+       Additional attributes:
+
+       TileLayer.spacing
+           The spacing between tiles in pixels.
+
+       TileLayer.chunk_size
+           The number of tiles per chunk along each axis.
+
+       TileLayer.chunks
+           A dict mapping chunk coordinate tuples to baked chunk Surfaces.
+
+       TileLayer.chunk_members
+           A dict mapping chunk coordinate tuples to dicts whose keys are the
+           names of the tile Planes overlapping that chunk, in order of adding.
+
+       TileLayer.dirty_chunks
+           A set of chunk coordinate tuples to be baked again.
+
+       TileLayer.blitted_chunks
+           A set of chunk coordinate tuples which are up to date on
+           TileLayer.rendersurface.
+
+       TileLayer.version
+           An object which is replaced whenever a tile Plane is added, removed
+           or changed, for cheap change detection.
+    """
+
+    def __init__(self, name, rect, spacing, chunk_size = 16):
+        """Initialise.
+        """
+
+        # Call base class
+        #
+        planes.Plane.__init__(self, name, rect)
+
+        self.spacing = spacing
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self.chunk_members = {}
+        self.dirty_chunks = set()
+        self.blitted_chunks = set()
+        self.version = object()
+
+        # Names, images and rects of non-tile subplanes as of the last bake
+        #
+        self.overlay_state = ()
+
+        return
+
+    def chunks_for(self, rect):
+        """Return a list of the coordinate tuples of all chunks the Rect given overlaps.
+        """
+
+        chunk_pixels = self.chunk_size * self.spacing
+
+        return [(chunk_x, chunk_y)
+                for chunk_x in range(rect.left // chunk_pixels, (rect.right - 1) // chunk_pixels + 1)
+                for chunk_y in range(rect.top // chunk_pixels, (rect.bottom - 1) // chunk_pixels + 1)]
+
+    def sub(self, plane, **kwargs):
+        """Call the base class and mark the chunk of the new tile Plane dirty.
+        """
+
+        planes.Plane.sub(self, plane, **kwargs)
+
+        if fabula.str_is_tuple(plane.name):
+
+            for chunk in self.chunks_for(plane.rect):
+
+                self.chunk_members.setdefault(chunk, {})[plane.name] = None
+
+                self.dirty_chunks.add(chunk)
+
+            self.version = object()
+
+        return
+
+    def remove(self, plane_identifier):
+        """Call the base class and mark the chunk of a removed tile Plane dirty.
+        """
+
+        name = plane_identifier
+
+        if isinstance(plane_identifier, planes.Plane):
+
+            name = plane_identifier.name
+
+        if name in self.subplanes and fabula.str_is_tuple(name):
+
+            for chunk in self.chunks_for(self.subplanes[name].rect):
+
+                self.chunk_members[chunk].pop(name, None)
+
+                self.dirty_chunks.add(chunk)
+
+            self.version = object()
+
+        planes.Plane.remove(self, plane_identifier)
+
+        return
+
+    def set_image(self, name, surface):
+        """Set the image of the tile Plane given by name and mark its chunk dirty.
+        """
+
+        plane = self.subplanes[name]
+
+        plane.image = surface
+
+        self.dirty_chunks.update(self.chunks_for(plane.rect))
+
+        self.version = object()
+
+        return
+
+    def visible_rect(self):
+        """Return a Rect of the area of this Plane that is visible on the screen.
+        """
+
+        left, top = self.rect.topleft
+
+        root = self
+
+        while root.parent is not None:
+
+            root = root.parent
+
+            left = left + root.rect.left
+            top = top + root.rect.top
+
+        # The root is the Display, which is not offset itself
+        #
+        left = left - root.rect.left
+        top = top - root.rect.top
+
+        return pygame.Rect((-left, -top), root.rect.size)
+
+    def bake_chunk(self, chunk, overlays):
+        """Auxiliary method to render the tiles and overlays of a chunk onto a new Surface.
+        """
+
+        chunk_pixels = self.chunk_size * self.spacing
+
+        chunk_rect = pygame.Rect((chunk[0] * chunk_pixels, chunk[1] * chunk_pixels),
+                                 (chunk_pixels, chunk_pixels))
+
+        surface = pygame.Surface(chunk_rect.size, flags = pygame.SRCALPHA)
+
+        surface.fill((0, 0, 0, 0))
+
+        for name in self.chunk_members.get(chunk, ()):
+
+            plane = self.subplanes[name]
+
+            surface.blit(plane.image, plane.rect.move(-chunk_rect.left, -chunk_rect.top))
+
+        for plane in overlays:
+
+            if plane.rect.colliderect(chunk_rect):
+
+                surface.blit(plane.image, plane.rect.move(-chunk_rect.left, -chunk_rect.top))
+
+        self.chunks[chunk] = surface
+
+        return
+
+    def update(self):
+        """Update non-tile subplanes only. Tile Planes are static.
+        """
+
+        for name in self.subplanes_list:
+
+            if not fabula.str_is_tuple(name):
+
+                self.subplanes[name].update()
+
+        return
+
+    def render(self, force = False):
+        """Bake dirty chunks and blit visible chunks that are not yet up to date onto TileLayer.rendersurface.
+           If force is True, all visible chunks are blitted again.
+           Return True if TileLayer.rendersurface has changed.
+        """
+
+        overlays = [self.subplanes[name] for name in self.subplanes_list
+                    if not fabula.str_is_tuple(name)]
+
+        overlay_state = tuple((plane.name, id(plane.image), tuple(plane.rect)) for plane in overlays)
+
+        if overlay_state != self.overlay_state:
+
+            # Overlays are rare, so simply bake everything again
+            #
+            self.dirty_chunks.update(self.chunk_members.keys())
+
+            self.overlay_state = overlay_state
+
+        if (getattr(self, "rendersurface", None) is None
+            or self.rendersurface.get_size() != self.rect.size):
+
+            self.rendersurface = pygame.Surface(self.rect.size, flags = pygame.SRCALPHA)
+
+            self.blitted_chunks = set()
+
+        if force:
+
+            self.blitted_chunks = set()
+
+        self.blitted_chunks.difference_update(self.dirty_chunks)
+
+        visible_rect = self.visible_rect()
+
+        chunk_pixels = self.chunk_size * self.spacing
+
+        changed = False
+
+        for chunk_x in range(max(0, visible_rect.left // chunk_pixels),
+                             max(0, visible_rect.right // chunk_pixels + 1)):
+
+            for chunk_y in range(max(0, visible_rect.top // chunk_pixels),
+                                 max(0, visible_rect.bottom // chunk_pixels + 1)):
+
+                chunk = (chunk_x, chunk_y)
+
+                if chunk in self.blitted_chunks:
+
+                    continue
+
+                if chunk in self.dirty_chunks or chunk not in self.chunks:
+
+                    self.bake_chunk(chunk, overlays)
+
+                    self.dirty_chunks.discard(chunk)
+
+                position = (chunk_x * chunk_pixels, chunk_y * chunk_pixels)
+
+                self.rendersurface.fill((0, 0, 0, 0),
+                                        pygame.Rect(position, (chunk_pixels, chunk_pixels)))
+
+                self.rendersurface.blit(self.chunks[chunk], position)
+
+                self.blitted_chunks.add(chunk)
+
+                changed = True
+
+        return changed
+
+class RoomPlane(planes.Plane):
+    """Subclass of Plane which only updates and renders subplanes that are visible on screen.
+
+       Subplanes are kept in a grid-based spatial index, keyed by their pixel
+       rect. Upon update() and render(), the index is queried for the area of
+       this Plane that is visible in its parent. Visible subplanes are updated
+       and rendered as usual. Invisible EntityPlanes only advance their
+       movement using EntityPlane.advance().
+
+       Additional attributes:
+
+       RoomPlane.cell_size
+           The edge length of a grid cell of the spatial index, in pixels.
+
+       RoomPlane.grid
+           A dict mapping cell coordinate tuples to sets of names of the
+           subplanes overlapping that cell.
+
+       RoomPlane.indexed_rects
+           A dict mapping subplane names to the Rect they were indexed with.
+
+       RoomPlane.version
+           A counter which is increased whenever a subplane is added or
+           removed.
+
+       RoomPlane.animator
+           A MovementAnimator which is stepped once per update(), or None.
+           Moving subplanes are indexed with the whole area they move across.
+    """
+
+    def __init__(self, name, rect, cell_size = 400, animator = None):
+        """Initialise.
+        """
+
+        # Call base class
+        #
+        planes.Plane.__init__(self, name, rect)
+
+        self.animator = animator
+
+        self.cell_size = cell_size
+        self.grid = {}
+        self.indexed_rects = {}
+        self.version = 0
+
+        return
+
+    def cells_for(self, rect):
+        """Return a list of the coordinate tuples of all grid cells the Rect given overlaps.
+        """
+
+        return [(cell_x, cell_y)
+                for cell_x in range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1)
+                for cell_y in range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1)]
+
+    def index(self, name):
+        """(Re-)index the subplane given by name in RoomPlane.grid.
+        """
+
+        self.unindex(name)
+
+        rect = pygame.Rect(self.subplanes[name].rect)
+
+        if self.animator is not None:
+
+            rect = self.animator.swept_rect(self.subplanes[name])
+
+        for cell in self.cells_for(rect):
+
+            self.grid.setdefault(cell, set()).add(name)
+
+        self.indexed_rects[name] = rect
+
+        return
+
+    def unindex(self, name):
+        """Remove the subplane given by name from RoomPlane.grid, if it is indexed.
+        """
+
+        if name in self.indexed_rects:
+
+            for cell in self.cells_for(self.indexed_rects.pop(name)):
 
-    tk = tkinter.Tk()
-    tk.withdraw()
+                self.grid[cell].discard(name)
 
-    image_types = ("Image Files",
-                   ".jpg .png .gif .bmp .pcx .tga .tif .lbm .pbm .xpm")
+        return
 
-    fullpath = tkinter.filedialog.askopenfilename(filetypes = [image_types],
-                                                  title = title)
-    tk.destroy()
+    def sub(self, plane, **kwargs):
+        """Call the base class and index the new subplane.
+        """
 
-    if fullpath:
+        planes.Plane.sub(self, plane, **kwargs)
 
-        filename = os.path.basename(fullpath)
+        self.index(plane.name)
 
-        try:
-            surface = pygame.image.load(fullpath)
+        self.version = self.version + 1
 
-        except pygame.error:
+        return
 
-            # This will return None
-            #
-            pass
+    def remove(self, plane_identifier):
+        """Remove the subplane from the index and call the base class.
+        """
 
-    return (surface, filename)
+        name = plane_identifier
 
-class EntityPlane(planes.Plane):
-    """Subclass of Plane with an extended update() method that handles movement.
+        if isinstance(plane_identifier, planes.Plane):
 
-       Additional attributes:
+            name = plane_identifier.name
 
-       EntityPlane.position_list
-           A list of movement steps as position tuples
+        self.unindex(name)
 
-       EntityPlane.spritesheet
-           If not None, a Pygame Surface that contains a sprite sheet. The sheet
-           is assumed to consist of 4 rows. The first column contains the
-           static view of the Entity in front, left, back and right view (from
-           the first row down). Rows are supposed to contain movement animation
-           frames: the first row a downward movement in front view, the second
-           row a movement to the left in left view etc. Frames are assumed to be
-           of equal width and height.
+        planes.Plane.remove(self, plane_identifier)
 
-       EntityPlane.subsurface_rect_list
-           A list of Pygame Rects to create subsurfaces of the sprite sheet.
-    """
+        self.version = self.version + 1
 
-    def __init__(self, name, rect, draggable = False,
-                                   grab = False,
-                                   left_click_callback = None,
-                                   right_click_callback = None,
-                                   dropped_upon_callback = None,
-                                   spritesheet = None):
-        """Initialise.
+        return
+
+    def visible_names(self):
+        """Return a set of the names of all subplanes overlapping the area visible in the parent Plane, or None if there is no parent.
         """
 
-        # Call base class
-        #
-        planes.Plane.__init__(self,
-                              name,
-                              rect,
-                              draggable = draggable,
-                              grab = grab,
-                              highlight = True,
-                              left_click_callback = left_click_callback,
-                              right_click_callback = right_click_callback,
-                              dropped_upon_callback = dropped_upon_callback)
+        if self.parent is None:
 
-        self.position_list = []
-        self.spritesheet = spritesheet
-        self.subsurface_rect_list = []
+            return None
 
-        return
+        visible_rect = pygame.Rect((- self.rect.left, - self.rect.top),
+                                   self.parent.rect.size)
+
+        names = set()
+
+        for cell in self.cells_for(visible_rect):
+
+            names.update(self.grid.get(cell, ()))
+
+        return names
 
     def update(self):
-        """If EntityPlane.target has not yet been reached, move to the positions given in EntityPlane.position_list.
+        """Move EntityPlanes, update visible subplanes, advance invisible EntityPlanes, and re-index subplanes that moved.
         """
 
-        # Call base class to update() all subplanes
-        #
-        planes.Plane.update(self)
+        visible_names = self.visible_names()
 
-        # Change position
-        #
-        if self.position_list:
-            new_position = self.position_list.pop(0)
-            self.rect.centerx = new_position[0]
-            self.rect.bottom = new_position[1]
+        if self.animator is not None:
 
-        # Change image
-        #
-        if self.subsurface_rect_list and self.spritesheet is not None:
+            # Planes that start moving must be indexed with the area they
+            # move across, and planes that arrived must drop it.
+            #
+            moved_planes = list(self.animator.added)
 
-            self.image = self.spritesheet.subsurface(self.subsurface_rect_list.pop(0))
+            self.animator.added.clear()
+
+            moved_planes.extend(self.animator.step(visible_names))
+
+            for plane in moved_planes:
+
+                if self.subplanes.get(plane.name) is plane:
+
+                    self.index(plane.name)
+
+        for name in list(self.subplanes_list):
+
+            # A previous update may have removed the Plane
+            #
+            if name not in self.subplanes:
+
+                continue
+
+            plane = self.subplanes[name]
+
+            if visible_names is None or name in visible_names:
+
+                plane.update()
+
+            elif isinstance(plane, EntityPlane):
+
+                plane.advance()
+
+            if (name in self.subplanes
+                and (name not in self.indexed_rects
+                     or not self.indexed_rects[name].contains(plane.rect))):
+
+                self.index(name)
 
         return
 
+    def render(self, *args, **kwargs):
+        """Call the base class, hiding subplanes which are not visible.
+        """
+
+        visible_names = self.visible_names()
+
+        if visible_names is None:
+
+            return planes.Plane.render(self, *args, **kwargs)
+
+        subplanes_list = self.subplanes_list
+
+        self.subplanes_list = [name for name in subplanes_list if name in visible_names]
+
+        try:
+            return planes.Plane.render(self, *args, **kwargs)
+
+        finally:
+            self.subplanes_list = subplanes_list
+
 class PygameEntity(fabula.Entity):
     """Pygame-aware subclass of Entity to be used in PygameUserInterface.
 
@@ -201,21 +1053,12 @@ class PygameEntity(fabula.Entity):
         """Instruct the EntityPlane with the movement.
         """
 
+        # Take the last queued position as current. Reference point is the
+        # bottom center of the image, which is positioned at the bottom
+        # center of the tile.
         # TODO: blindly assuming "image/png"
         #
-        if self.assets["image/png"].data.position_list:
-
-            # Take the last queued position as current
-            #
-            current_x = self.assets["image/png"].data.position_list[-1][0]
-            current_y = self.assets["image/png"].data.position_list[-1][1]
-
-        else:
-            # Reference point is the bottom center of the image, which is
-            # positioned at the bottom center of the tile
-            #
-            current_x = self.assets["image/png"].data.rect.centerx
-            current_y = self.assets["image/png"].data.rect.bottom
+        current_x, current_y = self.assets["image/png"].data.target()
 
         future_x = event.location[0] * self.spacing + int(self.spacing / 2)
         future_y = event.location[1] * self.spacing + self.spacing
@@ -223,25 +1066,7 @@ class PygameEntity(fabula.Entity):
         dx_per_frame = (future_x - current_x) / self.action_frames
         dy_per_frame = (future_y - current_y) / self.action_frames
 
-        position_list = []
-
-        # Re-using current_x, current_y retrieved above.
-        # But omit last step.
-        #
-        for i in range(self.action_frames - 1):
-
-            current_x = current_x + dx_per_frame
-            current_y = current_y + dy_per_frame
-
-            # Round now to distribute the error
-            #
-            position_list.append((int(current_x), int(current_y)))
-
-        # Append final position to make sure it's being hit.
-        #
-        position_list.append((future_x, future_y))
-
-        self.assets["image/png"].data.position_list.extend(position_list)
+        self.assets["image/png"].data.move_to((future_x, future_y), self.action_frames)
 
         # Animation
         #
@@ -272,63 +1097,9 @@ class PygameEntity(fabula.Entity):
                 #
                 row = 3
 
-            subsurface_rect_list = []
-
-            # TODO: most of these need only be calculated once. This should be done once the asset is fetched. Given the asset doesn't change. Nah.
-
-            width = self.assets["image/png"].data.spritesheet.get_width()
-
-            offset = self.assets["image/png"].data.rect.width
-
-            repeat_frames = int(self.action_frames / int(width / offset))
-
-            if repeat_frames < 1:
-
-                repeat_frames = 1
-
-            # That is, if there is only one column, then use no offset
-            #
-            if offset == width:
-
-                offset = 0
-
-                # Use default image all the time
-                #
-                repeat_frames = self.action_frames
-
-            fabula.LOGGER.debug("repeat_frames for {} == {}".format(self.identifier,
-                                                                    repeat_frames))
-
-            repeat_count = 0
-
-            sprite_dimensions = self.assets["image/png"].data.rect.size
-
-            # Omit last step
-            # TODO: copied from above, can this be moved into one single iteration?
-            #
-            for i in range(self.action_frames - 1):
-
-                subsurface_rect_list.append(pygame.Rect((offset, row * sprite_dimensions[1]),
-                                                        sprite_dimensions))
-
-                repeat_count = repeat_count + 1
-
-                if repeat_count == repeat_frames:
-
-                    offset = offset + sprite_dimensions[0]
-
-                    if offset > width - sprite_dimensions[0]:
+            plane = self.assets["image/png"].data
 
-                        offset = self.assets["image/png"].data.rect.width
-
-                    repeat_count = 0
-
-            # Append neutral image as final
-            #
-            subsurface_rect_list.append(pygame.Rect((0, row * sprite_dimensions[1]),
-                                                    sprite_dimensions))
-
-            self.assets["image/png"].data.subsurface_rect_list.extend(subsurface_rect_list)
+            plane.frame_list.extend(plane.animation(row, self.action_frames))
 
         return
 
@@ -399,9 +1170,6 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
        Additional attributes:
 
-       PygameUserInterface.clock
-           An instance of pygame.time.Clock
-
        PygameUserInterface.big_font
        PygameUserInterface.small_font
            Pygame.font.Font instances
@@ -442,7 +1210,12 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
        PygameUserInterface.stats
            A dict mapping names of different metrics to their current vaule.
-           Updated in PygameUserInterface.update_frame_timer().
+           Updated in PygameUserInterface.update_frame_timer() about once per
+           STATS_INTERVAL seconds.
+
+       PygameUserInterface.stats_timestamp
+           FrameScheduler.last_tick of the last update of
+           PygameUserInterface.stats, or None to update them in the next frame.
 
        PygameUserInterface.screen_dump_folder
            A string with the name of a local folder to save screen dumps to.
@@ -457,6 +1230,43 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
            Boolen flag, indicating whether to scroll the screen when the mouse
            reaches a screen border.
 
+       PygameUserInterface.asset_loader
+           A concurrent.futures.ThreadPoolExecutor which fetches and decodes
+           images in the background while a room is being built.
+
+       PygameUserInterface.pending_surfaces
+           A dict mapping asset URIs to Futures of unconverted Surfaces
+           submitted to PygameUserInterface.asset_loader.
+
+       PygameUserInterface.placeholder_surface
+           A gray Surface of tile size, displayed for Tiles whose image is
+           still being loaded.
+
+       PygameUserInterface.placeholder_tiles
+           A list of tuples (plane_name, Tile) of tile Planes currently
+           showing PygameUserInterface.placeholder_surface.
+
+       PygameUserInterface.frame_state
+           A dict mapping each Plane on screen to a tuple (image, rect, text)
+           as of the last frame, rect being in screen coordinates and text
+           being the text of planes.gui widgets, else None. Used by
+           display_single_frame() to find the regions that need to be updated.
+
+       PygameUserInterface.full_frame
+           Boolean flag. If True, the next frame will render and flip the whole
+           screen instead of updating dirty rectangles only.
+
+       PygameUserInterface.depth_order
+           A fabula.plugins.ui.DepthOrder instance maintaining the rendering
+           order of the subplanes of PygameUserInterface.window.room.
+
+       PygameUserInterface.depth_order_version
+           A tuple (room Plane, RoomPlane.version) as of the last rebuild of
+           the depth order, to detect added or removed Planes.
+
+       PygameUserInterface.animator
+           The MovementAnimator moving all EntityPlanes in the room.
+
        PygameUserInterface utilises the planes module for 2D bitmap rendering.
        The planes hierarchy is organised as follows:
 
@@ -484,11 +1294,14 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
            this can be changed by editing   the file fabula.conf.
 
        PygameUserInterface.window.room
-           planes Plane for the room. Initially it will have a size of 0x0 px.
+           RoomPlane for the room, which only updates and renders visible
+           subplanes. Initially it will have a size of 0x0 px.
            The final Plane is created by process_RoomCompleteEvent().
 
        PygameUserInterface.window.room.tiles
-           planes Plane which has the Tile Planes as subplanes.
+           A TileLayer which has the Tile Planes as subplanes and renders them
+           from cached chunks. Use TileLayer.set_image() to change the image of
+           a Tile Plane.
 
        PygameUserInterface.window.inventory
            planes Plane for the inventory. By default this is 800x100 px with
@@ -516,6 +1329,11 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                                                  framerate,
                                                  host)
 
+        # Let the Client build rooms on its own. process_RoomCompleteEvent()
+        # creates the Planes from the finished room.
+        #
+        self.setup_events = False
+
         fabula.LOGGER.debug("called")
 
         fabula.LOGGER.debug("initialising pygame")
@@ -525,11 +1343,16 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
         # Statistics
         #
         self.stats = {"framerate" : self.framerate,
-                      "fps" : None}
+                      "fps" : None,
+                      "p50" : None,
+                      "p95" : None,
+                      "p99" : None,
+                      "frame_times" : None}
 
-        # Initialise the frame timing clock.
+        # FrameScheduler.last_tick of the last update of self.stats, or None
+        # to update them in the next frame
         #
-        self.clock = pygame.time.Clock()
+        self.stats_timestamp = None
 
         # Hardwired screen size.
         #
@@ -618,21 +1441,7 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                      "attempt_look_at",
                      "cancel"):
 
-            # Partly copied from process_SpawnEvent
-            #
-            try:
-                file = self.assets.fetch(name + ".png")
-
-            except:
-                self.display_asset_exception(name + ".png")
-
-            surface = pygame.image.load(file)
-
-            file.close()
-
-            # Convert to internal format suitable for blitting
-            #
-            surface = surface.convert_alpha()
+            surface = self.load_surface(name + ".png")
 
             # Create Rect - taken from above
             #
@@ -658,13 +1467,17 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
         # This Plane is only there to collect subplanes and hence is initialised
         # with 0x0 pixels. The final Plane will be created by process_RoomCompleteEvent().
         #
-        self.window.sub(planes.Plane("room",
-                                     pygame.Rect((0, 0), (0, 0))))
+        self.animator = MovementAnimator()
+
+        self.window.sub(RoomPlane("room",
+                                  pygame.Rect((0, 0), (0, 0)),
+                                  animator = self.animator))
 
         # Create a subplane as a sort-of buffer for Tiles.
         #
-        self.window.room.sub(planes.Plane("tiles",
-                                          pygame.Rect((0, 0), (0, 0))))
+        self.window.room.sub(TileLayer("tiles",
+                                       pygame.Rect((0, 0), (0, 0)),
+                                       self.spacing))
 
         # Initialise on screen display.
         #
@@ -678,6 +1491,30 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         self.mousescroll = mousescroll
 
+        # Background loading of images while a room is being built.
+        # Workers only fetch and decode. Conversion to the display format
+        # must happen in the main thread.
+        #
+        self.asset_loader = concurrent.futures.ThreadPoolExecutor(max_workers = 4)
+
+        self.pending_surfaces = {}
+
+        self.placeholder_surface = pygame.Surface((self.spacing, self.spacing))
+
+        self.placeholder_surface.fill((64, 64, 64))
+
+        self.placeholder_tiles = []
+
+        # Dirty rectangle tracking
+        #
+        self.frame_state = {}
+
+        self.full_frame = True
+
+        self.depth_order = fabula.plugins.ui.DepthOrder()
+
+        self.depth_order_version = None
+
         fabula.LOGGER.debug("complete")
 
         return
@@ -828,89 +1665,195 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                 (container_dict["connector"], 4011))
 
     def update_frame_timer(self):
-        """Use pygame.time.Clock.tick() to slow down to given framerate.
-           Also, update PygameUserInterface.stats.
+        """Wait for the next frame using PygameUserInterface.frame_scheduler.
+           Pass the number of simulation steps due to the MovementAnimator, and
+           update PygameUserInterface.stats about once per STATS_INTERVAL
+           seconds.
+        """
+
+        self.frame_scheduler.tick()
+
+        self.animator.steps = self.frame_scheduler.steps
+
+        self.animator.alpha = self.frame_scheduler.alpha
+
+        # The statistics cover hundreds of frames, so there is no point in
+        # computing them for every frame.
+        #
+        if (self.stats_timestamp is not None
+            and self.frame_scheduler.last_tick - self.stats_timestamp < STATS_INTERVAL):
+
+            return
+
+        self.stats_timestamp = self.frame_scheduler.last_tick
+
+        fps = self.frame_scheduler.fps()
+
+        if fps is not None:
+
+            self.stats["fps"] = int(fps)
+
+            p50, p95, p99 = self.frame_scheduler.percentiles(50, 95, 99)
+
+            self.stats["p50"] = p50
+            self.stats["p95"] = p95
+            self.stats["p99"] = p99
+
+            self.stats["frame_times"] = "{:.1f} / {:.1f} / {:.1f} ms".format(p50, p95, p99)
+
+        return
+
+    def display_single_frame(self):
+        """Update and render all planes.
+           This method also handles scrolling.
         """
 
-        # TODO: both clocks leave spikes of > 200 FPS through. Check if a custom implementation using time.time() (Unix) / time.clock() (MS Win) and time.sleep() is more reliable.
+        # TODO: Catch some statistics. See also update_frame_timer().
+
+        # To have an effect, this must be the first thing to be called in the
+        # loop.
+        #
+        self.update_frame_timer()
+
+        if not self.freeze:
+
+            # Handle scrolling
+            #
+            if self.scroll > 0:
+
+                self.scroll = self.scroll - self.scroll_amount
+
+                if self.scroll < 0:
+
+                    self.scroll = 0
+
+                else:
+
+                    self.window.room.rect.move_ip(self.scroll_amount, 0)
+
+                    self._snap_room_to_display()
+
+            elif self.scroll < 0:
+
+                self.scroll = self.scroll + self.scroll_amount
+
+                if self.scroll > 0:
+
+                    self.scroll = 0
+
+                else:
+
+                    self.window.room.rect.move_ip( - self.scroll_amount, 0)
+
+                    self._snap_room_to_display()
+
+            self.window.update()
+
+            dirty_rects = self.find_dirty_rects()
+
+            if self.full_frame:
+
+                self.window.render()
+
+                pygame.display.flip()
+
+                self.full_frame = False
+
+            elif dirty_rects:
+
+                self.window.render()
+
+                pygame.display.update(dirty_rects)
+
+            # Screen dump recording
+            #
+            if self.screen_dump_folder:
+
+                self.surfacecatcher.catch(self.window.display)
+
+        # Pump the Pygame Event Queue
         #
-        self.clock.tick(self.framerate)
+        pygame.event.pump()
+
+        return
+
+    def find_dirty_rects(self):
+        """Compare all Planes on screen to PygameUserInterface.frame_state, and return a list of screen Rects that have changed since the last frame.
+
+           Planes that were added, removed, moved, got a new image or, for
+           planes.gui widgets like Label, a new text are dirty, at their old
+           and new positions. If the room Plane moved, i.e. the screen
+           scrolled, PygameUserInterface.full_frame is set.
+
+           Note that changes to an image in place are not detected. Set
+           PygameUserInterface.full_frame after doing that.
+        """
+
+        state = {}
+
+        self._collect_frame_state(self.window, (0, 0), state)
 
-        self.stats["fps"] = int(self.clock.get_fps())
+        dirty_rects = []
 
-        # Measue re-entry time
-        #
-        #interval = time.time() - self._timestamp
-        #
-        #if interval != 0:
-        #
-        #    fabula.LOGGER.critical("interval {:.2}, {} FPS".format(interval,
-        #                                                        int(1 / interval)))
-        #
-        #self._timestamp = time.time()
+        for plane, (image, rect, text) in state.items():
 
-        return
+            if plane not in self.frame_state:
 
-    def display_single_frame(self):
-        """Update and render all planes.
-           This method also handles scrolling.
-        """
+                dirty_rects.append(rect)
 
-        # TODO: Catch some statistics. See also update_frame_timer().
+            else:
+                old_image, old_rect, old_text = self.frame_state[plane]
 
-        # To have an effect, this must be the first thing to be called in the
-        # loop.
-        #
-        self.update_frame_timer()
+                # Widgets redraw their text into the same image
+                #
+                if old_image is not image or old_rect != rect or old_text != text:
 
-        if not self.freeze:
+                    if plane is self.window.room:
 
-            # Handle scrolling
-            #
-            if self.scroll > 0:
+                        self.full_frame = True
 
-                self.scroll = self.scroll - self.scroll_amount
+                    dirty_rects.append(old_rect)
+                    dirty_rects.append(rect)
 
-                if self.scroll < 0:
+        for plane, (image, rect, text) in self.frame_state.items():
 
-                    self.scroll = 0
+            if plane not in state:
 
-                else:
+                dirty_rects.append(rect)
 
-                    self.window.room.rect.move_ip(self.scroll_amount, 0)
+        self.frame_state = state
 
-                    self._snap_room_to_display()
+        return dirty_rects
 
-            elif self.scroll < 0:
+    def _collect_frame_state(self, plane, offset, state):
+        """Auxiliary method to recursively record (image, screen rect, text) of the subplanes of plane in the dict state.
+           Tile Planes are represented by their TileLayer.
+        """
 
-                self.scroll = self.scroll + self.scroll_amount
+        for name in plane.subplanes_list:
 
-                if self.scroll > 0:
+            subplane = plane.subplanes[name]
 
-                    self.scroll = 0
+            rect = subplane.rect.move(offset)
 
-                else:
+            if isinstance(subplane, TileLayer):
 
-                    self.window.room.rect.move_ip( - self.scroll_amount, 0)
+                state[subplane] = (subplane.version, rect, None)
 
-                    self._snap_room_to_display()
+                for tile_layer_name in subplane.subplanes_list:
 
-            self.window.update()
-            self.window.render()
+                    if not fabula.str_is_tuple(tile_layer_name):
 
-            # TODO: replace with update(dirty_rect_list)
-            #
-            pygame.display.flip()
+                        overlay = subplane.subplanes[tile_layer_name]
 
-            # Screen dump recording
-            #
-            if self.screen_dump_folder:
+                        state[overlay] = (overlay.image,
+                                          overlay.rect.move(rect.topleft),
+                                          getattr(overlay, "text", None))
 
-                self.surfacecatcher.catch(self.window.display)
+            else:
+                state[subplane] = (subplane.image, rect, getattr(subplane, "text", None))
 
-        # Pump the Pygame Event Queue
-        #
-        pygame.event.pump()
+                self._collect_frame_state(subplane, rect.topleft, state)
 
         return
 
@@ -948,6 +1891,13 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
         #
         events = pygame.event.get()
 
+        # Mouse highlights, drags and text input change the screen in ways
+        # that are not tracked. Render the whole screen on the next frame.
+        #
+        if events:
+
+            self.full_frame = True
+
         for event in events:
 
             if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN
@@ -978,6 +1928,7 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
                     self.osd.remove("Framerate: ")
                     self.osd.remove("FPS: ")
+                    self.osd.remove("Frame time p50 / p95 / p99: ")
 
                     # Tie recording display to FPS display
                     #
@@ -986,8 +1937,13 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                         self.osd.remove("Screen recorder: ")
 
                 else:
+                    # Show current values right away
+                    #
+                    self.stats_timestamp = None
+
                     self.osd.display("Framerate: ", self.stats, "framerate")
                     self.osd.display("FPS: ", self.stats, "fps")
+                    self.osd.display("Frame time p50 / p95 / p99: ", self.stats, "frame_times")
 
                     if self.screen_dump_folder:
 
@@ -1117,6 +2073,10 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
             self.window.room.tiles.remove(plane_name)
 
+        self.placeholder_tiles = []
+
+        self.animator.clear()
+
         # No more rendering until RoomComplete
         #
         fabula.LOGGER.info("freezing")
@@ -1126,10 +2086,18 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
         return
 
     def process_RoomCompleteEvent(self, event):
-        """Recreate room and tile Planes at the correct size, update and render everything and fade in the room.
+        """Create the Planes of all Tiles and Entities in the room, recreate room and tile Planes at the correct size, update and render everything and fade in the room.
            Add the inventory Plane to window if it is not yet there.
         """
 
+        if not self.setup_events:
+
+            self._build_room_planes()
+
+        # All images must be present before the room is shown.
+        #
+        self.complete_pending_surfaces()
+
         # Find out the size of the room. Tiles start at (0, 0) in the upper
         # left, so search for the rightmost and lowermost tiles.
         #
@@ -1148,14 +2116,17 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         # Create new 'room' and 'tiles' Planes based on the max size
         #
-        room_plane = planes.Plane("room",
-                                  pygame.Rect((0, 0),
-                                              ((max_right + 1) * self.spacing,
-                                               (max_bottom + 1) * self.spacing)))
+        room_plane = RoomPlane("room",
+                               pygame.Rect((0, 0),
+                                           ((max_right + 1) * self.spacing,
+                                            (max_bottom + 1) * self.spacing)),
+                               cell_size = 4 * self.spacing,
+                               animator = self.animator)
 
-        room_plane.sub(planes.Plane("tiles",
-                                    pygame.Rect((0, 0),
-                                                room_plane.rect.size)))
+        room_plane.sub(TileLayer("tiles",
+                                 pygame.Rect((0, 0),
+                                             room_plane.rect.size),
+                                 self.spacing))
 
         # Transfer all Tile Planes to the new 'tiles' Plane
         #
@@ -1265,6 +2236,8 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
         self.window.render(force = True)
         pygame.display.flip()
 
+        self.full_frame = True
+
         self.update_frame_timer()
 
         # Pump the Pygame Event Queue
@@ -1273,6 +2246,41 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         return
 
+    def _build_room_planes(self):
+        """Auxiliary method. Create the Planes of all Tiles and Entities in self.host.room, which the Client has built without passing the Events.
+           Entities are added using process_SpawnEvent(), so subclasses see
+           them as usual.
+        """
+
+        room = self.host.room
+
+        fabula.LOGGER.info("creating Planes for {} tiles and {} entities".format(len(room.floor_plan),
+                                                                                 len(room.entity_dict)))
+
+        # Start loading all images before waiting for the first one
+        #
+        for tile in room.tile_list:
+
+            self.preload_surface(tile.assets)
+
+        for entity in room.entity_dict.values():
+
+            self.preload_surface(entity.assets)
+
+        for location, floor_plan_element in room.floor_plan.items():
+
+            self._set_tile_plane((location[0], location[1], room.identifier),
+                                 floor_plan_element.tile)
+
+        for identifier, entity in room.entity_dict.items():
+
+            location = room.entity_locations[identifier]
+
+            self.process_SpawnEvent(fabula.SpawnEvent(entity,
+                                                      (location[0], location[1], room.identifier)))
+
+        return
+
     def process_CanSpeakEvent(self, event):
         """Have the user select or input text and return a SaysEvent to the host.
         """
@@ -1357,25 +2365,7 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
             # Assets are entirely up to the UserInterface, so we fetch the asset
             # here
             #
-            try:
-                # Get a file-like object from asset manager
-                #
-                file = self.assets.fetch(event.entity.assets["image/png"].uri)
-
-            except:
-                self.display_asset_exception(event.entity.assets["image/png"].uri)
-
-            self.display_loading_progress(event.entity.assets["image/png"].uri)
-
-            # Replace with Surface from image file
-            #
-            surface = pygame.image.load(file)
-
-            file.close()
-
-            # Convert to internal format suitable for blitting
-            #
-            surface = surface.convert_alpha()
+            surface = self.load_surface(event.entity.assets["image/png"].uri)
 
             # Create Rect - taken from above
             #
@@ -1385,6 +2375,8 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
             #
             spritesheet = None
 
+            frames = ()
+
             if "fabulasheet" in event.entity.assets["image/png"].uri:
 
                 msg = "sprite sheet detected for Entity '{}', asset '{}'"
@@ -1396,37 +2388,16 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                 #
                 spritesheet = surface
 
-                # Spritesheet: Sheets are supposed to have 4 rows. See
-                # EntityPlane docstrings.
-                #
-                # Computing dimensions
-                #
-                sprite_height = int(spritesheet.get_height() / 4)
-
-                fabula.LOGGER.debug("assuming sprite height: {} px".format(sprite_height))
+                frames = self.load_sprite_frames(event.entity.assets["image/png"].uri,
+                                                 spritesheet)
 
-                # Spritesheet: sub-images are assumed to be squares. See
-                # EntityPlane docstrings.
+                # Replace surface variable with the neutral front view
                 #
-                # Replace surface variable with a subsurface
-                #
-                try:
-                    surface = spritesheet.subsurface(pygame.Rect((0, 0),
-                                                                 (sprite_height,
-                                                                  sprite_height)))
-
-                except ValueError:
-
-                    msg = "Error: could not create subsurface from spritesheet"
-
-                    fabula.LOGGER.critical(msg)
-
-                    raise RuntimeError(msg)
+                surface = frames[0]
 
                 # Fix rect accordingly
                 #
-                rect.width = sprite_height
-                rect.height = sprite_height
+                rect.size = surface.get_size()
 
             # Place at the correct location
             #
@@ -1439,7 +2410,9 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
                                 rect,
                                 right_click_callback = self.entity_right_click_callback,
                                 dropped_upon_callback = self.entity_dropped_callback,
-                                spritesheet = spritesheet)
+                                spritesheet = spritesheet,
+                                frames = frames,
+                                animator = self.animator)
 
             plane.image = surface
 
@@ -1535,73 +2508,61 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         fabula.LOGGER.debug("called")
 
-        tile_from_list = None
-
-        # The Client should have added the Tile to self.host.room.tile_list
+        # The Client should have registered the Tile in the room. Tiles may
+        # compare equal, but they may not refer to the same instance, so we
+        # use the registered one.
         #
-        for tile in self.host.room.tile_list:
-
-            # This should succeed only once
-            #
-            if tile == event.tile:
-
-                # Tiles may compare equal, but they may not refer to the same
-                # instance, so we use tile from tile_list.
-                #
-                fabula.LOGGER.debug("found event.tile in self.host.room.tile_list")
-                tile_from_list = tile
+        tile_from_list = self.host.room.tile_registry.get(event.tile)
 
         if tile_from_list is None:
 
             fabula.LOGGER.error("could not find tile {} in tile_list of room '{}'".format(event.tile, self.host.room.identifier))
             raise RuntimeError("could not find tile {} in tile_list of room '{}'".format(event.tile, self.host.room.identifier))
 
+        self._set_tile_plane(event.location, tile_from_list)
+
+        return
+
+    def _set_tile_plane(self, location, tile):
+        """Auxiliary method. Fetch the image of the registered Tile given if needed, and create or update the tile Plane at the (x, y, room_identifier) location given.
+        """
+
         # TODO: blindly assuming "image/png"
         #
-        if ("image/png" in tile_from_list.assets.keys()
-            and tile_from_list.assets["image/png"].data is not None):
+        if ("image/png" in tile.assets.keys()
+            and tile.assets["image/png"].data is not None):
 
-            fabula.LOGGER.debug("tile already has an asset: {}".format(tile_from_list))
+            fabula.LOGGER.debug("tile already has an asset: {}".format(tile))
 
         else:
             # Assets are entirely up to the UserInterface, so we fetch
             # the asset here
             #
-            fabula.LOGGER.debug("no asset for {}, attempting to fetch".format(tile_from_list))
-
-            try:
-                # Get a file-like object from asset manager
-                #
-                file = self.assets.fetch(tile_from_list.assets["image/png"].uri)
-
-            except:
-                self.display_asset_exception(tile_from_list.assets["image/png"].uri)
-
-            self.display_loading_progress(tile_from_list.assets["image/png"].uri)
+            fabula.LOGGER.debug("no asset for {}, attempting to fetch".format(tile))
 
-            fabula.LOGGER.debug("loading Surface from {}".format(file))
-
-            surface = pygame.image.load(file)
+            # While the room is being built, do not wait for images that
+            # are still loading in the background.
+            #
+            surface = self.load_surface(tile.assets["image/png"].uri,
+                                        wait = not self.freeze)
 
-            file.close()
+            if surface is None:
 
-            # Convert to internal format suitable for blitting
-            #
-            surface = surface.convert_alpha()
+                surface = self.placeholder_surface
 
-            tile_from_list.assets["image/png"].data = surface
+            tile.assets["image/png"].data = surface
 
-        # Now tile_from_list.assets["image/png"].data is present
+        # Now tile.assets["image/png"].data is present
 
         # Do we already have a tile there?
         # Tiles are planes subplanes of self.window.room, indexed by their
         # location as string representation.
         #
-        if str(event.location) not in self.window.room.tiles.subplanes:
+        if str(location) not in self.window.room.tiles.subplanes:
 
-            tile_plane = planes.Plane(str(event.location),
-                                      pygame.Rect((event.location[0] * self.spacing,
-                                                   event.location[1] * self.spacing),
+            tile_plane = planes.Plane(str(location),
+                                      pygame.Rect((location[0] * self.spacing,
+                                                   location[1] * self.spacing),
                                                   (100, 100)),
                                       left_click_callback = self.tile_clicked_callback,
                                       dropped_upon_callback = self.tile_drop_callback)
@@ -1610,10 +2571,14 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         # Update image regardless whether the tile existed or not
         #
-        fabula.LOGGER.debug("changing image for tile at {0} to {1}".format(str(event.location),
-                                                                           tile_from_list.assets["image/png"].data))
+        fabula.LOGGER.debug("changing image for tile at {0} to {1}".format(str(location),
+                                                                           tile.assets["image/png"].data))
+
+        self.window.room.tiles.set_image(str(location), tile.assets["image/png"].data)
 
-        self.window.room.tiles.subplanes[str(event.location)].image = tile_from_list.assets["image/png"].data
+        if tile.assets["image/png"].data is self.placeholder_surface:
+
+            self.placeholder_tiles.append((str(location), tile))
 
         return
 
@@ -1686,6 +2651,10 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
             self.window.room.rendersurface.fill((250, 250, 250))
             self.window.room.last_rect = None
 
+            # find_dirty_rects() does not see the fill in place
+            #
+            self.full_frame = True
+
             while frames:
                 self.display_single_frame()
                 frames = frames - 1
@@ -1694,6 +2663,8 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
             #
             self.window.room.subplanes[event.identifier].last_rect = None
 
+            self.full_frame = True
+
             self.display_single_frame()
 
         return
@@ -1714,7 +2685,7 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         # Care for overlapping
         #
-        self.reorder_room_planes()
+        self.reorder_room_planes(event.identifier)
 
         # And if it is the player...
         #
@@ -1933,66 +2904,34 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         return
 
-    def reorder_room_planes(self):
+    def reorder_room_planes(self, identifier = None):
         """Re-order subplanes of self.window.room from back to front by y-coordinate.
-        """
-
-        # *sigh* We dis- and reassemble the whole list.
-        # Partly moved here from process_RoomCompleteEvent, which now calls
-        # this method.
-        #
-        fabula.LOGGER.debug("rearranging subplanes of room")
 
-        entities = []
-        captions = []
-        other = []
+           If identifier is given and no Planes have been added to or removed
+           from the room since the last call, only the Plane of that Entity
+           and its caption are moved. Otherwise the whole order is rebuilt.
+        """
 
         # NOTE: there might be a difference in what self.host.room.entity_dict
         # and self.window.room.subplanes think is in the current room, e.g.
         # when we are in the middle of a transition, as self.host.room is
         # managed in the Engine, and self.window.room here.
         #
-        for name in self.window.room.subplanes_list:
-
-            if name in self.host.room.entity_dict.keys():
-
-                entities.append(name)
-
-            elif name.endswith("_caption"):
-
-                captions.append(name)
-
-            elif name == "tiles":
-
-                # Drop the Tiles Plane for now
-                #
-                pass
-
-            else:
-                other.append(name)
-
-        # Entity planes should be rendered from top to bottom, so sort by y
-        # coordinate.
-        #
-        entities.sort(key = lambda name: self.host.room.entity_locations[name][1])
-
-        # Finally, insert captions just after the according Entity Plane.
-        #
-        for name in captions:
+        if (identifier is not None
+            and self.depth_order_version == (self.window.room, self.window.room.version)
+            and identifier in self.host.room.entity_locations
+            and self.depth_order.move(self.window.room.subplanes_list,
+                                      identifier,
+                                      self.host.room.entity_locations[identifier][1])):
 
-            if name.split("_caption")[0] in entities:
-
-                entities.insert(entities.index(name.split("_caption")[0]) + 1, name)
-
-            else:
+            return
 
-                msg = "Entity '{}' not found in Room, not inserting caption plane '{}'"
+        fabula.LOGGER.debug("rearranging subplanes of room")
 
-                fabula.LOGGER.warning(msg.format(name.split("_caption")[0], name))
+        self.window.room.subplanes_list = self.depth_order.rebuild(self.window.room.subplanes_list,
+                                                                   self.host.room.entity_locations)
 
-        # Observe the Tiles Plane
-        #
-        self.window.room.subplanes_list = ["tiles"] + entities + other
+        self.depth_order_version = (self.window.room, self.window.room.version)
 
         return
 
@@ -2279,6 +3218,193 @@ class PygameUserInterface(fabula.plugins.ui.UserInterface):
 
         return
 
+    def process_message(self, message):
+        """Start loading the images of new Tiles and Entities in the background, then call the base class.
+        """
+
+        for event in message.event_list:
+
+            # TODO: blindly assuming "image/png"
+            #
+            if isinstance(event, fabula.ChangeMapElementEvent):
+
+                self.preload_surface(event.tile.assets)
+
+            elif isinstance(event, fabula.SpawnEvent):
+
+                self.preload_surface(event.entity.assets)
+
+        return fabula.plugins.ui.UserInterface.process_message(self, message)
+
+    def preload_surface(self, assets):
+        """Auxiliary method to submit the "image/png" asset from the assets dict given to the background loader.
+        """
+
+        if "image/png" not in assets.keys() or assets["image/png"].data is not None:
+
+            return
+
+        uri = assets["image/png"].uri
+
+        if (uri in self.pending_surfaces
+            or self.assets.get_object((uri, "alpha", 1.0)) is not None):
+
+            return
+
+        fabula.LOGGER.debug("loading '{}' in the background".format(uri))
+
+        self.pending_surfaces[uri] = self.asset_loader.submit(self._decode_surface, uri)
+
+        return
+
+    def _decode_surface(self, uri):
+        """Auxiliary method to fetch and decode an image.
+           Runs in a PygameUserInterface.asset_loader thread.
+        """
+
+        file = self.assets.fetch(uri)
+
+        surface = pygame.image.load(file)
+
+        file.close()
+
+        return surface
+
+    def complete_pending_surfaces(self):
+        """Wait for all images loading in the background, and replace placeholder images of Tiles by the final Surfaces.
+        """
+
+        if self.pending_surfaces:
+
+            self.display_loading_progress("{} images".format(len(self.pending_surfaces)))
+
+        for uri in list(self.pending_surfaces.keys()):
+
+            self.load_surface(uri)
+
+        for plane_name, tile in self.placeholder_tiles:
+
+            if tile.assets["image/png"].data is self.placeholder_surface:
+
+                tile.assets["image/png"].data = self.load_surface(tile.assets["image/png"].uri)
+
+            if plane_name in self.window.room.tiles.subplanes:
+
+                self.window.room.tiles.set_image(plane_name, tile.assets["image/png"].data)
+
+        self.placeholder_tiles = []
+
+        return
+
+    def load_surface(self, uri, wait = True, alpha = True, scale = 1.0):
+        """Return a Pygame Surface converted for fast blitting from the image asset given.
+
+           If alpha is True, the Surface is converted with per-pixel alpha.
+           If scale is different from 1.0, the image is scaled by that factor.
+
+           Surfaces are cached in the asset manager under (uri, mode, scale)
+           for the lifetime of the client, so Tiles and Entities using the
+           same image share a single Surface, even across rooms. The Surface
+           must thus not be changed by the caller.
+
+           If the image is being loaded in the background and wait is False,
+           return None instead of waiting for it.
+        """
+
+        key = (uri, "alpha" if alpha else "opaque", scale)
+
+        surface = self.assets.get_object(key)
+
+        if surface is None and uri in self.pending_surfaces:
+
+            future = self.pending_surfaces[uri]
+
+            if not wait and not future.done():
+
+                return None
+
+            del self.pending_surfaces[uri]
+
+            try:
+                surface = future.result()
+
+            except:
+                self.display_asset_exception(uri)
+
+            surface = self._convert_surface(key, surface)
+
+        elif surface is None:
+
+            try:
+                # Get a file-like object from asset manager
+                #
+                file = self.assets.fetch(uri)
+
+            except:
+                self.display_asset_exception(uri)
+
+            self.display_loading_progress(uri)
+
+            fabula.LOGGER.debug("loading Surface from {}".format(file))
+
+            surface = pygame.image.load(file)
+
+            file.close()
+
+            surface = self._convert_surface(key, surface)
+
+        return surface
+
+    def load_sprite_frames(self, uri, spritesheet):
+        """Return a tuple of frames sliced from the sprite sheet Surface loaded from uri, see slice_spritesheet().
+
+           Frames are cached along with the sprite sheet, so Entities sharing
+           a sheet share their frames.
+        """
+
+        key = (uri, "alpha", 1.0, "frames")
+
+        frames = self.assets.get_object(key)
+
+        if frames is None or frames[0].get_parent() is not spritesheet:
+
+            frames = slice_spritesheet(spritesheet)
+
+            # Subsurfaces share the pixels of the sheet
+            #
+            self.assets.store_object(key, frames, 0)
+
+        return frames
+
+    def _convert_surface(self, key, surface):
+        """Auxiliary method to convert and scale a freshly decoded Surface as given in the cache key (uri, mode, scale), and to cache it.
+        """
+
+        uri, mode, scale = key
+
+        if scale != 1.0:
+
+            surface = pygame.transform.smoothscale(surface,
+                                                   (max(1, int(surface.get_width() * scale)),
+                                                    max(1, int(surface.get_height() * scale))))
+
+        # Convert to internal format suitable for blitting
+        #
+        if mode == "alpha":
+
+            surface = surface.convert_alpha()
+
+        else:
+            surface = surface.convert()
+
+        # Cost is given in pixel bytes
+        #
+        self.assets.store_object(key,
+                                 surface,
+                                 surface.get_width() * surface.get_height() * surface.get_bytesize())
+
+        return surface
+
     def make_items_draggable(self):
         """Auxiliary method to make items next to the player draggable.
         """
@@ -210,6 +210,17 @@ class DefaultGame(fabula.plugins.Plugin):
            A list of locations that are going to be occupied as a result of
            processing an incoming message. Will be reset to an empty list
            by DefaultGame.process_message().
+
+       DefaultGame.move_limit
+           The maximum number of Entity movements processed in one call while
+           the host has exceeded its tick budget. The remaining movements are
+           deferred to the next call of DefaultGame.process_message().
+           Initially 100, can be set using the "move_limit" option in
+           fabula.conf.
+
+       DefaultGame.deferred_moves
+           A list of identifiers of Entities whose movement has been
+           deferred.
    """
 
     # TODO: Add a method change_room() or the like, which makes a player change from one room to another. Basically Server._generate_room_events() + Delete and Spawn.
@@ -233,6 +244,15 @@ class DefaultGame(fabula.plugins.Plugin):
 
         self.taken_locations = []
 
+        self.move_limit = 100
+
+        if (fabula.CONFIGPARSER is not None
+            and fabula.CONFIGPARSER.has_option("fabula", "move_limit")):
+
+            self.move_limit = fabula.CONFIGPARSER.getint("fabula", "move_limit")
+
+        self.deferred_moves = []
+
         # Load default logic.
         #
         fabula.LOGGER.info("attempting to load default game logic")
@@ -255,7 +275,12 @@ class DefaultGame(fabula.plugins.Plugin):
         #
         next_action_events = []
 
-        if time.time() - self.action_time_reference >= self.host.action_time:
+        # The host ticks at fixed deadlines, so allow half an interval to
+        # let next_action() fall on the tick closest to action_time instead
+        # of the one after it.
+        #
+        if (time.time() - self.action_time_reference
+            >= self.host.action_time - self.host.interval / 2):
 
             # Cache
             #
@@ -263,6 +288,12 @@ class DefaultGame(fabula.plugins.Plugin):
 
             self.action_time_reference = time.time()
 
+        elif self.deferred_moves:
+
+            # Catch up on movements deferred while the host was over budget
+            #
+            next_action_events.extend(self.process_moves(self.deferred_moves))
+
         # Now call the base class method, which in turn calls the processing
         # methods. Results are added to self.message_for_host.
         # Cave: wipes self.message_for_host, that's why we cache next_action_events
@@ -330,7 +361,38 @@ class DefaultGame(fabula.plugins.Plugin):
 
         # Create a new list to be able to change the dict during iteration.
         #
-        for identifier in list(self.tries_to_move_dict.keys()):
+        event_list.extend(self.process_moves(list(self.tries_to_move_dict.keys())))
+
+        return event_list
+
+    def process_moves(self, identifiers):
+        """Move the Entities with the identifiers given one step towards their targets in DefaultGame.tries_to_move_dict, and return the resulting Events.
+
+           While the host has exceeded its tick budget, only
+           DefaultGame.move_limit Entities are moved, and the others are
+           stored in DefaultGame.deferred_moves.
+        """
+
+        event_list = []
+
+        self.deferred_moves = []
+
+        if (len(identifiers) > self.move_limit
+            and self.host.budget_exceeded()):
+
+            fabula.LOGGER.info("over budget, deferring {} movements".format(len(identifiers) - self.move_limit))
+
+            self.deferred_moves = identifiers[self.move_limit:]
+
+            identifiers = identifiers[:self.move_limit]
+
+        for identifier in identifiers:
+
+            # The movement may have been removed while it was deferred
+            #
+            if identifier not in self.tries_to_move_dict:
+
+                continue
 
             # TODO: HACK: selecting room by checking where the Entity exists right now. When the Entity has changed rooms, this will lead to leftover movements being executed.
 
@@ -27,6 +27,8 @@
 import fabula
 import fabula.plugins
 import time
+import bisect
+import collections
 
 class UserInterface(fabula.plugins.Plugin):
     """This is the base class for an UserInterface for the Fabula Client.
@@ -62,12 +64,23 @@ class UserInterface(fabula.plugins.Plugin):
            Flag whether to stop displaying the game and collect input.
            False upon initialisation.
 
+       UserInterface.setup_events
+           Flag whether the Client passes the ChangeMapElementEvents and
+           SpawnEvents which set up a room to process_message(). If False,
+           only EnterRoomEvent and RoomCompleteEvent are passed, and
+           process_RoomCompleteEvent() should read the finished room from
+           self.host.room. True upon initialisation.
+
        UserInterface.room
            Variables to be filled by the Client before each call to
            process_message()
 
        UserInterface.direction_vector_dict
            Convenience dict converting symbolic directions to a vector
+
+       UserInterface.frame_scheduler
+           A FrameScheduler for UserInterface.framerate, used in
+           update_frame_timer().
     """
 
     ####################
@@ -110,6 +123,10 @@ class UserInterface(fabula.plugins.Plugin):
         #
         self.freeze = False
 
+        # See docstring
+        #
+        self.setup_events = True
+
         # Convenience dict converting symbolic
         # directions to a vector
         #
@@ -122,6 +139,8 @@ class UserInterface(fabula.plugins.Plugin):
                                       (0, 1) : "v",
                                       (-1, 0) : "<"}
 
+        self.frame_scheduler = FrameScheduler(self.framerate)
+
         fabula.LOGGER.debug("complete")
 
         return
@@ -252,10 +271,10 @@ class UserInterface(fabula.plugins.Plugin):
            It is also called from process_message() when appropriate.
            This method may block execution to slow the UserInterface
            down to a certain frame rate. The default implementation waits
-           1.0/self.framerate seconds.
+           for the next deadline of UserInterface.frame_scheduler.
         """
 
-        time.sleep(1.0/self.framerate)
+        self.frame_scheduler.tick()
 
         return
 
@@ -332,11 +351,19 @@ class UserInterface(fabula.plugins.Plugin):
         """Called when everything is fetched and ready after a RoomCompleteEvent.
            Here you should set up the main screen and display some Map elements
            and Entities.
-           The default implementation sets UserInterface.freeze = False.
+           The default implementation sets UserInterface.freeze = False. If
+           UserInterface.setup_events is False, it also supplies all Entities
+           in self.host.room with self, like process_SpawnEvent() does.
         """
 
         fabula.LOGGER.debug("called")
 
+        if not self.setup_events:
+
+            for entity in self.host.room.entity_dict.values():
+
+                entity.user_interface = self
+
         fabula.LOGGER.info("unfreezing")
         self.freeze = False
 
@@ -502,3 +529,315 @@ class UserInterface(fabula.plugins.Plugin):
                                                                                        event.text))
 
         return
+
+class DepthOrder:
+    """Maintains the back-to-front rendering order of Entity representations in a list of names, as used for 2D UserInterfaces.
+
+       The list is of the form ["tiles"] + entities + other. Entities are
+       sorted by their y coordinate, and a caption named
+       "<identifier>_caption" directly follows its Entity. DepthOrder.rebuild()
+       creates this order from scratch. DepthOrder.move() moves a single
+       Entity and its caption after a change of its y coordinate, with the
+       same result as a rebuild.
+
+       Attributes:
+
+       DepthOrder.identifiers
+           A list of Entity identifiers in rendering order.
+
+       DepthOrder.y_values
+           A list of the y coordinates of the Entities in
+           DepthOrder.identifiers, in the same order.
+    """
+
+    def __init__(self):
+        """Initialise.
+        """
+
+        self.identifiers = []
+
+        self.y_values = []
+
+        return
+
+    def rebuild(self, names, entity_locations):
+        """Return a new list of the names given, ordered back to front.
+
+           entity_locations is a dict mapping Entity identifiers to (x, y)
+           tuples. Names not in entity_locations which end with "_caption" are
+           captions. Captions for unknown Entities are dropped.
+        """
+
+        entities = []
+        captions = {}
+        other = []
+
+        for name in names:
+
+            if name in entity_locations:
+
+                entities.append(name)
+
+            elif name.endswith("_caption"):
+
+                captions[name.split("_caption")[0]] = name
+
+            elif name == "tiles":
+
+                # Drop the tiles name for now
+                #
+                pass
+
+            else:
+                other.append(name)
+
+        # Entities should be rendered from top to bottom, so sort by y
+        # coordinate. The sort is stable, so equal y coordinates keep their
+        # order.
+        #
+        entities.sort(key = lambda name: entity_locations[name][1])
+
+        self.identifiers = entities
+
+        self.y_values = [entity_locations[name][1] for name in entities]
+
+        for identifier, name in captions.items():
+
+            if identifier not in entity_locations:
+
+                msg = "Entity '{}' not found in Room, not inserting caption plane '{}'"
+
+                fabula.LOGGER.warning(msg.format(identifier, name))
+
+        ordered = ["tiles"]
+
+        for identifier in entities:
+
+            ordered.append(identifier)
+
+            # Insert captions just after the according Entity.
+            #
+            if identifier in captions:
+
+                ordered.append(captions[identifier])
+
+        return ordered + other
+
+    def move(self, names, identifier, y):
+        """Move identifier, and its caption if present, in the list names to the position for the new y coordinate given.
+
+           names must be a list as returned by DepthOrder.rebuild() and is
+           changed in place. Returns True on success, or False if identifier
+           is unknown and a rebuild is needed.
+        """
+
+        if identifier not in self.identifiers:
+
+            return False
+
+        index = self.identifiers.index(identifier)
+
+        old_y = self.y_values[index]
+
+        if y == old_y:
+
+            return True
+
+        del self.identifiers[index]
+        del self.y_values[index]
+
+        # A stable sort keeps the former order among equal y coordinates. So
+        # when moving down, go in front of Entities with the same y, when
+        # moving up, go behind them.
+        #
+        if y > old_y:
+
+            index = bisect.bisect_left(self.y_values, y)
+
+        else:
+            index = bisect.bisect_right(self.y_values, y)
+
+        self.identifiers.insert(index, identifier)
+        self.y_values.insert(index, y)
+
+        # Now move the names
+        #
+        moved = [identifier]
+
+        position = names.index(identifier)
+
+        if position + 1 < len(names) and names[position + 1] == identifier + "_caption":
+
+            moved.append(identifier + "_caption")
+
+        del names[position:position + len(moved)]
+
+        if index == 0:
+
+            position = names.index("tiles") + 1
+
+        else:
+            previous = self.identifiers[index - 1]
+
+            position = names.index(previous) + 1
+
+            if position < len(names) and names[position] == previous + "_caption":
+
+                position = position + 1
+
+        names[position:position] = moved
+
+        return True
+
+class FrameScheduler:
+    """Paces a frame loop to a target framerate, using a fixed simulation timestep.
+
+       FrameScheduler.tick() sleeps until the deadline of the next frame.
+       Deadlines advance by a fixed period, so sleeping errors do not add up.
+       Elapsed time is then converted into a number of fixed-length simulation
+       steps, and the remainder into a fraction of a step for interpolated
+       rendering. Actions thus take the same real time, even if frames are
+       dropped.
+
+       Attributes:
+
+       FrameScheduler.period
+           The length of a frame and of a simulation step in seconds.
+
+       FrameScheduler.max_steps
+           The maximum number of simulation steps per frame. Time beyond that
+           is dropped.
+
+       FrameScheduler.deadline
+           The time.monotonic() value of the next frame deadline.
+
+       FrameScheduler.last_tick
+           The time.monotonic() value of the last call to tick(), or None.
+
+       FrameScheduler.accumulator
+           Elapsed time in seconds which has not yet been simulated.
+
+       FrameScheduler.steps
+           The number of simulation steps due in the current frame.
+
+       FrameScheduler.alpha
+           The fraction of the next simulation step that has elapsed, from 0.0
+           to 1.0, for interpolation.
+
+       FrameScheduler.frame_times
+           A collections.deque of the durations of recent frames in seconds.
+    """
+
+    def __init__(self, framerate, max_steps = 5, history = 300,
+                       clock = time.monotonic, sleep = time.sleep):
+        """Initialise.
+           history is the number of frame durations to keep for statistics.
+           clock and sleep are the functions to read the time and to wait.
+        """
+
+        self.period = 1.0 / framerate
+
+        self.max_steps = max_steps
+
+        self.clock = clock
+
+        self.sleep = sleep
+
+        self.deadline = None
+
+        self.last_tick = None
+
+        self.accumulator = 0.0
+
+        self.steps = 1
+
+        self.alpha = 0.0
+
+        self.frame_times = collections.deque(maxlen = history)
+
+        return
+
+    def tick(self):
+        """Wait for the next frame deadline, then update and return FrameScheduler.steps.
+        """
+
+        now = self.clock()
+
+        if self.last_tick is None:
+
+            self.last_tick = now
+
+            self.deadline = now + self.period
+
+            self.steps = 1
+
+            return self.steps
+
+        delay = self.deadline - now
+
+        if delay > 0:
+
+            self.sleep(delay)
+
+            now = self.clock()
+
+        # Advance the deadline from the previous one, not from now, to
+        # correct drift. If we are more than a frame late, do not try to
+        # catch up by rendering faster.
+        #
+        self.deadline = self.deadline + self.period
+
+        if now > self.deadline:
+
+            self.deadline = now + self.period
+
+        frame_time = now - self.last_tick
+
+        self.last_tick = now
+
+        self.frame_times.append(frame_time)
+
+        self.accumulator = self.accumulator + frame_time
+
+        # Allow for rounding errors in the sum of frame times
+        #
+        self.steps = int(self.accumulator / self.period + 1e-6)
+
+        if self.steps > self.max_steps:
+
+            self.steps = self.max_steps
+
+            self.accumulator = self.accumulator % self.period
+
+        else:
+            self.accumulator = max(0.0, self.accumulator - self.steps * self.period)
+
+        self.alpha = min(self.accumulator / self.period, 1.0)
+
+        return self.steps
+
+    def fps(self):
+        """Return the average number of frames per second over the recorded history, or None.
+        """
+
+        total = sum(self.frame_times)
+
+        if not total:
+
+            return None
+
+        return len(self.frame_times) / total
+
+    def percentiles(self, *percents):
+        """Return a list of frame durations in milliseconds at the percentiles given, e.g. percentiles(50, 95, 99).
+           Returns a list of None if no frames have been recorded.
+        """
+
+        if not self.frame_times:
+
+            return [None for percent in percents]
+
+        ordered = sorted(self.frame_times)
+
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] * 1000
+                for percent in percents]
@@ -0,0 +1,240 @@
+"""Fabula Runtime Profiling
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 22 Oct 2012
+#
+# Used by Server.toggle_profile() to profile a running server for a number of
+# main loop iterations. Nothing in this module is active unless a
+# ProfileSession has been created.
+
+import fabula
+import collections
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+
+class ThreadSampler:
+    """Sample the stacks of all threads periodically from a background thread.
+
+       cProfile only sees the thread it is enabled in, so this is used to
+       find out where the Interface threads spend their time.
+
+       Attributes:
+
+       ThreadSampler.interval
+           Seconds between samples.
+
+       ThreadSampler.samples
+           A dict mapping thread names to the number of samples taken.
+
+       ThreadSampler.functions
+           A dict mapping thread names to collections.Counter instances,
+           counting the samples in which a function was on the stack of
+           that thread. Functions are given as "file:line(name)".
+    """
+
+    def __init__(self, interval = 0.005):
+        """Initialise. Call ThreadSampler.start() to start sampling.
+        """
+
+        self.interval = interval
+
+        self.samples = collections.Counter()
+
+        self.functions = collections.defaultdict(collections.Counter)
+
+        self.stop_event = threading.Event()
+
+        self.thread = None
+
+        return
+
+    def start(self):
+        """Start sampling in a daemon thread.
+        """
+
+        self.thread = threading.Thread(target = self._run,
+                                       name = "ThreadSampler",
+                                       daemon = True)
+
+        self.thread.start()
+
+        return
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread to end.
+        """
+
+        self.stop_event.set()
+
+        if self.thread is not None:
+
+            self.thread.join()
+
+        return
+
+    def _run(self):
+        """Auxiliary method. Take samples until ThreadSampler.stop() is called.
+        """
+
+        own_ident = threading.get_ident()
+
+        while not self.stop_event.wait(self.interval):
+
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+
+            for ident, frame in sys._current_frames().items():
+
+                if ident == own_ident:
+
+                    continue
+
+                name = names.get(ident, str(ident))
+
+                self.samples[name] += 1
+
+                # Count each function once per sample, even if it recurses
+                #
+                seen = set()
+
+                while frame is not None:
+
+                    code = frame.f_code
+
+                    seen.add("{}:{}({})".format(code.co_filename,
+                                                code.co_firstlineno,
+                                                code.co_name))
+
+                    frame = frame.f_back
+
+                self.functions[name].update(seen)
+
+        return
+
+    def report(self, count = 15):
+        """Return a string listing the count functions with the most samples for each thread.
+        """
+
+        lines = []
+
+        for name, samples in self.samples.most_common():
+
+            lines.append("Thread '{}': {} samples".format(name, samples))
+
+            for function, function_samples in self.functions[name].most_common(count):
+
+                lines.append("    {:6.1%}  {}".format(function_samples / samples, function))
+
+            lines.append("")
+
+        return "\n".join(lines)
+
+class ProfileSession:
+    """Profile a number of calls to a function with cProfile, and all threads with a ThreadSampler.
+
+       Attributes:
+
+       ProfileSession.filename
+           The file to write pstats data to. A text report is written to
+           filename + ".txt".
+
+       ProfileSession.remaining
+           The number of calls left to profile.
+
+       ProfileSession.profile
+           The cProfile.Profile instance.
+
+       ProfileSession.sampler
+           The ThreadSampler instance.
+
+       ProfileSession.start_time
+           time.monotonic() when the session was created.
+    """
+
+    def __init__(self, filename, calls):
+        """Start sampling threads. Calls are profiled by ProfileSession.call().
+        """
+
+        self.filename = filename
+
+        self.remaining = calls
+
+        self.profile = cProfile.Profile()
+
+        self.sampler = ThreadSampler()
+
+        self.sampler.start()
+
+        self.start_time = time.monotonic()
+
+        fabula.LOGGER.info("profiling {} calls, writing to '{}'".format(calls, filename))
+
+        return
+
+    def call(self, function):
+        """Call function under the profiler.
+           Returns True when ProfileSession.remaining reaches zero.
+        """
+
+        self.profile.runcall(function)
+
+        self.remaining -= 1
+
+        return self.remaining <= 0
+
+    def dump(self):
+        """Stop sampling and write the pstats data and the text report.
+           The report lists the functions with the highest cumulative time,
+           the time spent in each event handler, and the thread samples.
+        """
+
+        self.sampler.stop()
+
+        self.profile.dump_stats(self.filename)
+
+        stream = io.StringIO()
+
+        stats = pstats.Stats(self.profile, stream = stream)
+
+        stream.write("Profiled for {:.1f} s\n\n".format(time.monotonic() - self.start_time))
+
+        stats.sort_stats("cumulative").print_stats(30)
+
+        # Event handlers of the Server and its Plugin follow the process_*
+        # naming convention of fabula.eventprocessor.EventProcessor.
+        #
+        stream.write("Event handlers:\n\n")
+
+        stats.print_stats(r"\(process_")
+
+        stream.write("Thread samples:\n\n")
+
+        stream.write(self.sampler.report())
+
+        with open(self.filename + ".txt", "wt", encoding = "utf8") as report_file:
+
+            report_file.write(stream.getvalue())
+
+        fabula.LOGGER.info("profile written to '{}'".format(self.filename))
+
+        return
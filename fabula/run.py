@@ -28,11 +28,11 @@
 
 # TODO: App should expose client etc. instances as API.
 
-import fabula.assets
-import fabula.core.client
-import fabula.core.server
-import fabula.plugins.ui
-import fabula.interfaces
+# Client, server, asset and user interface modules are imported upon first
+# use through fabula.__getattr__(), so a server does not load client code and
+# vice versa.
+#
+import fabula
 
 import threading
 import logging
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+
+"""Fabula Asset Packer
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 09. Jul 2012
+
+import sys
+
+# Add current and parent directory. One of them is supposed to contain the fabula
+# package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+import fabula.assets
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 3:
+        raise RuntimeError("Usage: pack_assets.py DIRECTORY ARCHIVE.zip")
+
+    count = fabula.assets.pack_directory(sys.argv[1], sys.argv[2])
+
+    print("Packed {} files from '{}' into '{}'.".format(count, sys.argv[1], sys.argv[2]))
+    print("Add 'asset_archives = {}' to the [fabula] section of fabula.conf to use it.".format(sys.argv[2]))
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+
+"""Fabula load generator start script
+
+   Copyright 2012 Florian Berger <fberger@florian-berger.de>
+"""
+
+# This file is part of Fabula.
+#
+# Fabula is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Fabula is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fabula.  If not, see <http://www.gnu.org/licenses/>.
+
+# Work started on 21 Oct 2012
+
+import sys
+
+# Add current and parent directory. One of them is supposed to contain the fabula
+# package.
+#
+sys.path.append("../")
+sys.path.append("./")
+
+import fabula.bots
+
+if __name__ == "__main__":
+
+    if len(sys.argv) == 1:
+        raise RuntimeError("Please supply the number of bots as an argument, optionally followed by the number of actions per bot, the server IP address and port.")
+
+    actions = 30
+    ipaddress = "127.0.0.1"
+    port = 4011
+
+    if len(sys.argv) > 2:
+        actions = int(sys.argv[2])
+
+    if len(sys.argv) > 3:
+        ipaddress = sys.argv[3]
+
+    if len(sys.argv) > 4:
+        port = int(sys.argv[4])
+
+    report = fabula.bots.LoadGenerator((ipaddress, port),
+                                       int(sys.argv[1]),
+                                       actions = actions).run()
+
+    for key in ("bots", "connected", "connection_errors", "actions_sent",
+                "confirmed", "attempts_failed", "timeouts", "disconnects"):
+
+        print("{:20} {}".format(key, report[key]))
+
+    print("\n{:8} {:>8} {:>10} {:>10} {:>10} {:>10}".format("action", "count", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+
+    for action, latency in sorted(report["latency"].items()):
+
+        print("{:8} {:8} {:10.1f} {:10.1f} {:10.1f} {:10.1f}".format(action,
+                                                                       latency["count"],
+                                                                       latency["p50"] * 1000,
+                                                                       latency["p95"] * 1000,
+                                                                       latency["p99"] * 1000,
+                                                                       latency["max"] * 1000))
@@ -52,8 +52,19 @@ class ReplayPygameUserInterface(fabula.plugins.pygameui.PygameUserInterface):
 if __name__ == "__main__":
 
     if len(sys.argv) == 1:
-        raise RuntimeError("Please supply a logfile as an argument.")
+        raise RuntimeError("Please supply a logfile as an argument, optionally followed by a speed factor (0 = as fast as possible) and a start time in seconds.")
+
+    speed = 1.0
+    start_time = 0.0
+
+    if len(sys.argv) > 2:
+        speed = float(sys.argv[2])
+
+    if len(sys.argv) > 3:
+        start_time = float(sys.argv[3])
 
     app = fabula.run.App(timeout = 0)
     app.user_interface_class = ReplayPygameUserInterface
-    app.run_client(30, fabula.interfaces.replay.PythonReplayInterface(sys.argv[1]))
+    app.run_client(30, fabula.interfaces.replay.PythonReplayInterface(sys.argv[1],
+                                                                       speed,
+                                                                       start_time))